@@ -0,0 +1,273 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     array_tools.py
+#  purpose:  In-memory raster methods that reproduce WhiteboxTools results
+#              (including noData handling) with numpy arrays.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import numpy as np
+
+import scratch_store as ss
+
+# ------------------------------------------------------------------------------
+# READ AND WRITE RASTERS
+# ------------------------------------------------------------------------------
+
+def readRaster(path):
+    "To read the first band of a raster with a mask of valid (not noData) cells."
+    with ss.open(path) as src:
+        array = src.read(1).astype(np.float64)
+        profile = src.profile.copy()
+    nodata = profile.get('nodata')
+    if nodata is None:
+        valid = np.ones(array.shape, dtype=bool)
+    else:
+        valid = array != nodata
+    return array, valid, profile
+
+def writeRaster(path, array, valid, profile, dtype='float32', nodata=-32768.0):
+    "To write an array as a single band raster with noData where cells are not valid."
+    profile = profile.copy()
+    profile.update(count=1, dtype=dtype, nodata=nodata)
+    out = np.where(valid, array, nodata).astype(dtype)
+    with ss.open(path, 'w', **profile) as dst:
+        dst.write(out, 1)
+    return;
+
+# ------------------------------------------------------------------------------
+# FOCAL FILTERS
+# ------------------------------------------------------------------------------
+
+def _windowExtreme(array, valid, filterx, filtery, reduce, fill):
+    "To reduce each window of valid cells with np.maximum or np.minimum."
+    rows, cols = array.shape
+    dy, dx = filtery // 2, filterx // 2
+    padded = np.full((rows + 2 * dy, cols + 2 * dx), fill)
+    padded[dy:dy + rows, dx:dx + cols] = np.where(valid, array, fill)
+    out = np.full(array.shape, fill)
+    for r in range(filtery):
+        for c in range(filterx):
+            reduce(out, padded[r:r + rows, c:c + cols], out=out)
+    return out, valid.copy()
+
+def _windowSum(mask, filterx, filtery):
+    "To count true cells in each window with an integral image."
+    rows, cols = mask.shape
+    dy, dx = filtery // 2, filterx // 2
+    padded = np.zeros((rows + 2 * dy + 1, cols + 2 * dx + 1), dtype=np.int64)
+    padded[1 + dy:1 + dy + rows, 1 + dx:1 + dx + cols] = mask
+    integral = padded.cumsum(0).cumsum(1)
+    return (integral[filtery:filtery + rows, filterx:filterx + cols]
+            - integral[0:rows, filterx:filterx + cols]
+            - integral[filtery:filtery + rows, 0:cols]
+            + integral[0:rows, 0:cols])
+
+def maximumFilter(array, valid, filterx=3, filtery=3):
+    "To take the window maximum of valid cells, like wbt.maximum_filter."
+    return _windowExtreme(array, valid, filterx, filtery, np.maximum, -np.inf)
+
+def minimumFilter(array, valid, filterx=3, filtery=3):
+    "To take the window minimum of valid cells, like wbt.minimum_filter."
+    return _windowExtreme(array, valid, filterx, filtery, np.minimum, np.inf)
+
+def majorityFilter(array, valid, filterx=3, filtery=3):
+    "To take the most common valid value in each window, like wbt.majority_filter (ties go to the lower value)."
+    best = np.zeros(array.shape)
+    best_count = np.zeros(array.shape, dtype=np.int64)
+    for value in np.unique(array[valid]):
+        count = _windowSum(valid & (array == value), filterx, filtery)
+        better = count > best_count
+        best[better] = value
+        best_count[better] = count[better]
+    return best, valid.copy()
+
+# ------------------------------------------------------------------------------
+# ZONAL STATISTICS
+# ------------------------------------------------------------------------------
+
+def zoneIndex(features, valid):
+    "To index the zones of a feature raster, with 0 and noData as background."
+    zone = valid & (features != 0)
+    ids, inverse = np.unique(features[zone], return_inverse=True)
+    return zone, ids, inverse
+
+def zoneMax(values, valid, inverse, n):
+    "To take the maximum of valid zone-pixel values per zone, like wbt.zonal_statistics(stat='max')."
+    out = np.full(n, -np.inf)
+    np.maximum.at(out, inverse[valid], values[valid])
+    present = np.bincount(inverse[valid], minlength=n) > 0
+    return out, present
+
+# ------------------------------------------------------------------------------
+# CLASSIFY TOPOLOGY
+# ------------------------------------------------------------------------------
+
+def classTopology(figure, figure_valid, ground, ground_valid):
+    "To class figure objects as islands (1), spits (2), holes (3) and tombolos (4)."
+    zone, ids, inverse = zoneIndex(figure, figure_valid)
+    n = len(ids)
+
+    # Grow ground edge by one pixel and test for overlap.
+    b, b_valid = maximumFilter(ground, ground_valid)
+    bz, bz_valid = b[zone], b_valid[zone]
+    c, c_present = zoneMax(bz, bz_valid, inverse, n)
+    d_valid = c_present[inverse] & bz_valid
+    d = (c[inverse] != bz).astype(np.float64)
+
+    # ISLAND TEST: if max inequality is 0 then island.
+    e, island_valid = zoneMax(d, d_valid, inverse, n)
+    island = e == 0
+
+    # TOMBOLO TEST: erase equal overlap and test for overlap again.
+    f, tombolo_valid = zoneMax(d * bz, d_valid, inverse, n)
+    tombolo = f > 0
+
+    # Figure objects not yet classed.
+    h = ~(island | tombolo)
+    h_valid = island_valid & tombolo_valid
+
+    # Grow the background (neither figure nor ground) by one pixel.
+    dd_valid = figure_valid & ground_valid
+    dd = ((ground == 0) & (figure == 0)).astype(np.float64)
+    ee, ee_valid = maximumFilter(dd, dd_valid)
+
+    # TEST HOLES VERSUS SPITS: if test = 0, then hole, else spit.
+    gg, gg_present = zoneMax(ee[zone], ee_valid[zone], inverse, n)
+    hole = (gg == 0) & h
+    spit = (gg != 0) & h
+
+    codes = island * 1 + spit * 2 + hole * 3 + tombolo * 4
+    codes_valid = island_valid & h_valid & gg_present
+
+    out = np.zeros(figure.shape)
+    out_valid = np.zeros(figure.shape, dtype=bool)
+    out[zone] = codes[inverse]
+    out_valid[zone] = codes_valid[inverse]
+    return out, out_valid
+
+# ------------------------------------------------------------------------------
+# RECLASS
+# ------------------------------------------------------------------------------
+
+# Reclass strings follow wbt.reclass: "new;old;..." pairs with assign_mode, or
+# "new;from;to_less_than;..." triplets without. The first match wins and cells
+# that match nothing keep their value. Integer pairs compile to a dense lookup
+# table, so applying them is one gather however long the string is.
+
+lut_limit = 1 << 20
+
+def compileReclass(reclass_vals, assign_mode=False):
+    "To compile a wbt.reclass string into ('lut', table, defined), ('pairs', ...) or ('ranges', ...)."
+    v = [float(x) for x in reclass_vals.split(';') if x.strip()]
+    if assign_mode:
+        new, old = np.array(v[0::2]), np.array(v[1::2])
+        if len(old) and np.all(old == np.floor(old)) and old.min() >= 0 and old.max() < lut_limit:
+            n = int(old.max()) + 1
+            table, defined = np.zeros(n), np.zeros(n, dtype=bool)
+            # Fill in reverse so the first pair for a value wins.
+            for value, key in zip(new[::-1], old[::-1].astype(np.int64)):
+                table[key], defined[key] = value, True
+            return 'lut', table, defined
+        return 'pairs', new, old
+    return 'ranges', np.array(v[0::3]), np.array([v[1::3], v[2::3]])
+
+def reclassValues(compiled):
+    "To list the new values a compiled reclass can assign."
+    kind, a, b = compiled
+    return a[b] if kind == 'lut' else a
+
+def applyReclass(values, compiled):
+    "To reclass an array with a compiled reclass, like wbt.reclass."
+    kind, a, b = compiled
+    if kind == 'lut':
+        inside = (values >= 0) & (values < len(a))
+        if values.dtype.kind == 'f':
+            inside &= values == np.floor(values)
+        index = np.where(inside, values, 0).astype(np.int64)
+        hit = inside & b[index]
+        return np.where(hit, a[index], values)
+    out = values.astype(np.float64)
+    done = np.zeros(values.shape, dtype=bool)
+    for k, new in enumerate(a):
+        match = (values == b[k]) if kind == 'pairs' else (values >= b[0][k]) & (values < b[1][k])
+        match &= ~done
+        out[match] = new
+        done |= match
+    return out
+
+# ------------------------------------------------------------------------------
+# MERGE LABELS
+# ------------------------------------------------------------------------------
+
+def mergeLabels(n, pairs):
+    "To join labels 0..n-1 that are paired as equivalent, returning a component for each label."
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+    a, b = pairs
+    graph = coo_matrix((np.ones(len(a), dtype=np.int8), (a, b)), shape=(n, n))
+    _, component = connected_components(graph, directed=False)
+    return component
+
+def rankByFirst(component, first):
+    "To number components 1.. in the order their first cell is scanned, with label 0 kept as 0."
+    n = component.max() + 1
+    start = np.full(n, np.inf)
+    np.minimum.at(start, component, first)
+    start[component[0]] = -1
+    rank = np.empty(n, dtype=np.int64)
+    rank[np.argsort(start, kind="stable")] = np.arange(n)
+    return rank[component]
+
+# ------------------------------------------------------------------------------
+# DATA TYPES
+# ------------------------------------------------------------------------------
+
+# GeoTIFF tag holding the value range of a layer, so a mask read back from disk
+# is still known to hold only 0 and 1.
+
+range_tag = 'VTLC_RANGE'
+
+def narrowType(lo, hi, integral=True):
+    "To pick the narrowest raster type for values in lo..hi, with a noData value outside that range."
+    if integral and lo >= 0:
+        for dtype in ('uint8', 'uint16', 'uint32'):
+            top = np.iinfo(dtype).max
+            if hi < top:
+                return dtype, top
+    if integral:
+        for dtype in ('int16', 'int32'):
+            bottom = np.iinfo(dtype).min
+            if lo > bottom and hi <= np.iinfo(dtype).max:
+                return dtype, bottom
+    return 'float32', -32768.0
+
+def noDataFor(dtype):
+    "To give the noData value used for a raster type."
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'u':
+        return np.iinfo(dtype).max
+    if dtype.kind == 'i':
+        return np.iinfo(dtype).min
+    return -32768.0
+
+def readRange(src):
+    "To read the value range of an open raster from its tag, or from its type."
+    tag = src.tags().get(range_tag)
+    if tag:
+        lo, hi = tag.split()
+        return float(lo), float(hi)
+    dtype = np.dtype(src.dtypes[0])
+    if dtype.kind in 'ui':
+        return float(np.iinfo(dtype).min), float(np.iinfo(dtype).max)
+    return -np.inf, np.inf
+
+def packMask(mask):
+    "To pack a boolean mask into bits (one eighth of the memory)."
+    return np.packbits(mask, axis=None), mask.shape
+
+def unpackMask(packed):
+    "To unpack a mask made by packMask."
+    bits, shape = packed
+    return np.unpackbits(bits, count=int(np.prod(shape))).reshape(shape).astype(bool)
@@ -0,0 +1,180 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     batch_towns.py
+#  purpose:  Run the _01 -> _02 -> _03 chain for many towns on a process pool,
+#              each town with its own data, scratch and working directories.
+#
+#              python batch_towns.py towns.shp outputs/ --mosaic lc=lc.tif ...
+#              python batch_towns.py towns.json outputs/
+#
+#            A shapefile is split into one shapefile per town (named by
+#            --name-field) and each --mosaic raster is clipped to the town.
+#            A JSON file lists towns as {"name": ..., "<setting>": path, ...}
+#            with the same setting names as settings.py.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from settings import shareWorkers
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# Scripts run for each town, in order.
+
+scripts = [
+    os.path.join(here, "patches", "_01_prep_lc_starter.py"),
+    os.path.join(here, "patches", "_02_prep_landform_patches.py"),
+    os.path.join(here, "patches", "_03_classify_habitat_blocks.py"),
+]
+
+# Cells added around a town when clipping mosaics, so focal filters and
+# topology near the boundary see their neighbours (clipByTown trims them).
+
+margin = 500
+
+# ------------------------------------------------------------------------------
+# TOWNS
+# ------------------------------------------------------------------------------
+
+def splitTowns(towns_shp, out_root, name_field):
+    "To write each town of a shapefile to <out_root>/<name>/town.shp."
+    import fiona
+    towns = []
+    with fiona.open(towns_shp) as src:
+        for feature in src:
+            name = str(feature["properties"][name_field]).strip().replace(" ", "_")
+            folder = os.path.join(out_root, name)
+            os.makedirs(folder, exist_ok = True)
+            shape = os.path.join(folder, "town.shp")
+            with fiona.open(shape, "w", driver = "ESRI Shapefile", crs = src.crs, schema = src.schema) as dst:
+                dst.write(feature)
+            towns.append({"name": name, "town": shape})
+    return towns
+
+def loadTowns(path, out_root, name_field = "TOWNNAME"):
+    "To read the list of towns from a JSON list or a shapefile of town boundaries."
+    if path.lower().endswith(".shp"):
+        return splitTowns(path, out_root, name_field)
+    with open(path) as f:
+        return json.load(f)
+
+def clipToTown(mosaic, town_shp, output):
+    "To clip a raster mosaic to the bounds of a town plus a margin."
+    import fiona
+    import rasterio
+    from rasterio.windows import from_bounds
+    with fiona.open(town_shp) as src:
+        left, bottom, right, top = src.bounds
+    with rasterio.open(mosaic) as src:
+        window = from_bounds(left, bottom, right, top, src.transform).round_offsets().round_lengths()
+        window = window.intersection(rasterio.windows.Window(0, 0, src.width, src.height))
+        c0, r0 = int(window.col_off), int(window.row_off)
+        c1, r1 = c0 + int(window.width), r0 + int(window.height)
+        col, row = max(0, c0 - margin), max(0, r0 - margin)
+        window = rasterio.windows.Window(col, row, min(src.width, c1 + margin) - col, min(src.height, r1 + margin) - row)
+    return clipWindow(mosaic, window, output)
+
+def clipWindow(mosaic, window, output):
+    "To copy a window of a raster mosaic to its own raster."
+    import rasterio
+    with rasterio.open(mosaic) as src:
+        profile = src.profile.copy()
+        profile.update(width = window.width, height = window.height, transform = src.window_transform(window))
+        with rasterio.open(output, "w", **profile) as dst:
+            dst.write(src.read(window = window))
+            dst.update_tags(**src.tags())
+    return output
+
+def townSettings(town, out_root, mosaics):
+    "To make the VTLC_* environment for one town."
+    folder = os.path.join(out_root, town["name"])
+    paths = {
+        "data_repo": os.path.join(folder, "_goods") + os.sep,
+        "scratch_repo": os.path.join(folder, "_scratch"),
+        "work_dir": os.path.join(folder, "_01"),
+    }
+    for path in paths.values():
+        os.makedirs(path, exist_ok = True)
+    paths["starter"] = os.path.join(paths["work_dir"], "154_lc_update.tif")
+    for name, mosaic in mosaics.items():
+        if name not in town:
+            paths[name] = clipToTown(mosaic, town["town"], os.path.join(folder, name + ".tif"))
+    paths.update({k: v for k, v in town.items() if k != "name"})
+    env = dict(os.environ)
+    env.update({"VTLC_" + k.upper(): v for k, v in paths.items()})
+    env["PYTHONPATH"] = os.pathsep.join([here, env.get("PYTHONPATH", "")])
+    return env
+
+# ------------------------------------------------------------------------------
+# RUN
+# ------------------------------------------------------------------------------
+
+def runTown(town, out_root, mosaics):
+    "To run every script for one town, logging output to <town>/run.log."
+    start = time.time()
+    env = townSettings(town, out_root, mosaics)
+    with open(os.path.join(out_root, town["name"], "run.log"), "a") as log:
+        for script in scripts:
+            log.write("# " + os.path.basename(script) + "\n")
+            log.flush()
+            subprocess.run([sys.executable, script], env = env, stdout = log, stderr = subprocess.STDOUT, check = True)
+    return time.time() - start
+
+def runBatch(towns, out_root, mosaics = None, workers = None, retries = 1):
+    "To run towns on a process pool, retrying failures, and write a summary."
+    mosaics = mosaics or {}
+    status = {town["name"]: {"attempts": 0, "state": "queued"} for town in towns}
+    todo = list(towns)
+    done = 0
+    # Towns running at once split the worker budget (see settings.workers).
+    with shareWorkers(workers), ProcessPoolExecutor(workers) as pool:
+        running = {}
+        def submit(town):
+            status[town["name"]]["attempts"] += 1
+            status[town["name"]]["state"] = "running"
+            running[pool.submit(runTown, town, out_root, mosaics)] = town
+        for town in todo:
+            submit(town)
+        while running:
+            future = next(as_completed(running))
+            town = running.pop(future)
+            state = status[town["name"]]
+            try:
+                state["seconds"] = round(future.result(), 1)
+                state["state"] = "done"
+                done += 1
+                print("[%d/%d] %s done in %.0fs" % (done, len(towns), town["name"], state["seconds"]))
+            except Exception as error:
+                state["error"] = str(error)
+                if state["attempts"] <= retries:
+                    print("%s failed (%s), retrying" % (town["name"], error))
+                    submit(town)
+                else:
+                    state["state"] = "failed"
+                    done += 1
+                    print("[%d/%d] %s FAILED: %s" % (done, len(towns), town["name"], error))
+    with open(os.path.join(out_root, "batch_summary.json"), "w") as f:
+        json.dump(status, f, indent = 1)
+    failed = [name for name, state in status.items() if state["state"] == "failed"]
+    print("%d towns done, %d failed %s" % (len(towns) - len(failed), len(failed), failed))
+    return status
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Run the conservation plan for many towns.")
+    parser.add_argument("towns", help = "shapefile of town boundaries or JSON list of towns")
+    parser.add_argument("out_root", help = "folder for per-town outputs")
+    parser.add_argument("--name-field", default = "TOWNNAME")
+    parser.add_argument("--mosaic", action = "append", default = [], help = "setting=raster to clip per town, e.g. lc=vt_lc.tif")
+    parser.add_argument("--workers", type = int, default = None)
+    parser.add_argument("--retries", type = int, default = 1)
+    args = parser.parse_args()
+    mosaics = dict(m.split("=", 1) for m in args.mosaic)
+    runBatch(loadTowns(args.towns, args.out_root, args.name_field), args.out_root, mosaics, args.workers, args.retries)
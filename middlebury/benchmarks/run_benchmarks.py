@@ -0,0 +1,210 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     run_benchmarks.py
+#  purpose:  Time each conservation_tools function and the _01 and _03 chains
+#              on synthetic towns, and store the results by git commit so
+#              runs can be compared:
+#
+#              python run_benchmarks.py --sizes 1000 5000 --out /tmp/bench
+#              python run_benchmarks.py --compare <commit> <commit>
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import traceback
+
+here = os.path.dirname(os.path.abspath(__file__))
+middlebury = os.path.dirname(here)
+sys.path.insert(0, middlebury)
+
+from synthetic_landscape import makeLandscape
+
+# Where results are appended (one JSON object per timing).
+
+results_file = os.path.join(here, "results.jsonl")
+
+# ------------------------------------------------------------------------------
+# FUNCTION BENCHMARKS
+# ------------------------------------------------------------------------------
+
+# Benchmarks run in this order, each using the outputs of those before it.
+# Each entry is (name, function name, arguments) where arguments may use
+# {data} for the data repo and any synthetic dataset name in braces. A
+# benchmark that fails is recorded with its error and the run goes on.
+
+functions = [
+    ("makeObjects_reforested", "makeObjects", (1, "_reforested")),
+    ("makeObjects_recovering", "makeObjects", (0, "_recovering")),
+    ("makeObjects_clearing", "makeObjects", (3, "_clearing")),
+    ("classTopology_fused", "classTopology", ("{data}_recovering_objects.tif", "{data}_reforested_objects.tif", "_recovering_reforested")),
+    ("classTopology_wbt", "classTopology", ("{data}_recovering_objects.tif", "{data}_reforested_objects.tif", "_recovering_reforested_wbt", "wbt")),
+    ("classTopology_graph", "classTopology", ("{data}_recovering_objects.tif", "{data}_reforested_objects.tif", "_recovering_reforested_graph", "graph")),
+    ("makeForestHabitatBlocks", "makeForestHabitatBlocks", ("{data}_reforested_objects.tif", "{data}_recovering_reforested_topology.tif", "_forest_habitat")),
+    ("withRoadXing_forest", "withRoadXing", ("{data}_forest_habitat_blocks.tif", "_forest_habitat_blocks")),
+    ("withRoadXing_forest_clump", "withRoadXing", ("{data}_forest_habitat_blocks.tif", "_forest_habitat_blocks_clump", "clump")),
+    ("makeLowlands", "makeLowlands", ("{landforms}",)),
+    ("openLowlands", "openLowlands", ("{data}_lowlands.tif", "{data}_forest_habitat_blocks_withRoadXing.tif", "{starter}")),
+    ("classTopology_lowlands", "classTopology", ("{data}_open_lowlands.tif", "{data}_forest_habitat_blocks_withRoadXing.tif", "_open_lowlands")),
+    ("classTopology_field", "classTopology", ("{data}_recovering_objects.tif", "{data}_clearing_objects.tif", "_recovering_clearing")),
+    ("makeFieldHabitatBlocks", "makeFieldHabitatBlocks", ("{data}_clearing_objects.tif", "{data}_recovering_clearing_topology.tif", "{data}_recovering_reforested_topology.tif", "_field_habitat")),
+    ("withRoadXing_field", "withRoadXing", ("{data}_field_habitat_blocks.tif", "_field_habitat_blocks")),
+    ("classifyFieldBlocks", "classifyFieldBlocks", ("{data}_field_habitat_blocks_withRoadXing.tif", "{scenic}", "{starter}")),
+    ("makeRiverCorridorsAndSmallStreamsBinary", "makeRiverCorridorsAndSmallStreamsBinary", ()),
+    ("distanceTo_roads", "distanceTo", ((99,), "_roads")),
+    ("distanceTo_developed", "distanceTo", ((4,), "_developed")),
+    ("makeHabitatConnectors", "makeHabitatConnectors", ("{data}_forest_habitat_blocks_withRoadXing.tif", "{data}_field_habitat_blocks_withRoadXing.tif", "{data}_recovering_reforested_topology.tif", "{data}_open_lowlands_topology.tif", "{data}_riverCorridors_with_smallStreamBuffers.tif")),
+    ("makeComposite", "makeComposite", ("{data}_forest_habitat_blocks_withRoadXing.tif", "{data}_forest_habitat_connectors.tif", "{data}_field_blocks_classed.tif", "{starter}")),
+    ("clipByTown", "clipByTown", ("_conservation_plan", "{data}_conservation_plan.tif", "{town}", "{starter}")),
+]
+
+def _fill(args, paths):
+    "To put dataset paths into benchmark arguments."
+    return tuple(a.format(**paths) if isinstance(a, str) else a for a in args)
+
+def failed(name, errors, error):
+    "To record a failed benchmark and print its traceback."
+    traceback.print_exc()
+    errors[name] = "%s: %s" % (type(error).__name__, error)
+    print("%-45s %9s" % (name, "failed"))
+    return;
+
+def timeFunctions(paths, folder, errors, only = None):
+    "To time each conservation_tools function on a synthetic town, recording failures in errors."
+    import conservation_tools as ct
+    data = os.path.join(folder, "_goods") + os.sep
+    scratch = os.path.join(folder, "_scratch")
+    os.makedirs(data, exist_ok = True)
+    os.makedirs(scratch, exist_ok = True)
+    ct.data_repo, ct.scratch_repo = data, scratch
+    ct.starter, ct.lc, ct.dem, ct.rc, ct.rc_ss = paths["starter"], paths["lc"], paths["dem"], paths["rc"], paths["rc_ss"]
+    paths = dict(paths, data = data)
+    times = {}
+    for name, func, args in functions:
+        if only and name not in only:
+            continue
+        start = time.perf_counter()
+        try:
+            getattr(ct, func)(*_fill(args, paths))
+        except Exception as error:
+            failed(name, errors, error)
+            continue
+        times[name] = time.perf_counter() - start
+        print("%-45s %8.2fs" % (name, times[name]))
+    return times
+
+# ------------------------------------------------------------------------------
+# CHAIN BENCHMARKS
+# ------------------------------------------------------------------------------
+
+def timeChains(paths, folder, errors):
+    "To time the _01 and _03 scripts end to end on a synthetic town, recording failures in errors."
+    import conservation_tools as ct
+    env = dict(os.environ, PYTHONPATH = os.pathsep.join([middlebury, os.environ.get("PYTHONPATH", "")]))
+    chain = os.path.join(folder, "chain")
+    settings = {
+        "data_repo": os.path.join(chain, "_goods") + os.sep,
+        "scratch_repo": os.path.join(chain, "_scratch"),
+        "work_dir": os.path.join(chain, "_01"),
+        "trace": os.path.join(chain, "_trace.jsonl"),
+    }
+    for key in ("data_repo", "scratch_repo", "work_dir"):
+        os.makedirs(settings[key], exist_ok = True)
+    settings.update({k: paths[k] for k in ("lc", "rds", "nhd_patches", "e911", "town", "starter", "rc", "rc_ss", "scenic", "dem")})
+    env.update({"VTLC_" + k.upper(): v for k, v in settings.items()})
+    # _03 reads lowlands made by _02; make them from the synthetic landforms.
+    ct.data_repo, ct.scratch_repo = settings["data_repo"], settings["scratch_repo"]
+    ct.makeLowlands(paths["landforms"])
+    times = {}
+    for name in ("_01_prep_lc_starter", "_03_classify_habitat_blocks"):
+        start = time.perf_counter()
+        try:
+            subprocess.run([sys.executable, os.path.join(middlebury, "patches", name + ".py")], env = env, check = True)
+        except subprocess.CalledProcessError as error:
+            failed("chain" + name, errors, error)
+            # _03 reads the starter _01 makes.
+            break
+        times["chain" + name] = time.perf_counter() - start
+        print("%-45s %8.2fs" % ("chain" + name, times["chain" + name]))
+    return times
+
+# ------------------------------------------------------------------------------
+# RESULTS
+# ------------------------------------------------------------------------------
+
+def commit():
+    "To name the current git commit (with '+dirty' for uncommitted changes)."
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd = here, capture_output = True, text = True, check = True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain"], cwd = here, capture_output = True, text = True).stdout.strip()
+        return rev + ("+dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def saveResults(size, times, errors = None):
+    "To append timings, and failures (with no seconds), to the results file."
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+    rows = [(name, round(seconds, 3), None) for name, seconds in times.items()]
+    rows += [(name, None, error) for name, error in (errors or {}).items()]
+    with open(results_file, "a") as f:
+        for name, seconds, error in rows:
+            row = {"commit": commit(), "time": stamp, "host": platform.node(), "size": size,
+                   "benchmark": name, "seconds": seconds}
+            if error:
+                row["error"] = error
+            f.write(json.dumps(row) + "\n")
+    return;
+
+def compare(old, new):
+    "To print median timings of two commits side by side."
+    with open(results_file) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    med = {}
+    for commit_id in (old, new):
+        groups = {}
+        for r in rows:
+            if r["commit"].startswith(commit_id) and r["seconds"] is not None:
+                groups.setdefault((r["benchmark"], r["size"]), []).append(r["seconds"])
+        med[commit_id] = {k: statistics.median(v) for k, v in groups.items()}
+    print("%-45s %7s %10s %10s %7s" % ("benchmark", "size", old, new, "ratio"))
+    for key in sorted(set(med[old]) | set(med[new]), key = lambda k: (k[1], k[0])):
+        a, b = med[old].get(key), med[new].get(key)
+        ratio = "%6.2fx" % (b / a) if a and b else "-"
+        print("%-45s %7d %10s %10s %7s" % (key[0], key[1], "%.2f" % a if a else "-", "%.2f" % b if b else "-", ratio))
+    return med
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the conservation pipeline on synthetic towns.")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [1000, 5000])
+    parser.add_argument("--out", default = os.path.join(here, "_synthetic"))
+    parser.add_argument("--only", nargs = "+", help = "benchmark names to run")
+    parser.add_argument("--no-chains", action = "store_true")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--compare", nargs = 2, metavar = ("OLD", "NEW"))
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        sys.exit()
+    failures = 0
+    for size in args.sizes:
+        folder = os.path.join(args.out, str(size))
+        print("# %d x %d" % (size, size))
+        start = time.perf_counter()
+        paths = makeLandscape(os.path.join(folder, "inputs"), size, args.seed)
+        print("%-45s %8.2fs" % ("make synthetic landscape", time.perf_counter() - start))
+        errors = {}
+        times = timeFunctions(paths, folder, errors, args.only)
+        if not args.no_chains and not args.only:
+            times.update(timeChains(paths, folder, errors))
+        saveResults(size, times, errors)
+        if errors:
+            print("# %d failed: %s" % (len(errors), ", ".join(errors)))
+        failures += len(errors)
+    sys.exit(1 if failures else 0)
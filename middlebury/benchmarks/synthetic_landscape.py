@@ -0,0 +1,159 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     synthetic_landscape.py
+#  purpose:  Make a reproducible synthetic town for benchmarks: landcover,
+#              starter layer (0 recovering, 1 reforested, 2 water,
+#              3 clearing, 4 developed, 99 fragmenting), roads, hydro
+#              patches, landforms, scenic views and DEM rasters, plus river
+#              corridor, small stream, e911 footprint and town shapefiles.
+#              Rasters are written in strips so 50k x 50k grids fit in memory.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import os
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+# Grid of the synthetic town (Vermont State Plane, 0.7 m cells).
+
+crs = "EPSG:32145"
+origin = (440000.0, 4900000.0)
+cell = 0.7
+
+# Road spacing and width in cells, and rows per strip when writing.
+
+road_spacing = 1500
+road_width = 3
+strip_rows = 256
+
+# ------------------------------------------------------------------------------
+# NOISE
+# ------------------------------------------------------------------------------
+
+def _coarse(size, scale, seed):
+    "To make a coarse random grid that is interpolated into smooth noise."
+    rng = np.random.default_rng(seed)
+    n = size // scale + 2
+    return rng.random((n, n), dtype = np.float32)
+
+def _smooth(coarse, scale, row0, rows, cols):
+    "To interpolate a coarse grid bilinearly over a strip of the full grid."
+    y = np.arange(row0, row0 + rows, dtype = np.float32) / scale
+    x = np.arange(cols, dtype = np.float32) / scale
+    i, j = y.astype(np.int64), x.astype(np.int64)
+    ty, tx = (y - i)[:, None], (x - j)[None, :]
+    c = coarse
+    return ((1 - ty) * (1 - tx) * c[i][:, j] + (1 - ty) * tx * c[i][:, j + 1]
+            + ty * (1 - tx) * c[i + 1][:, j] + ty * tx * c[i + 1][:, j + 1])
+
+def _noise(grids, row0, rows, cols):
+    "To mix two octaves of smooth noise in 0..1."
+    (big, big_scale), (small, small_scale) = grids
+    return 0.7 * _smooth(big, big_scale, row0, rows, cols) + 0.3 * _smooth(small, small_scale, row0, rows, cols)
+
+# ------------------------------------------------------------------------------
+# RASTERS
+# ------------------------------------------------------------------------------
+
+def _roads(row0, rows, cols):
+    "To mark fragmenting roads on a regular grid."
+    r = (np.arange(row0, row0 + rows) % road_spacing < road_width)[:, None]
+    c = (np.arange(cols) % road_spacing < road_width)[None, :]
+    return r | c
+
+def _strip(size, row0, rows, grids):
+    "To make every raster for one strip."
+    cover = _noise(grids["cover"], row0, rows, size)
+    wet = _noise(grids["wet"], row0, rows, size)
+    relief = _noise(grids["relief"], row0, rows, size)
+    roads = _roads(row0, rows, size)
+    starter = np.select([cover < 0.3, cover < 0.62, cover < 0.88], [0, 1, 3], 4).astype(np.float32)
+    starter[wet > 0.82] = 2
+    starter[roads] = 99
+    # Landcover codes used by _01 (0 conifers ... 8 roads).
+    trees = np.where(relief > 0.5, 0, 1)
+    landcover = np.select([starter == 1, starter == 0, starter == 2, starter == 3, starter == 4, starter == 99],
+                          [trees, 2, 3, 4, np.where(cover > 0.95, 6, 5), 8]).astype(np.float32)
+    dem = (100 + 300 * relief + 0.002 * np.arange(row0, row0 + rows)[:, None]).astype(np.float32)
+    landforms = np.clip(np.rint(1 + 9 * wet), 1, 10).astype(np.float32)
+    scenic = np.select([relief < 0.35, relief < 0.6], [0, 1], 2).astype(np.float32)
+    return {
+        "lc": landcover,
+        "starter": starter,
+        "rds": roads.astype(np.float32),
+        "nhd_patches": (wet > 0.9).astype(np.float32),
+        "landforms": landforms,
+        "scenic": scenic,
+        "dem": dem,
+    }
+
+def makeLandscape(folder, size, seed = 0):
+    "To write a synthetic town of size x size cells and return the paths by setting name."
+    os.makedirs(folder, exist_ok = True)
+    grids = {
+        "cover": ((_coarse(size, 400, seed), 400), (_coarse(size, 60, seed + 1), 60)),
+        "wet": ((_coarse(size, 800, seed + 2), 800), (_coarse(size, 120, seed + 3), 120)),
+        "relief": ((_coarse(size, 1600, seed + 4), 1600), (_coarse(size, 200, seed + 5), 200)),
+    }
+    profile = {
+        "driver": "GTiff", "width": size, "height": size, "count": 1, "dtype": "float32",
+        "crs": crs, "transform": from_origin(origin[0], origin[1], cell, cell), "nodata": -32768.0,
+        "tiled": True, "blockxsize": 256, "blockysize": 256, "compress": "deflate",
+    }
+    names = ["lc", "starter", "rds", "nhd_patches", "landforms", "scenic", "dem"]
+    paths = {name: os.path.join(folder, name + ".tif") for name in names}
+    files = {name: rasterio.open(paths[name], "w", **profile) for name in names}
+    try:
+        for row0 in range(0, size, strip_rows):
+            rows = min(strip_rows, size - row0)
+            window = rasterio.windows.Window(0, row0, size, rows)
+            for name, array in _strip(size, row0, rows, grids).items():
+                files[name].write(array, 1, window = window)
+    finally:
+        for f in files.values():
+            f.close()
+    paths.update(makeVectors(folder, size, seed))
+    return paths
+
+# ------------------------------------------------------------------------------
+# VECTORS
+# ------------------------------------------------------------------------------
+
+def makeVectors(folder, size, seed = 0):
+    "To write river corridors, small streams, e911 footprints and the town boundary."
+    import fiona
+    from shapely.geometry import LineString, box, mapping
+    rng = np.random.default_rng(seed + 10)
+    x0, y1 = origin
+    extent = size * cell
+    y0 = y1 - extent
+    streams = []
+    for k in range(max(2, size // 2000)):
+        x = x0 + rng.uniform(0.1, 0.9) * extent
+        y = np.linspace(y0, y1, 200)
+        wiggle = rng.uniform(20, 200) * np.sin(y / rng.uniform(300, 1500))
+        streams.append(LineString(np.column_stack([x + wiggle, y])))
+    corridors = [s.buffer(rng.uniform(20, 60)) for s in streams[::2]]
+    small = streams[1::2] or streams[:1]
+    footprints = []
+    for k in range(max(10, size // 50)):
+        x, y = x0 + rng.uniform(0, extent - 20), y0 + rng.uniform(0, extent - 20)
+        footprints.append(box(x, y, x + rng.uniform(6, 20), y + rng.uniform(6, 20)))
+    layers = {
+        "rc": ("Polygon", corridors, "OBJECTID"),
+        "rc_ss": ("LineString", small, "OBJECTID"),
+        "e911": ("Polygon", footprints, "CODE"),
+        "town": ("Polygon", [box(x0 + 5 * cell, y0 + 5 * cell, x0 + extent - 5 * cell, y1 - 5 * cell)], "FID"),
+    }
+    paths = {}
+    for name, (kind, shapes, field) in layers.items():
+        paths[name] = os.path.join(folder, name + ".shp")
+        schema = {"geometry": kind, "properties": {field: "int"}}
+        with fiona.open(paths[name], "w", driver = "ESRI Shapefile", crs = crs, schema = schema) as dst:
+            for k, shape in enumerate(shapes):
+                value = 6 if name == "e911" else k + 1
+                dst.write({"geometry": mapping(shape), "properties": {field: value}})
+    return paths
@@ -0,0 +1,161 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     block_table.py
+#  purpose:  Summarize every block of a label raster in one strip-wise scan
+#              alongside the starter layer, topology layers and lowlands, and
+#              write one row per block to Parquet: cells and acres of each
+#              starter class, lowland acres, bounding box, perimeter and the
+#              topology classes that touch the block. Reports filter this
+#              table instead of re-reading the rasters.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import numpy as np
+from rasterio.windows import Window
+
+import array_tools as at
+import region_graph as rag
+import scratch_store as ss
+import tiled_clump as tc
+from profiling import traced
+
+# Rows read per pass.
+
+strip_rows = 512
+
+# Topology classes recorded per topology layer, by code.
+
+topology_classes = {rag.island: "islands", rag.spit: "spits", rag.hole: "holes", rag.tombolo: "tombolos"}
+
+# ------------------------------------------------------------------------------
+# SCAN
+# ------------------------------------------------------------------------------
+
+# Per-block columns are dense arrays indexed by label. A topology class
+# touches a block when one of its cells is in the block or one of its eight
+# neighbours. Perimeter counts cell edges between the block and anything
+# else (including the raster edge), in map units.
+
+def _read(src, window):
+    "To read a window with a mask of valid cells."
+    values = src.read(1, window = window)
+    valid = np.ones(values.shape, dtype = bool) if src.nodata is None else values != src.nodata
+    return values, valid
+
+def _ring(src, row, rows, width, height):
+    "To read rows as int64 with a ring of one cell around them (noData and cells past the raster as 0)."
+    top, bottom = max(0, row - 1), min(height, row + rows + 1)
+    values, valid = _read(src, Window(0, top, width, bottom - top))
+    out = np.zeros((rows + 2, width + 2), dtype = np.int64)
+    out[top - row + 1:bottom - row + 1, 1:-1] = np.where(valid, values, 0)
+    return out
+
+def _neighbour(ring, dy, dx, rows, width):
+    "To give each cell's neighbour at (dy, dx) from a ring read."
+    return ring[1 + dy:1 + dy + rows, 1 + dx:1 + dx + width]
+
+@traced
+def summarize(blocks, starter, topologies = (), lowlands = None):
+    "To summarize each block of a label raster as columns of a dict, in one scan."
+    with ss.open(blocks) as src:
+        width, height = src.width, src.height
+        transform = src.profile["transform"]
+        n = int(at.readRange(src)[1]) + 1 if at.range_tag in src.tags() else None
+    if n is None:
+        with ss.open(blocks) as src:
+            n = max(int(_ring(src, row, min(strip_rows, height - row), width, height).max())
+                    for row in range(0, height, strip_rows)) + 1
+    cells = np.zeros(n, dtype = np.int64)
+    edges_x = np.zeros(n, dtype = np.int64)
+    edges_y = np.zeros(n, dtype = np.int64)
+    row_min, col_min = np.full(n, height, dtype = np.int64), np.full(n, width, dtype = np.int64)
+    row_max, col_max = np.full(n, -1, dtype = np.int64), np.full(n, -1, dtype = np.int64)
+    classes = {}
+    lowland = np.zeros(n, dtype = np.int64)
+    touches = {(name, code): np.zeros(n, dtype = bool) for name, _ in topologies for code in topology_classes}
+
+    sources = [ss.open(blocks), ss.open(starter)] + [ss.open(path) for _, path in topologies]
+    lows = ss.open(lowlands) if lowlands else None
+    try:
+        bsrc, ssrc, tsrcs = sources[0], sources[1], sources[2:]
+        for row in range(0, height, strip_rows):
+            rows = min(strip_rows, height - row)
+            # One cell of context around the strip for edges and touching classes.
+            ring = _ring(bsrc, row, rows, width, height)
+            labels = _neighbour(ring, 0, 0, rows, width)
+            inside = labels > 0
+            ids = labels[inside]
+            np.add.at(cells, ids, 1)
+            r, c = np.nonzero(inside)
+            np.minimum.at(row_min, ids, row + r)
+            np.maximum.at(row_max, ids, row + r)
+            np.minimum.at(col_min, ids, c)
+            np.maximum.at(col_max, ids, c)
+            # Cell edges to a different label (or off the raster).
+            for dy, dx, count in ((0, -1, edges_x), (0, 1, edges_x), (-1, 0, edges_y), (1, 0, edges_y)):
+                edge = inside & (_neighbour(ring, dy, dx, rows, width) != labels)
+                np.add.at(count, labels[edge], 1)
+            # Starter class histogram.
+            codes, valid = _read(ssrc, Window(0, row, width, rows))
+            keep = inside & valid
+            for code in np.unique(codes[keep]):
+                match = keep & (codes == code)
+                column = classes.setdefault(int(code), np.zeros(n, dtype = np.int64))
+                np.add.at(column, labels[match], 1)
+            # Lowland cells.
+            if lows is not None:
+                low, valid = _read(lows, Window(0, row, width, rows))
+                keep = inside & valid & (low != 0)
+                np.add.at(lowland, labels[keep], 1)
+            # Topology classes in or next to each block.
+            for (name, _), tsrc in zip(topologies, tsrcs):
+                topo = _ring(tsrc, row, rows, width, height)
+                for dy in (-1, 0, 1):
+                    for dx in (-1, 0, 1):
+                        near = _neighbour(topo, dy, dx, rows, width)
+                        for code in topology_classes:
+                            touches[(name, code)][labels[inside & (near == code)]] = True
+    finally:
+        for src in sources:
+            src.close()
+        if lows is not None:
+            lows.close()
+
+    # One row per block that has cells.
+    cell_w, cell_h = abs(transform.a), abs(transform.e)
+    area = cell_w * cell_h / tc.acre
+    present = np.nonzero(cells)[0]
+    columns = {
+        "block": present,
+        "cells": cells[present],
+        "acres": cells[present] * area,
+        "perimeter": edges_x[present] * cell_h + edges_y[present] * cell_w,
+        "xmin": transform.c + col_min[present] * transform.a,
+        "xmax": transform.c + (col_max[present] + 1) * transform.a,
+        "ymax": transform.f + row_min[present] * transform.e,
+        "ymin": transform.f + (row_max[present] + 1) * transform.e,
+    }
+    for code in sorted(classes):
+        columns["starter_%d_acres" % code] = classes[code][present] * area
+    if lowlands:
+        columns["lowland_acres"] = lowland[present] * area
+    for (name, code), touched in touches.items():
+        columns["%s_%s" % (name, topology_classes[code])] = touched[present]
+    return columns
+
+# ------------------------------------------------------------------------------
+# PARQUET
+# ------------------------------------------------------------------------------
+
+def write(columns, output):
+    "To write summary columns to a Parquet file."
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    pq.write_table(pa.table(columns), output)
+    return output
+
+def query(path, columns = None, filters = None):
+    "To read some columns and rows of a block table, e.g. filters=[('acres', '>', 100)]."
+    import pyarrow.parquet as pq
+    return pq.read_table(path, columns = columns, filters = filters)
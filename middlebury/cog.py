@@ -0,0 +1,85 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     cog.py
+#  purpose:  Write final products as cloud-optimized GeoTIFFs: tiled,
+#              compressed, with internal overviews and the tiles laid out
+#              so a viewer (QGIS over the network share, the tile server)
+#              reads only the blocks and overview level it draws.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import os
+
+import rasterio
+import rasterio.shutil
+from rasterio.enums import Resampling
+from rasterio.windows import Window
+
+import scratch_store as ss
+from profiling import traced
+from settings import setting
+
+# Tile size in cells, compression, and the smallest overview (in cells along
+# its longer side). Products are class codes or labels, so overviews take
+# the most common value by default.
+
+block_size = 512
+compress = setting("cog_compress", "deflate")
+min_overview = 256
+resampling = "mode"
+
+# ------------------------------------------------------------------------------
+# OVERVIEWS
+# ------------------------------------------------------------------------------
+
+def factors(width, height, smallest = None):
+    "To list overview factors (2, 4, 8, ...) until the overview fits the smallest size."
+    smallest = smallest or min_overview
+    out, factor = [], 2
+    while max(width, height) / factor >= smallest:
+        out.append(factor)
+        factor *= 2
+    return out or [2]
+
+# ------------------------------------------------------------------------------
+# WRITE
+# ------------------------------------------------------------------------------
+
+# The raster is copied into a tiled, compressed file, overviews are built in
+# it, and it is copied once more with copy_src_overviews so the overviews
+# come before the full-resolution tiles (the layout GDAL's COG driver makes,
+# without needing it).
+
+def _creation(profile):
+    "To give the creation options of a tiled, compressed GeoTIFF."
+    predictor = 2 if profile["dtype"] not in ("float32", "float64") else 3
+    return dict(driver = "GTiff", tiled = True, blockxsize = block_size, blockysize = block_size,
+                compress = compress, predictor = predictor, BIGTIFF = "IF_SAFER")
+
+@traced
+def write(input, output, method = None):
+    "To copy a raster (GeoTIFF or mapped) to a cloud-optimized GeoTIFF with internal overviews."
+    tmp = output + ".tmp.tif"
+    with ss.open(input) as src:
+        profile = src.profile.copy()
+        tags = src.tags()
+        profile.update(count = 1, **_creation(profile))
+        with rasterio.open(tmp, "w", **profile) as dst:
+            dst.update_tags(**tags)
+            for row in range(0, src.height, block_size):
+                window = Window(0, row, src.width, min(block_size, src.height - row))
+                dst.write(src.read(1, window = window), 1, window = window)
+    method = method or resampling
+    with rasterio.Env(COMPRESS_OVERVIEW = compress.upper(), PREDICTOR_OVERVIEW = profile["predictor"]):
+        with rasterio.open(tmp, "r+") as dst:
+            dst.build_overviews(factors(dst.width, dst.height), Resampling[method])
+            dst.update_tags(ns = "rio_overview", resampling = method)
+        rasterio.shutil.copy(tmp, output, copy_src_overviews = True, **_creation(profile))
+    os.remove(tmp)
+    return output
+
+def isCog(path):
+    "To tell whether a GeoTIFF is tiled and has internal overviews."
+    with rasterio.open(path) as src:
+        return bool(src.profile.get("tiled")) and bool(src.overviews(1))
@@ -7,22 +7,52 @@
 #  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
 #  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-# import tools from WBT module
-
-import sys
-sys.path.insert(1, '/Users/jhowarth/tools')
-from WBT.whitebox_tools import WhiteboxTools
-
-# declare a name for the tools
-
-wbt = WhiteboxTools()
+# import standard modules
+
+import functools
+import shutil
+
+# import in-memory raster methods and per-call contexts (with the WBT tools).
+
+import profiling
+
+import array_tools as at
+import raster_algebra as ra
+import tiled_filters as tf
+import tiled_clump as tc
+import tiled_geomorphons as tg
+import raster_cache as rcache
+import polygonize as pz
+import block_table as btab
+import region_graph as rag
+import road_crossings as rx
+import tiled_distance as td
+import cog
+from context import Context
+from settings import setting
 
 #  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 #  Working directories
 #  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-data_repo = "/Volumes/limuw/conservation/outputs/_goods/"
-scratch_repo = "/Volumes/limuw/conservation/outputs/_scratch"
+data_repo = setting("data_repo", "/Volumes/limuw/conservation/outputs/_goods/")
+scratch_repo = setting("scratch_repo", "/Volumes/limuw/conservation/outputs/_scratch")
+
+profiling.trace_file = setting("trace", data_repo+"_trace.jsonl")
+
+# Each call gets its own Context (see context.py): a private scratch folder
+# under scratch_repo, a local memory-mapped store and its own WhiteboxTools
+# handle, so calls can run at the same time on a thread or process pool.
+
+def invocation(func):
+    "To run each call of func in a new Context, unless one is passed as ctx."
+    @functools.wraps(func)
+    def call(*args, ctx = None, **kwargs):
+        if ctx is not None:
+            return func(*args, ctx = ctx, **kwargs)
+        with Context(scratch_repo, func.__name__) as ctx:
+            return func(*args, ctx = ctx, **kwargs)
+    return call
 
 #  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 #  Required datasets:
@@ -30,131 +60,175 @@ scratch_repo = "/Volumes/limuw/conservation/outputs/_scratch"
 
 # Imported datasets
 
-lc = "/Volumes/limuw/conservation/data/midd/iLandCover_midd_12152021.tif"
-dem = "/Volumes/limuw/conservation/data/midd/iDemHF_0p7_12222021.tif"
-rc = "/Volumes/limuw/conservation/data/vtShapes/vtRiverCorridors/WaterHydro_RiverCorridors/epsg32145/riverCorridors_epsg32145.shp"
-rc_ss = "/Volumes/limuw/conservation/data/vtShapes/vtRiverCorridors/WaterHydro_RiverCorridors/epsg32145/smallStreams_gtp25_epsg32145.shp"
+lc = setting("lc", "/Volumes/limuw/conservation/data/midd/iLandCover_midd_12152021.tif")
+dem = setting("dem", "/Volumes/limuw/conservation/data/midd/iDemHF_0p7_12222021.tif")
+rc = setting("rc", "/Volumes/limuw/conservation/data/vtShapes/vtRiverCorridors/WaterHydro_RiverCorridors/epsg32145/riverCorridors_epsg32145.shp")
+rc_ss = setting("rc_ss", "/Volumes/limuw/conservation/data/vtShapes/vtRiverCorridors/WaterHydro_RiverCorridors/epsg32145/smallStreams_gtp25_epsg32145.shp")
+
+# Starter layer made by _01_prep_lc_starter.py
+
+starter = setting("starter", "/Volumes/limuw/conservation/outputs/landscapePatches/_01/154_lc_update.tif")
 
 # ------------------------------------------------------------------------------
 # CLASSIFY LANDFORMS
 # ------------------------------------------------------------------------------
 
-def classifyLandforms():
-    "To classify landforms with geomorphons."
-    wbt.work_dir = scratch_repo
-    wbt.resample(inputs = dem, output = "_dem_3m.tif", cell_size=None, base=lc, method="cc")
-    wbt.geomorphons(dem = "_dem_3m.tif", output = data_repo+"_landforms.tif", search=5000, threshold=0.0, tdist=0, forms=True,)
+@invocation
+def classifyLandforms(engine = "wbt", ctx = None):
+    "To classify landforms with geomorphons (in one WBT pass, or in parallel tiles with engine='tiled')."
+    ctx.wbt.resample(inputs = dem, output = "_dem_3m.tif", cell_size=None, base=lc, method="cc")
+    if engine == "tiled":
+        tg.geomorphons(ctx.scratch("_dem_3m.tif"), data_repo+"_landforms.tif", search=5000, threshold=0.0, tdist=0, forms=True, sources=[dem, lc])
+        return;
+    ctx.wbt.geomorphons(dem = "_dem_3m.tif", output = data_repo+"_landforms.tif", search=5000, threshold=0.0, tdist=0, forms=True,)
     return;
 
 # ------------------------------------------------------------------------------
 # MAKE LOWLANDS BINARY
 # ------------------------------------------------------------------------------
 
-def makeLowlands(landforms):
+@invocation
+def makeLowlands(landforms, window = 11, ctx = None):
     "To classify lowlands from geomorphon landforms."
-    wbt.work_dir = scratch_repo
     # threshold landform classes
-    wbt.greater_than(input1 = landforms, input2 = 9,output = '_01.tif',incl_equals=True,)
-    # take majority class within 50 feet
-    wbt.majority_filter(i = "_01.tif", output = data_repo+"_lowlands.tif",filterx=11,filtery=11)
+    ctx.wbt.greater_than(input1 = landforms, input2 = 9,output = '_01.tif',incl_equals=True,)
+    # take majority class within 50 feet (window 11)
+    tf.focalFilter(ctx.scratch("_01.tif"), data_repo+"_lowlands.tif", "majority", filterx=window, filtery=window)
 
 # ------------------------------------------------------------------------------
 # MAKE BINARY LAYERS
 # ------------------------------------------------------------------------------
 
-def makeBinary(code, label):
+@invocation
+def makeBinary(code, label, ctx = None):
     "To make binary layer from a selected category."
-    wbt.work_dir = scratch_repo
-    wbt.equal_to(input1 = starter, input2 = code, output = data_repo+label+'_binary.tif')
-    wbt.set_nodata_value(i = data_repo+label+'_binary.tif', output = label+'_binary_0nd.tif',back_value=0)
-    wbt.clump(i = label+'_binary_0nd.tif', output = data_repo+label+'_objects.tif', diag=True, zero_back=False)
+    ra.write(ra.equal_to(starter, code), data_repo+label+'_binary.tif')
+    ctx.wbt.set_nodata_value(i = data_repo+label+'_binary.tif', output = label+'_binary_0nd.tif',back_value=0)
+    tc.clump(ctx.scratch(label+'_binary_0nd.tif'), data_repo+label+'_objects.tif', diag=True, zero_back=False)
     return;
 
 # ------------------------------------------------------------------------------
 # MAKE OBJECTS LAYERS
 # ------------------------------------------------------------------------------
 
-def makeObjects(code, label):
+@invocation
+def makeObjects(code, label, ctx = None):
     "To create objects from a selected category."
-    wbt.work_dir = scratch_repo
-    wbt.equal_to(input1 = starter, input2 = code, output = label+'_01.tif')
-    wbt.clump(i = label+'_01.tif', output = data_repo+label+'_objects.tif', diag = False, zero_back = True)
+    ra.write(ra.equal_to(starter, code), ctx.local(label+'_01.tif'))
+    tc.clump(ctx.local(label+'_01.tif'), data_repo+label+'_objects.tif', diag = False, zero_back = True)
     return;
 
 # ------------------------------------------------------------------------------
 # WITH ROAD CROSSINGS
 # ------------------------------------------------------------------------------
 
-def withRoadXing(base, label):
-    "To find road crossings with a selected category."
-    wbt.work_dir = scratch_repo
-    wbt.not_equal_to(input1 = base, input2 = 0, output = '_01.tif')
-    wbt.maximum_filter(i = '_01.tif', output = '_02.tif', filterx=5, filtery=5)
-    wbt.equal_to(input1 = starter, input2 = 99, output = '_03.tif')
-    wbt.multiply(input1 = '_03.tif', input2 = '_02.tif', output='_04.tif')
-    wbt.Or(input1 ='_04.tif', input2='_01.tif', output='_05.tif')
-    wbt.clump(i = '_05.tif', output = data_repo+label+'_withRoadXing.tif', diag=True, zero_back=True)
+@invocation
+def withRoadXing(base, label, engine = "graph", window = 5, ctx = None):
+    "To find road crossings with a selected category (joined by union-find, or by re-clumping with engine='clump')."
+    if engine == "graph":
+        rx.joinAcross(base, starter, data_repo+label+'_withRoadXing.tif', code=99, filterx=window, filtery=window)
+        return;
+    ra.write(ra.not_equal_to(base, 0), ctx.local('_01.tif'))
+    tf.focalFilter(ctx.local('_01.tif'), ctx.local('_02.tif'), "max", filterx=window, filtery=window)
+    # Fragmenting roads within the grown blocks, unioned with the blocks.
+    roads = ra.multiply(ra.equal_to(starter, 99), ctx.local('_02.tif'))
+    ra.write(ra.Or(roads, ctx.local('_01.tif')), ctx.local('_05.tif'))
+    tc.clump(ctx.local('_05.tif'), data_repo+label+'_withRoadXing.tif', diag=True, zero_back=True)
     return;
 
 # ------------------------------------------------------------------------------
 # CLASSIFY TOPOLOGY FUNCTION
 # ------------------------------------------------------------------------------
 
-def classTopology(figure, ground, label):
+@invocation
+def classTopology(figure, ground, label, engine = "fused", ctx = None):
     "To create topology classes for figure and ground object layers with 0 as background."
-    wbt.work_dir = scratch_repo
+    if engine == "fused":
+        return classTopologyFused(figure, ground, label, ctx = ctx)
+    if engine == "graph":
+        return classTopologyGraph(figure, ground, label, ctx = ctx)
 
     # Convert figure background 0 into noData.
-    wbt.set_nodata_value(i = figure, output = 'a.tif', back_value = 0)
+    ctx.wbt.set_nodata_value(i = figure, output = 'a.tif', back_value = 0)
 
     # Grow ground edge by one pixel.
-    wbt.maximum_filter(i = ground, output = 'b.tif', filterx=3, filtery=3)
+    ctx.wbt.maximum_filter(i = ground, output = 'b.tif', filterx=3, filtery=3)
     # Test for overlap.
-    wbt.zonal_statistics(i = 'b.tif', features = 'a.tif', output = 'c.tif', stat = "max", out_table = None)
+    ctx.wbt.zonal_statistics(i = 'b.tif', features = 'a.tif', output = 'c.tif', stat = "max", out_table = None)
     # Test for inequality
-    wbt.not_equal_to(input1 = 'c.tif', input2 = 'b.tif', output = 'd.tif')
+    ctx.wbt.not_equal_to(input1 = 'c.tif', input2 = 'b.tif', output = 'd.tif')
 
     # ISLAND TEST
     # if max is 0 then island.
-    wbt.zonal_statistics(i = 'd.tif', features = 'a.tif', output = 'e.tif', stat = "max", out_table = None)
-    wbt.equal_to(input1 = 'e.tif', input2 = 0, output = '_islands.tif')
+    ctx.wbt.zonal_statistics(i = 'd.tif', features = 'a.tif', output = 'e.tif', stat = "max", out_table = None)
+    ctx.wbt.equal_to(input1 = 'e.tif', input2 = 0, output = '_islands.tif')
 
     # Erase equal overlap
-    wbt.multiply(input1 = 'd.tif', input2 = 'b.tif', output = 'e.tif')
+    ctx.wbt.multiply(input1 = 'd.tif', input2 = 'b.tif', output = 'e.tif')
     # Test for overlap again.
-    wbt.zonal_statistics(i = 'e.tif', features = 'a.tif', output = 'f.tif', stat = "max", out_table = None)
+    ctx.wbt.zonal_statistics(i = 'e.tif', features = 'a.tif', output = 'f.tif', stat = "max", out_table = None)
 
     # TOMBOLO TEST
     # If greater than 0, then figure connects at least two ground patches.
-    wbt.greater_than(input1 = 'f.tif', input2 = 0, output = '_tombolos.tif', incl_equals=False)
+    ctx.wbt.greater_than(input1 = 'f.tif', input2 = 0, output = '_tombolos.tif', incl_equals=False)
 
     # Assemble figure objects that have been classed thus far.
-    wbt.Or(input1 = '_islands.tif', input2 = '_tombolos.tif', output='g.tif')
-    wbt.equal_to(input1 = 'g.tif', input2 = 0, output = 'h.tif')
+    ctx.wbt.Or(input1 = '_islands.tif', input2 = '_tombolos.tif', output='g.tif')
+    ctx.wbt.equal_to(input1 = 'g.tif', input2 = 0, output = 'h.tif')
 
     # Convert ground into a binary.
-    wbt.not_equal_to(input1 = ground, input2 = 0, output = 'aa.tif')
+    ctx.wbt.not_equal_to(input1 = ground, input2 = 0, output = 'aa.tif')
     # Convert figure into binary
-    wbt.not_equal_to(input1 = figure, input2 = 0, output = 'bb.tif')
+    ctx.wbt.not_equal_to(input1 = figure, input2 = 0, output = 'bb.tif')
     # Union figure and ground binaries.
-    wbt.Or(input1 = 'aa.tif', input2 = 'bb.tif', output='cc.tif')
+    ctx.wbt.Or(input1 = 'aa.tif', input2 = 'bb.tif', output='cc.tif')
     # Invert union
-    wbt.equal_to(input1 = 'cc.tif', input2 = 0, output = 'dd.tif')
+    ctx.wbt.equal_to(input1 = 'cc.tif', input2 = 0, output = 'dd.tif')
     # Grow ground edge by one pixel.
-    wbt.maximum_filter(i = 'dd.tif', output = 'ee.tif', filterx=3, filtery=3)
+    ctx.wbt.maximum_filter(i = 'dd.tif', output = 'ee.tif', filterx=3, filtery=3)
 
     # TEST HOLES VERSUS SPITS
-    wbt.zonal_statistics(i = 'ee.tif', features = 'a.tif', output = 'gg.tif', stat = "max", out_table = None)
+    ctx.wbt.zonal_statistics(i = 'ee.tif', features = 'a.tif', output = 'gg.tif', stat = "max", out_table = None)
     # If test = 0, then hole, else spit.
-    wbt.equal_to(input1 = 'gg.tif', input2 = 0, output = 'hh.tif')
-    wbt.not_equal_to(input1 = 'gg.tif', input2 = 0, output = 'ii.tif')
+    ctx.wbt.equal_to(input1 = 'gg.tif', input2 = 0, output = 'hh.tif')
+    ctx.wbt.not_equal_to(input1 = 'gg.tif', input2 = 0, output = 'ii.tif')
     # Remove previously classed patches from outputs
-    wbt.multiply(input1 = 'hh.tif', input2 = 'h.tif', output = '_holes.tif')
-    wbt.multiply(input1 = 'ii.tif', input2 = 'h.tif', output = '_spits.tif')
+    ctx.wbt.multiply(input1 = 'hh.tif', input2 = 'h.tif', output = '_holes.tif')
+    ctx.wbt.multiply(input1 = 'ii.tif', input2 = 'h.tif', output = '_spits.tif')
     # compile topology class layer where islands = 1, spits = 2, holes = 3 and tombolos = 4
     address = label+"_topology.tif"
-    wbt.raster_calculator(output = address, statement="('_islands.tif') + ('_spits.tif' * 2) + ('_holes.tif' * 3) + ('_tombolos.tif' * 4)")
-    wbt.convert_nodata_to_zero(i = label+"_topology.tif", output = data_repo+label+'_topology.tif')
+    ctx.wbt.raster_calculator(output = address, statement="('_islands.tif') + ('_spits.tif' * 2) + ('_holes.tif' * 3) + ('_tombolos.tif' * 4)")
+    ctx.wbt.convert_nodata_to_zero(i = label+"_topology.tif", output = data_repo+label+'_topology.tif')
+    return;
+
+# Same classes as classTopology, but with the figure and ground read once and
+# classed in memory. Only the last step (noData to zero) still runs in WBT, so
+# the output in data_repo is written by the same tool as before.
+
+@invocation
+def classTopologyFused(figure, ground, label, ctx = None):
+    "To create topology classes for figure and ground object layers in memory."
+    fig, fig_valid, profile = at.readRaster(figure)
+    gnd, gnd_valid, _ = at.readRaster(ground)
+    topology, valid = at.classTopology(fig, fig_valid, gnd, gnd_valid)
+    address = label+"_topology.tif"
+    # float32 with noData -32768, as the WBT chain writes, so the published topology is the same file.
+    at.writeRaster(ctx.scratch(address), topology, valid, profile)
+    ctx.wbt.convert_nodata_to_zero(i = address, output = data_repo+label+'_topology.tif')
+    return;
+
+# Same classes from a region adjacency graph of the objects (see
+# region_graph.py). The graph is kept beside the topology raster, and the
+# block and connector steps below select classes from it when it is there.
+
+@invocation
+def classTopologyGraph(figure, ground, label, ctx = None):
+    "To create topology classes for figure and ground object layers from their adjacency graph."
+    graph = rag.build(figure, ground)
+    address = data_repo+label+'_topology.tif'
+    # float32, like the WBT and fused topology products.
+    ra.write(ra.convert_nodata_to_zero(ra.lookup(figure, graph.classTable())), address, dtype="float32")
+    graph.save(rag.graphFile(address))
     return;
 
 # ------------------------------------------------------------------------------
@@ -163,179 +237,187 @@ def classTopology(figure, ground, label):
 
 # Make forest habitat blocks by combining reforested with recovering-reforested holes.
 
-def makeForestHabitatBlocks(blocks, topology, label):
+@invocation
+def makeForestHabitatBlocks(blocks, topology, label, ctx = None):
     "To make habitat blocks by filling holes."
 
-    wbt.work_dir = scratch_repo
     # Select holes from topology.
-    wbt.equal_to(input1 = topology, input2 = 3, output = '_01.tif')
+    holes = rag.select(topology, (rag.hole,))
     # Union holes with ground.
-    wbt.Or(input1 = blocks, input2 = '_01.tif', output = '_02.tif')
+    ra.write(ra.Or(blocks, holes), ctx.local('_02.tif'))
     # Identify objects.
-    wbt.clump(i = '_02.tif', output = data_repo+label+'_blocks.tif', diag=True, zero_back=True)
+    tc.clump(ctx.local('_02.tif'), data_repo+label+'_blocks.tif', diag=True, zero_back=True)
     return;
 
 # ------------------------------------------------------------------------------
 # FIELD HABITAT BLOCK FUNCTION
 # ------------------------------------------------------------------------------
 
-def makeFieldHabitatBlocks(ground, topology1, topology2, label):
+@invocation
+def makeFieldHabitatBlocks(ground, topology1, topology2, label, ctx = None):
     "To make field habitat blocks with recovering-clearing holes and recovering-forest islands."
-    wbt.work_dir = scratch_repo
 
     # Select recovering holes in clearing ground from topology1.
-    wbt.equal_to(input1 = topology1, input2 = 3, output = '_01.tif')
+    holes = rag.select(topology1, (rag.hole,))
     # Select recovering islands in forest ground from topology2.
-    wbt.equal_to(input1 = topology2, input2 = 1, output = '_02.tif')
+    islands = rag.select(topology2, (rag.island,))
     # Union holes and islands .
-    wbt.Or(input1 = '_01.tif', input2 = '_02.tif', output = '_03.tif')
+    features = ra.Or(holes, islands)
     # Make binary from field ground
-    wbt.not_equal_to(input1 = ground, input2 = 0, output = '_04.tif')
+    ground_binary = ra.not_equal_to(ground, 0)
     # Union topology features with ground binary.
-    wbt.Or(input1 = '_03.tif', input2 = '_04.tif', output = '_05.tif')
+    ra.write(ra.Or(features, ground_binary), ctx.local('_05.tif'))
     # Identify objects.
-    wbt.clump(i = '_05.tif', output = data_repo+label+'_blocks.tif', diag=True, zero_back=True)
+    tc.clump(ctx.local('_05.tif'), data_repo+label+'_blocks.tif', diag=True, zero_back=True)
     return;
 
 # ------------------------------------------------------------------------------
 # MAKE RIVER CORRIDORS AND SMALL STREAMS BINARY
 # ------------------------------------------------------------------------------
 
-def makeRiverCorridorsAndSmallStreamsBinary():
-    wbt.work_dir = scratch_repo
-    wbt.vector_polygons_to_raster(i=rc, output='_01.tif', field="OBJECTID", nodata=False, cell_size=None, base=starter)
-    wbt.vector_lines_to_raster(i=rc_ss, output='_02.tif', field="OBJECTID", nodata=False, cell_size=None, base=starter)
-    wbt.buffer_raster(i='_02.tif', output='_03.tif', size=15, gridcells=False)
-    wbt.Or(input1='_01.tif', input2='_03.tif', output=data_repo+'_riverCorridors_with_smallStreamBuffers.tif')
+@invocation
+def makeRiverCorridorsAndSmallStreamsBinary(size = 15, ctx = None):
+    # River corridors and small stream buffers are rasterized once per grid (see raster_cache.py).
+    corridors = rcache.rasterize("polygons", rc, "OBJECTID", starter)
+    streams = rcache.buffered("lines", rc_ss, "OBJECTID", starter, size)
+    ra.write(ra.Or(corridors, streams), data_repo+'_riverCorridors_with_smallStreamBuffers.tif')
     return;
 
 # ------------------------------------------------------------------------------
 # BLOCKS WITH RIVER CORRIDORS
 # ------------------------------------------------------------------------------
 
-def withRiverCorridors(base, label):
-    wbt.work_dir = scratch_repo
-    wbt.vector_polygons_to_raster(i=rc, output=data_repo+'_riverCorridors.tif', field="OBJECTID", nodata=False, cell_size=None, base=starter)
-    wbt.not_equal_to(input1 = base, input2 = 0, output = '_01.tif')
-    wbt.Or(input1=data_repo+'_riverCorridors.tif', input2='_01.tif', output='_02.tif')
-    wbt.clump(i = '_02.tif', output = data_repo+label+'_with_river_corridors.tif', diag=True, zero_back=True)
+@invocation
+def withRiverCorridors(base, label, ctx = None):
+    corridors = rcache.rasterize("polygons", rc, "OBJECTID", starter)
+    shutil.copyfile(corridors, data_repo+'_riverCorridors.tif')
+    ra.write(ra.Or(corridors, ra.not_equal_to(base, 0)), ctx.local('_02.tif'))
+    tc.clump(ctx.local('_02.tif'), data_repo+label+'_with_river_corridors.tif', diag=True, zero_back=True)
     return;
 
 # ------------------------------------------------------------------------------
 # BLOCKS WITH RIVER CORRIDORS AND SMALL STREAMS
 # ------------------------------------------------------------------------------
 
-def withRiverCorridorsAndSmallStreams(base, label):
-    wbt.work_dir = scratch_repo
-    wbt.vector_polygons_to_raster(i=rc, output='_01.tif', field="OBJECTID", nodata=False, cell_size=None, base=starter)
-    wbt.vector_lines_to_raster(i=rc_ss, output='_02.tif', field="OBJECTID", nodata=False, cell_size=None, base=starter)
-    wbt.buffer_raster(i='_02.tif', output='_03.tif', size=15, gridcells=False)
-    wbt.Or(input1='_01.tif', input2='_03.tif', output=data_repo+'_riverCorridors.tif')
-    wbt.not_equal_to(input1 = base, input2 = 0, output = '_04.tif')
-    wbt.Or(input1=data_repo+'_riverCorridors.tif', input2='_04.tif', output='_05.tif')
-    wbt.clump(i = '_05.tif', output = data_repo+label+'_with_river_corridors_and_small_streams.tif', diag=True, zero_back=True)
+@invocation
+def withRiverCorridorsAndSmallStreams(base, label, size = 15, ctx = None):
+    corridors = rcache.rasterize("polygons", rc, "OBJECTID", starter)
+    streams = rcache.buffered("lines", rc_ss, "OBJECTID", starter, size)
+    ra.write(ra.Or(corridors, streams), data_repo+'_riverCorridors.tif')
+    ra.write(ra.Or(data_repo+'_riverCorridors.tif', ra.not_equal_to(base, 0)), ctx.local('_05.tif'))
+    tc.clump(ctx.local('_05.tif'), data_repo+label+'_with_river_corridors_and_small_streams.tif', diag=True, zero_back=True)
+    return;
+
+# ------------------------------------------------------------------------------
+# DISTANCE TO STARTER CLASSES
+# ------------------------------------------------------------------------------
+
+# Distance in map units from each cell to the nearest cell of the given
+# starter codes (e.g. 99 for fragmenting roads, 4 for developed land), capped
+# at max_distance (see tiled_distance.py).
+
+@invocation
+def distanceTo(codes, label, max_distance = 300, ctx = None):
+    "To make a distance layer to starter cells of some codes, capped at max_distance."
+    td.distance(starter, data_repo+'_distance_to'+label+'.tif', max_distance, sources=tuple(codes))
     return;
 
 # ------------------------------------------------------------------------------
 # DEFINE OPEN LOWLAND HABITAT
 # ------------------------------------------------------------------------------
 
-def openLowlands(lowlands, blocks, starter):
+@invocation
+def openLowlands(lowlands, blocks, starter, ctx = None):
     # tag lowlands with forest habitat patches.
-    wbt.multiply(input1 = lowlands, input2 = blocks, output = '_01.tif')
+    tagged = ra.multiply(lowlands, blocks)
     # isolate the forest block negative space.
-    wbt.equal_to(input1 = '_01.tif', input2 = 0, output = '_02.tif')
+    negative = ra.equal_to(tagged, 0)
     # make inverse developed binary layer (0 if developed, 1 if not developed).
-    wbt.not_equal_to(input1 = starter, input2 = 4, output = '_03.tif')
+    ra.write(ra.not_equal_to(starter, 4), ctx.local('_03.tif'))
     # grow inversed developed binary layer to remove fragmenting roads.
-    wbt.minimum_filter(i = '_03.tif', output = '_04.tif', filterx=5, filtery=5)
+    tf.focalFilter(ctx.local('_03.tif'), ctx.local('_04.tif'), "min", filterx=5, filtery=5)
     # intersect inverse developed binary layer and forest block negative space to identify open, undeveloped space.
-    wbt.And(input1='_02.tif', input2='_04.tif', output='_05.tif')
+    open_space = ra.And(negative, ctx.local('_04.tif'))
     # intersect green negative space and lowlands to identify potential connectors.
-    wbt.And(input1=lowlands, input2='_05.tif', output='_06.tif')
+    ra.write(ra.And(lowlands, open_space), ctx.local('_06.tif'))
     # Make objects
-    wbt.clump(i = '_06.tif', output = data_repo+'_open_lowlands.tif', diag=False, zero_back=True)
+    tc.clump(ctx.local('_06.tif'), data_repo+'_open_lowlands.tif', diag=False, zero_back=True)
     return;
 
 # ------------------------------------------------------------------------------
 # DEFINE HABITAT CONNECTORS
 # ------------------------------------------------------------------------------
 
-def makeHabitatConnectors(forest_blocks, field_blocks, forest_topology, lowland_topology, rivers):
-    wbt.work_dir = scratch_repo
-    # Criteria 1 - where recovering patches spur forest blocks --> habitat connectors
-    wbt.equal_to(input1 = forest_topology, input2 = 2, output = '_01.tif')
-    # Criteria 2 - where recovering patches tombolo forest blocks --> habitat connectors
-    wbt.equal_to(input1 = forest_topology, input2 = 4, output = '_02.tif')
+@invocation
+def makeHabitatConnectors(forest_blocks, field_blocks, forest_topology, lowland_topology, rivers, ctx = None):
+    # Criteria 1 and 2 - where recovering patches spur or tombolo forest blocks --> habitat connectors
+    spits_tombolos = rag.select(forest_topology, (rag.spit, rag.tombolo))
     # Criteria 3 - where open lowlands touch one or more forest block
-    wbt.greater_than(input1 = lowland_topology, input2 = 2, output = '_03.tif', incl_equals=True)
+    lowland = rag.select(lowland_topology, (rag.spit, rag.hole, rag.tombolo))
     # Criteria 4: where river and small stream corridors intersect field blocks
-    wbt.And(input1 = rivers, input2 = field_blocks, output = '_04.tif')
+    corridors = ra.And(rivers, field_blocks)
     # Union criteria
-    wbt.raster_calculator(output = data_repo+'_forest_habitat_connectors.tif', statement="'_01.tif' || '_02.tif' || '_03.tif' || '_04.tif'")
+    ra.write(ra.Or(spits_tombolos, ra.Or(lowland, corridors)), data_repo+'_forest_habitat_connectors.tif')
     return;
 
 # ------------------------------------------------------------------------------
 # IDENTIFY FIELD BLOCKS IN SCENIC FOREGROUNDS
 # ------------------------------------------------------------------------------
 
-def identifyScenicForegrounds(blocks, scenic, label):
-    wbt.work_dir = scratch_repo
+@invocation
+def identifyScenicForegrounds(blocks, scenic, label, ctx = None):
     # Criteria 1 - where field blocks intersect scenic foregrounds
     # Make field blocks binary.
-    wbt.not_equal_to(input1 = blocks, input2 = 0, output = '_01.tif')
+    field = ra.not_equal_to(blocks, 0)
     # Make scenic blocks binary for foreground visibility.
-    wbt.equal_to(input1 = scenic, input2 = 2, output = '_02.tif')
+    foreground = ra.equal_to(scenic, 2)
     # Intersect field blocks and scenic foregrounds.
-    wbt.And(input1 = '_01.tif', input2 = '_02.tif', output = data_repo+label+'_block_scenic_foregrounds.tif')
+    ra.write(ra.And(field, foreground), data_repo+label+'_block_scenic_foregrounds.tif')
     return;
 
 # ------------------------------------------------------------------------------
 # IDENTIFY FIELD BLOCKS IN CLEARINGS
 # ------------------------------------------------------------------------------
 
-def identifyClearings(blocks, starter, label):
-    wbt.work_dir = scratch_repo
+@invocation
+def identifyClearings(blocks, starter, label, ctx = None):
     # Criteria 1 - where field blocks intersect scenic foregrounds
     # Make field blocks binary.
-    wbt.not_equal_to(input1 = blocks, input2 = 0, output = '_01.tif')
+    field = ra.not_equal_to(blocks, 0)
     # Make clearing binary .
-    wbt.equal_to(input1 = starter, input2 = 3, output = '_02.tif')
+    clearing = ra.equal_to(starter, 3)
     # Intersect field blocks and clearings.
-    wbt.And(input1 = '_01.tif', input2 = '_02.tif', output = data_repo+label+'_block_clearings.tif')
+    ra.write(ra.And(field, clearing), data_repo+label+'_block_clearings.tif')
     return;
 
 # ------------------------------------------------------------------------------
 # CLASSIFY FIELD BLOCKS
 # ------------------------------------------------------------------------------
 
-def classifyFieldBlocks(blocks, scenic, soils, starter):
-    wbt.work_dir = scratch_repo
+@invocation
+def classifyFieldBlocks(blocks, scenic, starter, ctx = None):
     # Make field blocks binary.
-    wbt.not_equal_to(input1 = blocks, input2 = 0, output = '_01.tif')
+    field = ra.not_equal_to(blocks, 0)
     # Criteria 1 - where field blocks intersect scenic foregrounds
     # Make scenic blocks binary for foreground visibility.
-    wbt.equal_to(input1 = scenic, input2 = 2, output = '_02.tif')
+    ra.write(ra.equal_to(scenic, 2), ctx.local('_02.tif'))
     # Remove noise from scenic layer.
-    wbt.maximum_filter(i = '_02.tif', output = '_03.tif', filterx=3, filtery=3)
+    tf.focalFilter(ctx.local('_02.tif'), ctx.local('_03.tif'), "max", filterx=3, filtery=3)
     # SCENIC FOREGROUNDS: Intersect field blocks and scenic foregrounds.
-    wbt.And(input1 = '_01.tif', input2 = '_03.tif', output = '_04.tif')
+    foregrounds = ra.And(field, ctx.local('_03.tif'))
     # Criteria 2 - where field blocks intersect recovering
-    # Make clearing binary .
-    wbt.equal_to(input1 = starter, input2 = 0, output = '_05.tif')
-    # RECOVERING: Intersect field blocks and clearings.
-    wbt.And(input1 = '_01.tif', input2 = '_05.tif', output = '_06.tif')
+    # RECOVERING: Intersect field blocks and recovering.
+    recovering = ra.And(field, ra.equal_to(starter, 0))
     # Criteria 3 - where field blocks intersect clearing
-    # Make clearing binary .
-    wbt.equal_to(input1 = starter, input2 = 3, output = '_07.tif')
     # CLEARINGS: Intersect field blocks and clearings.
-    wbt.And(input1 = '_01.tif', input2 = '_07.tif', output = '_08.tif')
+    clearings = ra.And(field, ra.equal_to(starter, 3))
     # Tag composite classes: 1 FIELD, 1000 SCENIC, 10 RECOVERING, 100 CLEARING
-    statement = "(('_04.tif' * 1000) + ('_06.tif' * 10) + ('_08.tif' * 100) + '_01.tif')"
-    wbt.raster_calculator(output = '_09.tif', statement = statement)
+    tags = ra.add(ra.multiply(foregrounds, 1000), ra.multiply(recovering, 10))
+    tags = ra.add(ra.add(tags, ra.multiply(clearings, 100)), field)
     # COMPOSITE LAYER: 0 background, 1 old field, 2 working field, 3 field in scenic foreground
     reclass = "0;0;1;1;1;11;2;101;3;1001;3;1011;3;1101"
-    wbt.reclass(i = '_09.tif', output = data_repo+'_field_blocks_classed.tif', reclass_vals = reclass, assign_mode=True)
+    # Tag and reclass in one pass, stored as uint8.
+    ra.write(ra.reclass(tags, reclass, assign_mode=True), data_repo+'_field_blocks_classed.tif', dtype="uint8")
     return;
 
 # ------------------------------------------------------------------------------
@@ -344,23 +426,54 @@ def classifyFieldBlocks(blocks, scenic, soils, starter):
 
 # forest = forest block, connector = habitat connector, field = classed field block, starter = landcover classes
 
-def makeComposite(forest, connector, field, starter):
+@invocation
+def makeComposite(forest, connector, field, starter, ctx = None):
     # Make binary of FOREST BLOCKS.
-    wbt.not_equal_to(input1 = forest, input2 = 0, output = '_01.tif')
+    forest_binary = ra.not_equal_to(forest, 0)
     # Make binary of HABITAT CONNECTORS.
-    wbt.not_equal_to(input1 = connector, input2 = 0, output = '_02.tif')
+    connector_binary = ra.not_equal_to(connector, 0)
     # Union forest blocks and habitat connectors.
-    wbt.Or(input1 = '_01.tif', input2 = '_02.tif', output = '_03.tif')
+    union = ra.Or(forest_binary, connector_binary)
     # Make binary of FIELD BLOCKS.
-    wbt.not_equal_to(input1 = field, input2 = 0, output = '_04.tif')
+    field_binary = ra.not_equal_to(field, 0)
     # Erase field blocks that are not habitat connector or forest block.
-    wbt.Not(input1 = '_04.tif', input2 = '_03.tif', output = '_05.tif')
-    wbt.multiply(input1 = field, input2 = '_05.tif', output = '_06.tif')
+    fields = ra.multiply(field, ra.Not(field_binary, union))
     # Erase habitat connectors that are forest blocks.
-    wbt.Not(input1 = '_02.tif', input2 = '_01.tif', output = '_07.tif')
+    connectors = ra.Not(connector_binary, forest_binary)
     # make composite layer
-    statement = "(('_01.tif' * 5) + ('_07.tif' * 4) + '_06.tif')"
-    wbt.raster_calculator(output = data_repo+'_conservation_plan.tif', statement = statement)
+    composite = ra.add(ra.add(ra.multiply(forest_binary, 5), ra.multiply(connectors, 4)), fields)
+    ra.write(composite, ctx.local('_01.tif'))
+    # Final product: tiled, compressed, with overviews (see cog.py).
+    cog.write(ctx.local('_01.tif'), data_repo+'_conservation_plan.tif')
+    return;
+
+# ------------------------------------------------------------------------------
+# EXPORT BLOCK POLYGONS
+# ------------------------------------------------------------------------------
+
+# Blocks are streamed from their label rasters into one GeoPackage (see
+# polygonize.py), with the most common plan class (forest) or field class of
+# each block and its acres.
+
+@invocation
+def exportBlocks(forest, field, plan, field_classes, ctx = None):
+    "To write forest and field habitat blocks as polygon layers of a GeoPackage."
+    output = data_repo+'_habitat_blocks.gpkg'
+    pz.polygonize(forest, output, "forest_blocks", classes=plan)
+    pz.polygonize(field, output, "field_blocks", classes=field_classes)
+    return;
+
+# ------------------------------------------------------------------------------
+# BLOCK SUMMARY TABLE
+# ------------------------------------------------------------------------------
+
+# topologies is a tuple of (name, topology raster) pairs; see block_table.py
+# for the columns.
+
+@invocation
+def summarizeBlocks(blocks, label, topologies, lowlands, ctx = None):
+    "To write one row per block (starter class acres, lowlands, extent, perimeter, touching topology) to Parquet."
+    btab.write(btab.summarize(blocks, starter, topologies, lowlands), data_repo+label+'_summary.parquet')
     return;
 
 # # ------------------------------------------------------------------------------
@@ -385,8 +498,10 @@ def makeComposite(forest, connector, field, starter):
 # CLIP TO TOWN BOUNDARY
 # ------------------------------------------------------------------------------
 
-def clipByTown(label, image, town, mama):
-    wbt.vector_polygons_to_raster(i = town, output = "_01.tif", field = "FID", nodata = False, cell_size = None, base = mama)
-    wbt.set_nodata_value(i = "_01.tif", output = '_02.tif',back_value=0.0)
-    wbt.multiply(input1 = image, input2 = '_02.tif', output = data_repo+label+'_clipByTown.tif')
+@invocation
+def clipByTown(label, image, town, mama, ctx = None):
+    ctx.wbt.vector_polygons_to_raster(i = town, output = "_01.tif", field = "FID", nodata = False, cell_size = None, base = mama)
+    ctx.wbt.set_nodata_value(i = "_01.tif", output = '_02.tif',back_value=0.0)
+    ctx.wbt.multiply(input1 = image, input2 = '_02.tif', output = '_03.tif')
+    cog.write(ctx.scratch('_03.tif'), data_repo+label+'_clipByTown.tif')
     return;
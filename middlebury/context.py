@@ -0,0 +1,61 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     context.py
+#  purpose:  Give each call of a conservation_tools function its own
+#              context: a private scratch folder, a local memory-mapped
+#              store and its own WhiteboxTools handle, in place of the shared
+#              wbt object and work_dir. Calls with separate contexts never
+#              touch each other's files, so they can run concurrently.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+# import tools from WBT module
+
+import os
+import shutil
+import sys
+import tempfile
+sys.path.insert(1, '/Users/jhowarth/tools')
+from WBT.whitebox_tools import WhiteboxTools
+
+import profiling
+import scratch_store as ss
+
+class Context:
+    "One call's scratch namespace and WhiteboxTools handle (every tool call is traced, see profiling.py)."
+
+    def __init__(self, scratch_repo, name = "call", threads = None):
+        os.makedirs(scratch_repo, exist_ok = True)
+        self.name = name
+        self.scratch_repo = tempfile.mkdtemp(prefix = name + "_", dir = scratch_repo)
+        tools = WhiteboxTools()
+        # Cap WBT's own threads (it uses every CPU by default) when calls run side by side.
+        if threads:
+            tools.set_max_procs(threads)
+        self.wbt = profiling.InstrumentedTools(tools)
+        self.wbt.work_dir = self.scratch_repo
+
+    def scratch(self, name):
+        "To give the full path of a GeoTIFF in this call's scratch folder."
+        return os.path.join(self.scratch_repo, name)
+
+    # Intermediates that only pass between the in-memory engines (raster
+    # algebra, tiled filters and clumps) go here; anything WBT reads stays a
+    # GeoTIFF in the scratch folder.
+
+    def local(self, name):
+        "To give the path of a memory-mapped scratch raster (see scratch_store.py)."
+        return ss.path(name, self.scratch_repo)
+
+    def close(self):
+        "To delete this call's scratch files."
+        ss.clear(self.scratch_repo)
+        shutil.rmtree(self.scratch_repo, ignore_errors = True)
+        return;
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,399 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     incremental.py
+#  purpose:  Recompute only the part of the plan a small edit touches (new
+#              E911 footprints, road edits, a corrected landcover patch) and
+#              patch it into the existing products:
+#
+#              python incremental.py --bbox left bottom right top \
+#                  --input lc=lc.tif --input rds=rds.tif --input e911=e911.shp ...
+#
+#            The changed box (or the nonzero cells of --mask) is grown over
+#            the landcover patches _01 clumps that the change can resize, and
+#            then until every object of every label product that touches it
+#            lies inside, so no object is cut. _01 and _03 then run on that
+#            window plus a halo and every patch the halo touches (so no cell
+#            is sized from part of a patch), and the window is written back
+#            into data_repo and work_dir.
+#            Patched objects get new IDs above the old maximum, so IDs stay
+#            unique (but are no longer numbered in scan order).
+#
+#            When the closed window passes max_fraction of the grid, or new
+#            IDs would overflow uint32, _01 and _03 rerun on the whole grid
+#            instead. After a patch the GeoPackage and Parquet products are
+#            made again from the patched rasters, and adjacency graphs of
+#            patched topologies are deleted (the block steps then read the
+#            topology rasters; see region_graph.load).
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window, from_bounds
+from scipy import ndimage
+
+import array_tools as at
+import batch_towns as bt
+import cog
+import region_graph as rag
+from settings import setting
+
+# Landforms do not change with landcover edits, so only _01 and _03 rerun;
+# the existing lowlands are clipped into the region.
+
+scripts = [bt.scripts[0], bt.scripts[2]]
+
+# Cells a join can reach across (the 5x5 road-crossing dilation, plus one for
+# adjacency), cells of context read around the window for filters and stream
+# buffers, and rows per strip when scanning label rasters.
+
+reach = 3
+halo = 64
+strip_rows = 1024
+
+# Rasters _01 clumps into patches (4-connected cells of one value), with
+# whether 0 is background. The clumps themselves stay in the scratch store,
+# so the window is closed over the patches of these instead.
+
+class_products = (("111_reclass.tif", False), ("134_backgroun_union.tif", True))
+
+# Largest share of the grid worth patching; past it a full run is cheaper.
+
+max_fraction = 0.25
+
+# _03 stages that make products other than rasters on the grid, made again
+# from the patched rasters.
+
+derived_stages = ("export_blocks", "forest_summary", "field_summary")
+
+# ------------------------------------------------------------------------------
+# WINDOWS
+# ------------------------------------------------------------------------------
+
+def _bounds(window):
+    "To give a window as (row0, col0, row1, col1)."
+    return int(window.row_off), int(window.col_off), int(window.row_off + window.height), int(window.col_off + window.width)
+
+def _window(r0, c0, r1, c1):
+    return Window(c0, r0, c1 - c0, r1 - r0)
+
+def grow(window, n, width, height):
+    "To grow a window by n cells on each side, clipped to the raster."
+    r0, c0, r1, c1 = _bounds(window)
+    return _window(max(0, r0 - n), max(0, c0 - n), min(height, r1 + n), min(width, c1 + n))
+
+def union(a, b):
+    "To give the smallest window holding two windows."
+    a, b = _bounds(a), _bounds(b)
+    return _window(min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+def dirtyWindow(grid, bbox = None, mask = None):
+    "To find the changed window from a map-unit box or the nonzero cells of a mask raster on the grid."
+    with rasterio.open(grid) as src:
+        width, height, transform = src.width, src.height, src.transform
+    if bbox is not None:
+        window = from_bounds(*bbox, transform).round_offsets("floor").round_lengths("ceil")
+        r0, c0, r1, c1 = _bounds(window)
+        return _window(max(0, r0), max(0, c0), min(height, r1), min(width, c1))
+    rows, cols = [], []
+    with rasterio.open(mask) as src:
+        for row in range(0, src.height, strip_rows):
+            strip = src.read(1, window = Window(0, row, src.width, min(strip_rows, src.height - row)))
+            changed = (strip != 0) if src.nodata is None else (strip != 0) & (strip != src.nodata)
+            r, c = np.nonzero(changed)
+            if len(r):
+                rows += [row + r.min(), row + r.max()]
+                cols += [c.min(), c.max()]
+    if not rows:
+        raise ValueError("the mask has no changed cells")
+    return _window(min(rows), min(cols), max(rows) + 1, max(cols) + 1)
+
+# ------------------------------------------------------------------------------
+# CLOSE THE WINDOW OVER OBJECTS
+# ------------------------------------------------------------------------------
+
+def labelProducts(folders, width, height):
+    "To list the label rasters (uint32, from clump) on the grid in the product folders."
+    found = []
+    for folder in folders:
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if not name.endswith(".tif"):
+                continue
+            with rasterio.open(path) as src:
+                if src.dtypes[0] == "uint32" and (src.width, src.height) == (width, height):
+                    found.append(path)
+    return found
+
+def _read(src, window):
+    "To read a window with a mask of valid cells."
+    values = src.read(1, window = window)
+    valid = np.ones(values.shape, dtype = bool) if src.nodata is None else values != src.nodata
+    return values, valid
+
+def labelBounds(path):
+    "To bound every label of a label raster in one pass, as arrays (row0, col0, row1, col1) indexed by label."
+    with rasterio.open(path) as src:
+        tags = src.tags()
+        n = int(float(tags[at.range_tag].split()[1])) + 1 if at.range_tag in tags else 1
+        r0, c0 = np.full(n, src.height, dtype = np.int64), np.full(n, src.width, dtype = np.int64)
+        r1, c1 = np.zeros(n, dtype = np.int64), np.zeros(n, dtype = np.int64)
+        for row in range(0, src.height, strip_rows):
+            values, valid = _read(src, Window(0, row, src.width, min(strip_rows, src.height - row)))
+            inside = valid & (values != 0)
+            labels = values[inside].astype(np.int64)
+            if not len(labels):
+                continue
+            if labels.max() >= len(r0):
+                # No range tag (or a stale one): grow the arrays.
+                extra = int(labels.max()) + 1 - len(r0)
+                r0 = np.concatenate([r0, np.full(extra, src.height, dtype = np.int64)])
+                c0 = np.concatenate([c0, np.full(extra, src.width, dtype = np.int64)])
+                r1, c1 = np.concatenate([r1, np.zeros(extra, dtype = np.int64)]), np.concatenate([c1, np.zeros(extra, dtype = np.int64)])
+            rows, cols = np.nonzero(inside)
+            np.minimum.at(r0, labels, row + rows)
+            np.maximum.at(r1, labels, row + rows + 1)
+            np.minimum.at(c0, labels, cols)
+            np.maximum.at(c1, labels, cols + 1)
+    return r0, c0, r1, c1
+
+def _size(window):
+    return int(window.width) * int(window.height)
+
+def patchWindow(path, zero_back, window, probe, width, height, limit = None):
+    "To grow a window over the patches of a class raster (as tc.clump makes them) that touch a probe, or None past limit cells."
+    area = grow(probe, halo, width, height)
+    p0, q0, p1, q1 = _bounds(probe)
+    while True:
+        if limit is not None and _size(area) > limit:
+            return None
+        with rasterio.open(path) as src:
+            values, valid = _read(src, area)
+        a0, b0, a1, b1 = _bounds(area)
+        inner = (slice(p0 - a0, p1 - a0), slice(q0 - b0, q1 - b0))
+        touched = np.zeros(values.shape, dtype = bool)
+        for value in np.unique(values[inner][valid[inner]]):
+            if zero_back and value == 0:
+                continue
+            labels, _ = ndimage.label(valid & (values == value))
+            hit = np.unique(labels[inner])
+            touched |= np.isin(labels, hit[hit != 0])
+        # A patch on a side of the area that is not the grid edge may go on past it.
+        if not ((a0 > 0 and touched[0].any()) or (a1 < height and touched[-1].any()) or
+                (b0 > 0 and touched[:, 0].any()) or (b1 < width and touched[:, -1].any())):
+            break
+        area = grow(area, max(int(area.width), int(area.height)), width, height)
+    if touched.any():
+        rows, cols = np.nonzero(touched.any(axis = 1))[0], np.nonzero(touched.any(axis = 0))[0]
+        window = union(window, _window(a0 + rows[0], b0 + cols[0], a0 + rows[-1] + 1, b0 + cols[-1] + 1))
+    if limit is not None and _size(window) > limit:
+        return None
+    return window
+
+# Landcover patches form a partition, so closing the window over every patch
+# near it would spread across the grid. Instead the window takes in the
+# patches a change can resize (those near changed cells), then the background
+# objects those overlap; and the region run around the window takes in every
+# patch its cells (and its halo's) are sized from, so they see whole patches.
+
+def closePatches(classes, window, width, height, limit = None):
+    "To grow a changed window over the _01 patches the change can resize or reclass (None past limit cells)."
+    for path, zero_back in classes:
+        window = patchWindow(path, zero_back, window, grow(window, reach, width, height), width, height, limit)
+        if window is None:
+            return None
+    return window
+
+def regionFor(classes, window, width, height, limit = None):
+    "To give the region to recompute: the window plus a halo and every _01 patch they touch (None past limit cells)."
+    region = grow(window, halo, width, height)
+    for path, zero_back in reversed(classes):
+        region = patchWindow(path, zero_back, region, region, width, height, limit)
+        if region is None:
+            return None
+    return region
+
+def closeWindow(products, window, width, height, limit = None):
+    "To grow a window until every object near it, in every label product, lies inside it (None past limit cells)."
+    bounds = {path: labelBounds(path) for path in products}
+    while True:
+        probe = grow(window, reach, width, height)
+        bigger = window
+        for path, (r0, c0, r1, c1) in bounds.items():
+            with rasterio.open(path) as src:
+                values, valid = _read(src, probe)
+            labels = np.unique(values[valid & (values != 0)]).astype(np.int64)
+            labels = labels[labels < len(r0)]
+            if len(labels):
+                bigger = union(bigger, _window(r0[labels].min(), c0[labels].min(), r1[labels].max(), c1[labels].max()))
+        if limit is not None and _size(bigger) > limit:
+            return None
+        if _bounds(bigger) == _bounds(window):
+            return window
+        window = bigger
+
+# ------------------------------------------------------------------------------
+# RECOMPUTE AND PATCH
+# ------------------------------------------------------------------------------
+
+def recompute(region, inputs, data_repo, folder):
+    "To run _01 and _03 on a region window of the inputs, in their own folders."
+    paths = {
+        "data_repo": os.path.join(folder, "_goods") + os.sep,
+        "scratch_repo": os.path.join(folder, "_scratch"),
+        "work_dir": os.path.join(folder, "_01"),
+    }
+    for path in paths.values():
+        os.makedirs(path, exist_ok = True)
+    paths["starter"] = os.path.join(paths["work_dir"], "154_lc_update.tif")
+    for name, path in inputs.items():
+        if path.lower().endswith((".tif", ".tiff")):
+            paths[name] = bt.clipWindow(path, region, os.path.join(folder, name + ".tif"))
+        else:
+            paths[name] = path
+    bt.clipWindow(data_repo + "_lowlands.tif", region, paths["data_repo"] + "_lowlands.tif")
+    env = dict(os.environ)
+    env.update({"VTLC_" + k.upper(): v for k, v in paths.items()})
+    env["PYTHONPATH"] = os.pathsep.join([bt.here, env.get("PYTHONPATH", "")])
+    with open(os.path.join(folder, "run.log"), "a") as log:
+        for script in scripts:
+            subprocess.run([sys.executable, script], env = env, stdout = log, stderr = subprocess.STDOUT, check = True)
+    return paths
+
+def _env(inputs, **settings):
+    "To make the environment for a full-grid script run with some inputs and settings."
+    env = dict(os.environ)
+    env.update({"VTLC_" + k.upper(): v for k, v in dict(inputs, **settings).items()})
+    env["PYTHONPATH"] = os.pathsep.join([bt.here, env.get("PYTHONPATH", "")])
+    return env
+
+def fullRun(inputs):
+    "To rerun _01 and _03 on the whole grid, for changes that reach too far to patch."
+    for script in scripts:
+        subprocess.run([sys.executable, script], env = _env(inputs), check = True)
+    return;
+
+def _maxLabel(src):
+    "To give the largest ID of an open uint32 product, from its range tag or by reading it."
+    tags = src.tags()
+    if at.range_tag in tags:
+        return int(float(tags[at.range_tag].split()[1]))
+    top = 0
+    for row in range(0, src.height, strip_rows):
+        values, valid = _read(src, Window(0, row, src.width, min(strip_rows, src.height - row)))
+        if valid.any():
+            top = max(top, int(values[valid].max()))
+    return top
+
+def _inner(window, region):
+    "To give a window relative to the region it was cut from."
+    return Window(window.col_off - region.col_off, window.row_off - region.row_off, window.width, window.height)
+
+def overflows(source, target, window, region):
+    "To tell whether new IDs for a patched uint32 product would reach its noData value."
+    with rasterio.open(target) as dst:
+        if dst.dtypes[0] != "uint32":
+            return False
+        old_max = _maxLabel(dst)
+    with rasterio.open(source) as src:
+        values, valid = _read(src, _inner(window, region))
+    new_max = int(values[valid].max()) if valid.any() else 0
+    return old_max + new_max >= at.noDataFor("uint32")
+
+def patch(source, target, window, region):
+    "To write the window of a recomputed product into the existing one, giving objects new IDs."
+    with rasterio.open(source) as src, rasterio.open(target, "r+") as dst:
+        values, valid = _read(src, _inner(window, region))
+        if dst.dtypes[0] == "uint32":
+            old_max = _maxLabel(dst)
+            values = np.where(valid & (values != 0), values.astype(np.int64) + old_max, values)
+            new_max = max(old_max, int(values[valid].max()) if valid.any() else 0)
+            dst.update_tags(**{at.range_tag: "0.0 %r" % float(new_max)})
+        nodata = at.noDataFor(dst.dtypes[0]) if dst.nodata is None else dst.nodata
+        dst.write(np.where(valid, values, nodata).astype(dst.dtypes[0]), 1, window = window)
+    # Cloud-optimized products get their overviews and layout back.
+    if cog.isCog(target):
+        cog.write(target, target)
+    return target
+
+def refreshDerived(patched):
+    "To drop adjacency graphs of patched topologies and make the vector and table products again."
+    for path in patched:
+        graph = rag.graphFile(path)
+        if os.path.exists(graph):
+            os.remove(graph)
+            print("removed stale graph " + graph)
+    subprocess.run([sys.executable, bt.scripts[2]], env = _env({}, stages = ",".join(derived_stages)), check = True)
+    return;
+
+def update(inputs, bbox = None, mask = None, folder = None, keep = False):
+    "To recompute and patch the products touched by a change (or rerun the whole grid if it reaches too far)."
+    start = time.time()
+    data_repo = setting("data_repo", "/Volumes/limuw/conservation/outputs/_goods/")
+    work_dir = setting("work_dir", "/Volumes/limuw/conservation/outputs/landscapePatches/_01")
+    starter = setting("starter", os.path.join(work_dir, "154_lc_update.tif"))
+    with rasterio.open(starter) as src:
+        width, height = src.width, src.height
+    products = labelProducts([data_repo, work_dir], width, height)
+    classes = [(os.path.join(work_dir, name), zero_back) for name, zero_back in class_products]
+    missing = [path for path, _ in classes if not os.path.exists(path)]
+    if missing:
+        print("no %s to close the window over landcover patches, running the whole grid" % ", ".join(missing))
+        fullRun(inputs)
+        return []
+    dirty = dirtyWindow(starter, bbox, mask)
+    limit = max_fraction * width * height
+    window = region = closePatches(classes, dirty, width, height, limit)
+    if window is not None:
+        window = closeWindow(products, window, width, height, limit)
+    if window is not None:
+        region = regionFor(classes, window, width, height, limit)
+    if window is None or region is None:
+        print("changed %d x %d cells; the objects they touch pass %.0f%% of the grid, running it all" % (
+            dirty.width, dirty.height, 100 * max_fraction))
+        fullRun(inputs)
+        return []
+    print("changed %d x %d cells; patching %d x %d (%.1f%% of the grid)" % (
+        dirty.width, dirty.height, window.width, window.height, 100.0 * window.width * window.height / (width * height)))
+    folder = folder or os.path.join(data_repo, "_incremental")
+    paths = recompute(region, inputs, data_repo, folder)
+    pairs = []
+    for old, new in ((data_repo, paths["data_repo"]), (work_dir, paths["work_dir"])):
+        for name in sorted(os.listdir(new)):
+            target = os.path.join(old, name)
+            if name.endswith(".tif") and os.path.exists(target):
+                with rasterio.open(target) as dst:
+                    if (dst.width, dst.height) != (width, height):
+                        continue
+                pairs.append((os.path.join(new, name), target))
+    if any(overflows(source, target, window, region) for source, target in pairs):
+        print("new IDs would overflow uint32, running the whole grid")
+        fullRun(inputs)
+        patched = []
+    else:
+        patched = [patch(source, target, window, region) for source, target in pairs]
+        refreshDerived(patched)
+    if not keep:
+        shutil.rmtree(folder, ignore_errors = True)
+    print("patched %d products in %.0fs" % (len(patched), time.time() - start))
+    return patched
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Recompute the plan where the inputs changed.")
+    parser.add_argument("--bbox", type = float, nargs = 4, metavar = ("LEFT", "BOTTOM", "RIGHT", "TOP"))
+    parser.add_argument("--mask", help = "raster on the grid with nonzero cells where inputs changed")
+    parser.add_argument("--input", action = "append", default = [], help = "setting=path of an (edited) input, e.g. lc=lc.tif")
+    parser.add_argument("--folder", help = "folder for the region run (default data_repo/_incremental)")
+    parser.add_argument("--keep", action = "store_true", help = "keep the region run")
+    args = parser.parse_args()
+    if (args.bbox is None) == (args.mask is None):
+        parser.error("give one of --bbox or --mask")
+    update(dict(i.split("=", 1) for i in args.input), args.bbox, args.mask, args.folder, args.keep)
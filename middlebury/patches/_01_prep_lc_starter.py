@@ -12,13 +12,25 @@
 
 # import tools from WBT module
 
+import os
 import sys
 sys.path.insert(1, '/Users/jhowarth/tools')
 from WBT.whitebox_tools import WhiteboxTools
 
-# declare a name for the tools
+# import tiled focal filters, clumps, zonal statistics and raster algebra.
 
-wbt = WhiteboxTools()
+sys.path.insert(2, '/Users/jhowarth/projects/vt-land-conservation/middlebury')
+import profiling
+import raster_algebra as ra
+import scratch_store as ss
+import tiled_filters as tf
+import tiled_clump as tc
+import zonal_stats as zs
+from settings import setting
+
+# declare a name for the tools (every call is traced, see profiling.py)
+
+wbt = profiling.InstrumentedTools(WhiteboxTools())
 
 #
 # Set the Whitebox working directory
@@ -28,7 +40,17 @@ wbt = WhiteboxTools()
 # # wbt.work_dir = "/Volumes/LaCie/GEOG0310/data/lForestBlocks"
 #
 # Test data
-wbt.work_dir = "/Volumes/limuw/conservation/outputs/landscapePatches/_01"
+work_dir = setting("work_dir", "/Volumes/limuw/conservation/outputs/landscapePatches/_01")
+wbt.work_dir = work_dir
+profiling.trace_file = setting("trace", os.path.join(work_dir, "_trace.jsonl"))
+
+def here(name):
+    "To give the full path of a file in the working directory."
+    return os.path.join(work_dir, name)
+
+def local(name):
+    "To give the path of a memory-mapped intermediate only read by the in-memory engines."
+    return ss.path(name, work_dir)
 
 #  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 #  Required datasets:
@@ -36,12 +58,20 @@ wbt.work_dir = "/Volumes/limuw/conservation/outputs/landscapePatches/_01"
 
 # Imported datasets
 
-rds = "/Volumes/limuw/conservation/data/midd/rdsFragmenting_12092021.tif"
-nhd_connectors = '/Volumes/limuw/conservation/data/midd/middPlan_images/i_hydro_connectors_08082022.tif'
-nhd_patches = '/Volumes/limuw/conservation/data/midd/middPlan_images/i_hydro_patches_08082022.tif'
-lc = "/Volumes/limuw/conservation/data/midd/iLandCover_midd_12152021.tif"
-e911 = "/Volumes/limuw/conservation/data/vtShapes/VT_Data_-_E911_Footprints/e911_footprints.shp"
-town = "/Volumes/limuw/conservation/data/vtShapes/vtBoundaries/BoundaryTown_TWNBNDS/middlebury.shp"
+rds = setting("rds", "/Volumes/limuw/conservation/data/midd/rdsFragmenting_12092021.tif")
+nhd_connectors = setting("nhd_connectors", '/Volumes/limuw/conservation/data/midd/middPlan_images/i_hydro_connectors_08082022.tif')
+nhd_patches = setting("nhd_patches", '/Volumes/limuw/conservation/data/midd/middPlan_images/i_hydro_patches_08082022.tif')
+lc = setting("lc", "/Volumes/limuw/conservation/data/midd/iLandCover_midd_12152021.tif")
+e911 = setting("e911", "/Volumes/limuw/conservation/data/vtShapes/VT_Data_-_E911_Footprints/e911_footprints.shp")
+town = setting("town", "/Volumes/limuw/conservation/data/vtShapes/vtBoundaries/BoundaryTown_TWNBNDS/middlebury.shp")
+
+# Patch-size thresholds in acres (small < first <= medium < second <= large).
+# The reclasses below know three size classes (codes 0, 100 and 1000), so
+# there must be exactly two increasing thresholds.
+
+patch_acres = [float(x) for x in setting("patch_acres", "0.25,10").split(",")]
+if len(patch_acres) != 2 or not 0 < patch_acres[0] < patch_acres[1]:
+    raise ValueError("VTLC_PATCH_ACRES needs two increasing thresholds in acres, e.g. 0.25,10 (got %s)" % setting("patch_acres", ""))
 
 # Land cover codes to start
 
@@ -84,7 +114,7 @@ wbt.equal_to(
 
 wbt.raster_calculator(
     output = "x03_lc_update.tif",
-    statement = "(('/Volumes/limuw/conservation/data/midd/iLandCover_midd_12152021.tif' * 'x02_binary_inverse.tif') + 'x01_e911.tif')"
+    statement = "(('" + lc + "' * 'x02_binary_inverse.tif') + 'x01_e911.tif')"
 )
 
 # ------------------------------------------------------
@@ -93,9 +123,10 @@ wbt.raster_calculator(
 
 # 1.0.1.  Expand roads by a pixel.
 
-wbt.maximum_filter(
-    i = rds,
-    output = "101_max.tif",
+tf.focalFilter(
+    rds,
+    here("101_max.tif"),
+    "max",
     filterx=3,
     filtery=3
 )
@@ -151,60 +182,37 @@ wbt.raster_calculator(
 
 # 1.1.1 Reclass landcover.
 
-wbt.reclass(
-    i = "103_lc_update.tif",
-    output = "111_reclass.tif",
-    reclass_vals = "1;0;1;1;5;5;5;6",
-    assign_mode=True,
+ra.write(
+    ra.reclass(here("103_lc_update.tif"), "1;0;1;1;5;5;5;6", assign_mode=True),
+    here("111_reclass.tif"),
+    dtype = "uint8",
 )
 
 # ------------------------------------------------------
 # 1.2. Make objects from land cover.
 # ------------------------------------------------------
 
-# 1.2.1. Clump objects.
+# 1.2.1. Clump objects, counting the cells of each clump as they are labeled.
 
-wbt.clump(
-    i = "111_reclass.tif",
-    output = "121_clumps.tif",
+clumps, clump_cells = tc.clump(
+    here("111_reclass.tif"),
+    local("121_clumps.tif"),
     diag=False,
-    zero_back=False
-)
-
-# 1.2.2. Compute area of each clump
-
-wbt.raster_area(
-    i = "121_clumps.tif",
-    output= "122_clumps_area.tif",
-    out_text=False,
-    units="map units",
-    zero_back=True
-)
-
-# 1.2.3. Convert to acres
-
-wbt.divide(
-    input1 = "122_clumps_area.tif",
-    input2 = 4046.86,
-    output = "123_clumps_acres.tif"
+    zero_back=False,
+    return_counts=True,
 )
 
-# 1.2.4. CLassify by area (< 0.25, < 10, > 10).
+# 1.2.2. Compute area of each clump and 1.2.3. convert to acres (once per clump, not per pixel).
+# 1.2.4. CLassify by area (< 0.25, < 10, > 10), thresholds set by VTLC_PATCH_ACRES.
 
-wbt.reclass(
-    i = "123_clumps_acres.tif",
-    output = "124_clumps_acres_reclass.tif",
-    reclass_vals = "0;0;0.25;100;0.25;10;1000;10;999999999999999999",
-    assign_mode = False
+acres_class = ra.lookup(
+    clumps,
+    tc.areaClasses(clump_cells, tc.cellArea(clumps), breaks=patch_acres, codes=(0, 100, 1000)),
 )
 
 # 1.2.5. Tag pixels
 
-wbt.add(
-    input1 = "111_reclass.tif",
-    input2 = "124_clumps_acres_reclass.tif",
-    output = "125_lc_add.tif",
-)
+lc_add = ra.add(here("111_reclass.tif"), acres_class)
 
 # RESULTS
 
@@ -244,34 +252,35 @@ wbt.add(
 
 # 1.3.1 Reclass area objects.
 
-wbt.reclass(
-    i = "125_lc_add.tif",
-    output = "131_reclass.tif",
-    reclass_vals = "10;1;10;2;10;3;10;4;20;5;20;7;20;8;20;9;20;10;99;99;0;101;0;102;2;103;3;104;4;105;4;107;20;108;4;109;20;110;99;199;1;1001;0;1002;2;1003;3;1004;4;1005;4;1007;20;1008;4;1009;20;1010;99;1099",
+patches = ra.reclass(
+    lc_add,
+    "10;1;10;2;10;3;10;4;20;5;20;7;20;8;20;9;20;10;99;99;0;101;0;102;2;103;3;104;4;105;4;107;20;108;4;109;20;110;99;199;1;1001;0;1002;2;1003;3;1004;4;1005;4;1007;20;1008;4;1009;20;1010;99;1099",
     assign_mode=True,
 )
 
 # 1.3.2. Make a binary of green background.
 
-wbt.equal_to(
-    input1 = "131_reclass.tif",
-    input2 = 10,
-    output = "132_green_binary.tif",
-)
+green = ra.equal_to(patches, 10)
 
 # 1.3.3. Make a binary of built background.
 
-wbt.equal_to(
-    input1 = "131_reclass.tif",
-    input2 = 20,
-    output = "133_built_binary.tif",
-)
+built = ra.equal_to(patches, 20)
 
 # 1.3.4. Add the two binaries.
 
-wbt.raster_calculator(
-    output = "134_backgroun_union.tif",
-    statement = "(('132_green_binary.tif' * 10) + ('133_built_binary.tif' * 20))",
+background_union = ra.add(ra.multiply(green, 10), ra.multiply(built, 20))
+
+# Steps 1.2.4 to 1.3.4 run as one pass over the clump and landcover rasters,
+# with each reclass string compiled to a lookup table (see raster_algebra.py).
+
+ra.writeAll(
+    {
+        here("131_reclass.tif"): patches,
+        here("132_green_binary.tif"): green,
+        here("133_built_binary.tif"): built,
+        here("134_backgroun_union.tif"): background_union,
+    },
+    dtypes = {here("131_reclass.tif"): "uint8"},
 )
 
 # ------------------------------------------------------
@@ -280,62 +289,54 @@ wbt.raster_calculator(
 
 # 1.4.1. Make objects from background union.
 
-wbt.clump(
-    i = "134_backgroun_union.tif",
-    output = "141_clumps.tif",
+tc.clump(
+    here("134_backgroun_union.tif"),
+    local("141_clumps.tif"),
     diag=False,
     zero_back=True
 )
 
 # 1.4.2. Expand dough classes by 1 pixel.
 
-wbt.minimum_filter(
-    i = "131_reclass.tif",
-    output = "142_min_filter.tif",
+tf.focalFilter(
+    here("131_reclass.tif"),
+    local("142_min_filter.tif"),
+    "min",
     filterx=3,
     filtery=3
 )
 
 # 1.4.3. Overlay objects with land cover to find range.
 
-wbt.zonal_statistics(
-    i = "142_min_filter.tif",
-    features = "141_clumps.tif",
-    output = "143_overlap.tif",
-    stat="min",
-    out_table=None,
+overlap = zs.zonalStatistics(
+    local("141_clumps.tif"),
+    {"lc": local("142_min_filter.tif")},
+    stats=("min",),
 )
 
+zs.broadcast(overlap, "lc", "min", local("141_clumps.tif"), here("143_overlap.tif"))
+
 # 1.4.4 Create binary of background values.
 
-wbt.Or(
-    input1 = "132_green_binary.tif",
-    input2 = "133_built_binary.tif",
-    output = "144_binary.tif",
-)
+background = ra.Or(here("132_green_binary.tif"), here("133_built_binary.tif"))
 
 # 1.4.5. Create inverse of binary.
 
-wbt.equal_to(
-    input1 = "144_binary.tif",
-    input2 = 0,
-    output = "145_binary_inverse.tif",
-)
+background_inverse = ra.equal_to(background, 0)
 
 # 1.4.6. Plug holes.
 
-wbt.raster_calculator(
-    output = "146_lc_update.tif",
-    statement = "(('144_binary.tif' * '143_overlap.tif') + ('145_binary_inverse.tif' * '131_reclass.tif'))",
+lc_plugged = ra.add(
+    ra.multiply(background, here("143_overlap.tif")),
+    ra.multiply(background_inverse, here("131_reclass.tif")),
 )
 
-# 1.4.7 Reclass islands from road circles as developed.
+# 1.4.7 Reclass islands from road circles as developed (1.4.4 to 1.4.7 in one pass).
 
-wbt.reclass(
-    i = "146_lc_update.tif",
-    output = "147_lc_patches.tif",
-    reclass_vals = "4;10;4;20",
-    assign_mode=True,
+ra.write(
+    ra.reclass(lc_plugged, "4;10;4;20", assign_mode=True),
+    here("147_lc_patches.tif"),
+    dtype = "uint8",
 )
 
 # VISUALIZATion
@@ -376,9 +377,18 @@ wbt.equal_to(
     output = "153_binary_inverse.tif",
 )
 
-# 1.5.4 Burn into lc (but without having rivers cross over fragmenting roads).
-
-wbt.raster_calculator(
-    output = "154_lc_update.tif",
-    statement = "(('152_binary.tif' * '102_invert.tif' * 2) + ('147_lc_patches.tif' * '153_binary_inverse.tif') + ('101_max.tif' * '152_binary.tif' * 99))",
+# 1.5.4 Burn into lc (but without having rivers cross over fragmenting roads),
+#       stored as uint8 (codes 0-99, noData 255) in the same pass:
+#       ('152_binary.tif' * '102_invert.tif' * 2) + ('147_lc_patches.tif' * '153_binary_inverse.tif') + ('101_max.tif' * '152_binary.tif' * 99)
+
+ra.write(
+    ra.add(
+        ra.add(
+            ra.multiply(ra.multiply(here("152_binary.tif"), here("102_invert.tif")), 2),
+            ra.multiply(here("147_lc_patches.tif"), here("153_binary_inverse.tif")),
+        ),
+        ra.multiply(ra.multiply(here("101_max.tif"), here("152_binary.tif")), 99),
+    ),
+    here("154_lc_update.tif"),
+    dtype = "uint8",
 )
@@ -7,27 +7,25 @@
 #  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
 #  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-# import tools from WBT module
+# make the WBT and project modules importable (the conservation tools run
+# WhiteboxTools through each call's context, see context.py).
 
 import sys
 sys.path.insert(1, '/Users/jhowarth/tools')
-from WBT.whitebox_tools import WhiteboxTools
-
-# declare a name for the tools
-
-wbt = WhiteboxTools()
+sys.path.insert(2, '/Users/jhowarth/projects/vt-land-conservation/middlebury')
 
 # import conservation tools module.
 
-sys.path.insert(2, '/Users/jhowarth/projects/vt-land-conservation/middlebury')
 import conservation_tools as ct
-#
+from settings import setting
+from step_cache import cachedStep
+
 #  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 #  Working directories
 #  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-data_repo = "/Volumes/limuw/conservation/outputs/_goods/"
-scratch_repo = "/Volumes/limuw/conservation/outputs/_scratch"
+data_repo = setting("data_repo", "/Volumes/limuw/conservation/outputs/_goods/")
+scratch_repo = setting("scratch_repo", "/Volumes/limuw/conservation/outputs/_scratch")
 
 #  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 #  Required datasets:
@@ -35,8 +33,15 @@ scratch_repo = "/Volumes/limuw/conservation/outputs/_scratch"
 
 # Imported datasets
 
-lc = "/Volumes/limuw/conservation/data/midd/iLandCover_midd_12152021.tif"
-dem = "/Volumes/limuw/conservation/data/midd/iDemHF_0p7_12222021.tif"
+lc = setting("lc", "/Volumes/limuw/conservation/data/midd/iLandCover_midd_12152021.tif")
+dem = setting("dem", "/Volumes/limuw/conservation/data/midd/iDemHF_0p7_12222021.tif")
+
+# Point the conservation tools at the same datasets.
+
+ct.data_repo = data_repo
+ct.scratch_repo = scratch_repo
+ct.lc = lc
+ct.dem = dem
 
 # ------------------------------------------------------------------------------
 # IMPLEMENT
@@ -44,9 +49,13 @@ dem = "/Volumes/limuw/conservation/data/midd/iDemHF_0p7_12222021.tif"
 
 # 1. Classify landforms from DEM with geomorphons.
 
-# classifyLandforms()
+landforms = data_repo+"_landforms.tif"
+
+cachedStep(ct.classifyLandforms, (), [dem, lc], [landforms])
 
-# 2. Extract lowlands from landforms as all valley bottoms and pits.
+# 2. Extract lowlands from landforms as all valley bottoms and pits
+#    (majority in an 11 x 11 window unless VTLC_LOWLAND_WINDOW says otherwise).
 
-landforms = data_repo+"_landforms.tif"
-ct.makeLowlands(landforms)
+lowland_window = int(setting("lowland_window", "11"))
+
+cachedStep(ct.makeLowlands, (landforms, lowland_window), [landforms], [data_repo+"_lowlands.tif"])
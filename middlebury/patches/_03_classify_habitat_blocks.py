@@ -7,27 +7,26 @@
 #  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
 #  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-# import tools from WBT module
+# make the WBT and project modules importable (the conservation tools run
+# WhiteboxTools through each call's context, see context.py).
 
 import sys
 sys.path.insert(1, '/Users/jhowarth/tools')
-from WBT.whitebox_tools import WhiteboxTools
-
-# declare a name for the tools
-
-wbt = WhiteboxTools()
+sys.path.insert(2, '/Users/jhowarth/projects/vt-land-conservation/middlebury')
 
 # import conservation tools module.
 
-sys.path.insert(2, '/Users/jhowarth/projects/vt-land-conservation/middlebury')
 import conservation_tools as ct
+import region_graph as rag
+from pipeline import Stage, run
+from settings import setting
 
 #  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 #  Working directories
 #  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-data_repo = "/Volumes/limuw/conservation/outputs/_goods/"
-scratch_repo = "/Volumes/limuw/conservation/outputs/_scratch"
+data_repo = setting("data_repo", "/Volumes/limuw/conservation/outputs/_goods/")
+scratch_repo = setting("scratch_repo", "/Volumes/limuw/conservation/outputs/_scratch")
 
 #  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 #  Required datasets:
@@ -35,10 +34,31 @@ scratch_repo = "/Volumes/limuw/conservation/outputs/_scratch"
 
 # Imported datasets
 
-starter = "/Volumes/limuw/conservation/outputs/landscapePatches/_01/154_lc_update.tif"
-rc = "/Volumes/limuw/conservation/data/vtShapes/vtRiverCorridors/WaterHydro_RiverCorridors/epsg32145/riverCorridors_epsg32145.shp"
-rc_ss = "/Volumes/limuw/conservation/data/vtShapes/vtRiverCorridors/WaterHydro_RiverCorridors/epsg32145/smallStreams_gtp25_epsg32145.shp"
-town = "/Volumes/limuw/conservation/data/vtShapes/vtBoundaries/BoundaryTown_TWNBNDS/middlebury.shp"
+starter = setting("starter", "/Volumes/limuw/conservation/outputs/landscapePatches/_01/154_lc_update.tif")
+rc = setting("rc", "/Volumes/limuw/conservation/data/vtShapes/vtRiverCorridors/WaterHydro_RiverCorridors/epsg32145/riverCorridors_epsg32145.shp")
+rc_ss = setting("rc_ss", "/Volumes/limuw/conservation/data/vtShapes/vtRiverCorridors/WaterHydro_RiverCorridors/epsg32145/smallStreams_gtp25_epsg32145.shp")
+town = setting("town", "/Volumes/limuw/conservation/data/vtShapes/vtBoundaries/BoundaryTown_TWNBNDS/middlebury.shp")
+
+# Parameters a sweep can vary (see sweep.py): the road-crossing window in
+# cells and the small-stream buffer in map units.
+
+xing_window = int(setting("xing_window", "5"))
+stream_buffer = float(setting("stream_buffer", "15"))
+
+# Point the conservation tools at the same datasets.
+
+ct.data_repo = data_repo
+ct.scratch_repo = scratch_repo
+ct.starter = starter
+ct.rc = rc
+ct.rc_ss = rc_ss
+
+# Each step below is declared as a pipeline stage with the files it reads and
+# makes. The stages run at the end of the script: independent branches run at
+# the same time and stages whose inputs, parameters and code have not changed
+# are skipped. Run with --dry-run to print the plan.
+
+stages = []
 
 #  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 #  CODES FOR STARTER LAYER.
@@ -59,31 +79,42 @@ fragmenting = 99
 # STEP 1: Make reforested and recovering object layers.
 # -------
 
-# makeObjects(reforested, '_reforested')
-# makeObjects(recovering, '_recovering')
-
 figure = data_repo+'_recovering_objects.tif'
 ground = data_repo+'_reforested_objects.tif'
 
+stages.append(Stage('reforested_objects', ct.makeObjects, (reforested, '_reforested'), [starter], [ground]))
+stages.append(Stage('recovering_objects', ct.makeObjects, (recovering, '_recovering'), [starter], [figure]))
+
 # -------
 # STEP 2: Class topology of recovering (figure) and reforested (ground).
 # -------
 
-# classTopology(figure, ground, '_recovering_reforested')
+# Topology is classed in memory ("fused"). VTLC_TOPOLOGY_ENGINE=graph classes
+# it from a region adjacency graph instead (see region_graph.py), kept beside
+# each topology raster for the block and connector steps; it differs from the
+# pixel engines for objects one or two cells thick.
+
+topology_engine = setting("topology_engine", "fused")
+
+def topologyOutputs(topology):
+    "To list the files a topology stage makes: the raster, and its graph with the graph engine."
+    return [topology] + ([rag.graphFile(topology)] if topology_engine == "graph" else [])
 
 forest_topology = data_repo+'_recovering_reforested_topology.tif'
 
+stages.append(Stage('forest_topology', ct.classTopology, (figure, ground, '_recovering_reforested', topology_engine), [figure, ground], topologyOutputs(forest_topology)))
+
 # -------
 # STEP 3: Identify forest habitat blocks.
 # -------
 
-# makeForestHabitatBlocks(ground, forest_topology, '_forest_habitat')
+stages.append(Stage('forest_blocks', ct.makeForestHabitatBlocks, (ground, forest_topology, '_forest_habitat'), [ground, forest_topology], [data_repo+'_forest_habitat_blocks.tif']))
 
 # -------
 # STEP 4: Join forest habitat blocks separated by roads.
 # -------
 
-# withRoadXing(data_repo+'_forest_habitat_blocks.tif', '_forest_habitat_blocks')
+stages.append(Stage('forest_road_xing', ct.withRoadXing, (data_repo+'_forest_habitat_blocks.tif', '_forest_habitat_blocks', "graph", xing_window), [data_repo+'_forest_habitat_blocks.tif', starter], [data_repo+'_forest_habitat_blocks_withRoadXing.tif']))
 
 # ------------------------------------------------------------------------------
 # DEFINE OPEN LOWLAND HABITAT
@@ -96,13 +127,13 @@ lowlands_binary = data_repo+'_lowlands.tif'
 # STEP 1: identify lowlands with open cover.
 # -------
 
-# openLowlands(lowlands_binary, forest_blocks, starter)
+stages.append(Stage('open_lowlands', ct.openLowlands, (lowlands_binary, forest_blocks, starter), [lowlands_binary, forest_blocks, starter], [data_repo+'_open_lowlands.tif']))
 
 # -------
 # STEP 2: class topology of open lowlands and forest habitat blocks.
 # -------
 
-# classTopology(data_repo+'_open_lowlands.tif', forest_blocks, '_open_lowlands')
+stages.append(Stage('lowland_topology', ct.classTopology, (data_repo+'_open_lowlands.tif', forest_blocks, '_open_lowlands', topology_engine), [data_repo+'_open_lowlands.tif', forest_blocks], topologyOutputs(data_repo+'_open_lowlands_topology.tif')))
 
 
 # ------------------------------------------------------------------------------
@@ -113,40 +144,40 @@ lowlands_binary = data_repo+'_lowlands.tif'
 # STEP 1: make object layers
 # -------
 
-# makeObjects(clearing, '_clearing')
-# makeObjects(recovering, '_recovering')
-
 field_figure = data_repo+'_recovering_objects.tif'
 field_ground = data_repo+'_clearing_objects.tif'
 
+stages.append(Stage('clearing_objects', ct.makeObjects, (clearing, '_clearing'), [starter], [field_ground]))
+# (recovering objects are shared with the forest progression)
+
 # -------
 # STEP 2: create topology.
 # -------
 
-# classTopology(field_figure, field_ground, '_recovering_clearing')
-
 field_topology = data_repo+'_recovering_clearing_topology.tif'
 
+stages.append(Stage('field_topology', ct.classTopology, (field_figure, field_ground, '_recovering_clearing', topology_engine), [field_figure, field_ground], topologyOutputs(field_topology)))
+
 # -------
 # STEP 3: identify field blocks.
 # -------
 
-# makeFieldHabitatBlocks(field_ground, field_topology, forest_topology, '_field_habitat')
+stages.append(Stage('field_blocks', ct.makeFieldHabitatBlocks, (field_ground, field_topology, forest_topology, '_field_habitat'), [field_ground, field_topology, forest_topology], [data_repo+'_field_habitat_blocks.tif']))
 
 # -------
 # STEP 4: join across roads
 # -------
 
-# withRoadXing(data_repo+'_field_habitat_blocks.tif', '_field_habitat_blocks')
+stages.append(Stage('field_road_xing', ct.withRoadXing, (data_repo+'_field_habitat_blocks.tif', '_field_habitat_blocks', "graph", xing_window), [data_repo+'_field_habitat_blocks.tif', starter], [data_repo+'_field_habitat_blocks_withRoadXing.tif']))
 
 # -------
 # STEP 5: classify field blocks as scenic, clearing, recovering
 # -------
 
 field_blocks = data_repo+'_field_habitat_blocks_withRoadXing.tif'
-scenic_viewsheds = '/Volumes/limuw/conservation/lScenicViews/data/roads/14_visibilityByRegion.tif'
+scenic_viewsheds = setting("scenic", '/Volumes/limuw/conservation/lScenicViews/data/roads/14_visibilityByRegion.tif')
 
-# ct.classifyFieldBlocks(field_blocks, scenic_viewsheds, starter)
+stages.append(Stage('field_classes', ct.classifyFieldBlocks, (field_blocks, scenic_viewsheds, starter), [field_blocks, scenic_viewsheds, starter], [data_repo+'_field_blocks_classed.tif']))
 
 
 # ------------------------------------------------------------------------------
@@ -155,7 +186,7 @@ scenic_viewsheds = '/Volumes/limuw/conservation/lScenicViews/data/roads/14_visib
 
 # 1. Make river corridor binary.
 
-# makeRiverCorridorsAndSmallStreamsBinary()
+stages.append(Stage('river_corridors', ct.makeRiverCorridorsAndSmallStreamsBinary, (stream_buffer,), [rc, rc_ss, starter], [data_repo+'_riverCorridors_with_smallStreamBuffers.tif']))
 
 field_blocks = data_repo+'_field_habitat_blocks_withRoadXing.tif'
 recovering_reforested_topology = data_repo+'_recovering_reforested_topology.tif'
@@ -164,7 +195,8 @@ river_corridors = data_repo+'_riverCorridors_with_smallStreamBuffers.tif'
 
 # 2. Make habitat connectors.
 
-# ct.makeHabitatConnectors(forest_blocks, field_blocks, recovering_reforested_topology, lowland_connector_topology, river_corridors)
+connector_inputs = [forest_blocks, field_blocks, recovering_reforested_topology, lowland_connector_topology, river_corridors]
+stages.append(Stage('habitat_connectors', ct.makeHabitatConnectors, tuple(connector_inputs), connector_inputs, [data_repo+'_forest_habitat_connectors.tif']))
 
 # ------------------------------------------------------------------------------
 # COMPOSITE LAYER
@@ -173,8 +205,29 @@ river_corridors = data_repo+'_riverCorridors_with_smallStreamBuffers.tif'
 field = data_repo+'_field_blocks_classed.tif'
 connector = data_repo+'_forest_habitat_connectors.tif'
 forest = data_repo+'_forest_habitat_blocks_withRoadXing.tif'
-base = "/Volumes/limuw/conservation/outputs/landscapePatches/_01/154_lc_update.tif"
+base = starter
+
+stages.append(Stage('composite', ct.makeComposite, (forest, connector, field, base), [forest, connector, field, base], [data_repo+'_conservation_plan.tif']))
+
+plan = data_repo+'_conservation_plan.tif'
 
-ct.makeComposite(forest, connector, field, base)
+stages.append(Stage('export_blocks', ct.exportBlocks, (forest, field_blocks, plan, field), [forest, field_blocks, plan, field], [data_repo+'_habitat_blocks.gpkg']))
+
+# Per-block tables for reports (see block_table.py).
+
+topologies = (("forest_topology", forest_topology), ("lowland_topology", lowland_connector_topology), ("field_topology", field_topology))
+topology_files = [path for _, path in topologies]
+
+stages.append(Stage('forest_summary', ct.summarizeBlocks, (forest, '_forest_habitat_blocks', topologies, lowlands_binary), [forest, starter, lowlands_binary] + topology_files, [data_repo+'_forest_habitat_blocks_summary.parquet']))
+stages.append(Stage('field_summary', ct.summarizeBlocks, (field_blocks, '_field_habitat_blocks', topologies, lowlands_binary), [field_blocks, starter, lowlands_binary] + topology_files, [data_repo+'_field_habitat_blocks_summary.parquet']))
+
+stages.append(Stage('clip_by_town', ct.clipByTown, ('_conservation_plan', data_repo+'_conservation_plan.tif', town, base), [data_repo+'_conservation_plan.tif', town, base], [data_repo+'_conservation_plan_clipByTown.tif']))
+
+# ------------------------------------------------------------------------------
+# RUN STAGES
+# ------------------------------------------------------------------------------
 
-ct.clipByTown('_conservation_plan', data_repo+'_conservation_plan.tif', town, base)
+if __name__ == "__main__":
+    # VTLC_STAGES names the stages to run (all by default).
+    only = [name for name in setting("stages", "").split(",") if name]
+    run(stages, workers = 2, dry_run = "--dry-run" in sys.argv, only = only or None)
@@ -0,0 +1,149 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     pipeline.py
+#  purpose:  Declare pipeline stages with named input and output files, order
+#              them as a graph, and run independent branches at the same time.
+#              Stages whose outputs are current (see step_cache.py) are
+#              skipped, so only what sits downstream of a change reruns.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import conservation_tools as ct
+import profiling
+import step_cache as sc
+from context import Context
+from settings import shareWorkers
+
+# Module settings passed to each worker, so stages see the same datasets.
+
+shared_settings = ("data_repo", "scratch_repo", "starter", "lc", "dem", "rc", "rc_ss")
+
+# ------------------------------------------------------------------------------
+# STAGES
+# ------------------------------------------------------------------------------
+
+class Stage:
+    "A pipeline stage: a conservation_tools function, its arguments, and the files it reads and makes."
+
+    def __init__(self, name, func, args, inputs, outputs):
+        self.name = name
+        self.func = func
+        self.args = tuple(args)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+
+def upstream(stages):
+    "To map each stage name to the names of the stages that make its inputs."
+    makers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            if output in makers:
+                raise ValueError(output + " is made by both " + makers[output] + " and " + stage.name)
+            makers[output] = stage.name
+    return {s.name: sorted({makers[i] for i in s.inputs if i in makers}) for s in stages}
+
+def order(stages):
+    "To sort stages so every stage comes after the stages it depends on."
+    needs = upstream(stages)
+    by_name = {s.name: s for s in stages}
+    ordered, done = [], set()
+    def visit(name, path):
+        if name in done:
+            return
+        if name in path:
+            raise ValueError("cycle in pipeline: " + " -> ".join(path + [name]))
+        for parent in needs[name]:
+            visit(parent, path + [name])
+        done.add(name)
+        ordered.append(by_name[name])
+    for stage in stages:
+        visit(stage.name, [])
+    return ordered
+
+# ------------------------------------------------------------------------------
+# PLAN
+# ------------------------------------------------------------------------------
+
+def plan(stages):
+    "To mark each stage as 'cached', 'run' (its key changed) or 'run (upstream)'."
+    needs = upstream(stages)
+    status = {}
+    for stage in order(stages):
+        if any(status[p] != "cached" for p in needs[stage.name]):
+            status[stage.name] = "run (upstream)"
+        elif not all(os.path.exists(i) for i in stage.inputs):
+            status[stage.name] = "run (missing input)"
+        elif sc.isCached(stage.func, stage.args, stage.inputs, stage.outputs)[0]:
+            status[stage.name] = "cached"
+        else:
+            status[stage.name] = "run"
+    return status
+
+def printPlan(stages):
+    "To print the plan (a dry run)."
+    needs = upstream(stages)
+    status = plan(stages)
+    for stage in order(stages):
+        after = ", ".join(needs[stage.name]) or "-"
+        print("%-20s %-30s after: %s" % (status[stage.name], stage.name, after))
+    return status
+
+# ------------------------------------------------------------------------------
+# RUN
+# ------------------------------------------------------------------------------
+
+def _runStage(func, args, settings, scratch):
+    "To run a stage function in a worker with its own context under the stage's scratch folder."
+    for name, value in settings.items():
+        setattr(ct, name, value)
+    start = time.time()
+    with profiling.step(os.path.basename(scratch)), Context(scratch, os.path.basename(scratch)) as ctx:
+        func(*args, ctx = ctx)
+    return time.time() - start
+
+# Stages share no files or module state while they run (each has its own
+# Context), so they can run on threads as well as on processes.
+
+def run(stages, workers = 2, dry_run = False, threads = False, only = None):
+    "To run stages as their inputs become ready, independent branches in parallel (only the named ones if given)."
+    if only is not None:
+        stages = [s for s in stages if s.name in only]
+    if dry_run:
+        return printPlan(stages)
+    needs = upstream(stages)
+    settings = {name: getattr(ct, name) for name in shared_settings}
+    pending = {s.name: s for s in order(stages)}
+    finished = set()
+    running = {}
+    executor = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    # Stages running at once split the worker budget of the tiled engines.
+    with shareWorkers(workers), executor(workers) as pool:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if not all(p in finished for p in needs[name]):
+                    continue
+                del pending[name]
+                cached, key = sc.isCached(stage.func, stage.args, stage.inputs, stage.outputs)
+                if cached:
+                    print("cached: " + name)
+                    finished.add(name)
+                    continue
+                print("running: " + name)
+                scratch = os.path.join(settings["scratch_repo"], name)
+                running[pool.submit(_runStage, stage.func, stage.args, settings, scratch)] = (stage, key, scratch)
+            if not running:
+                continue
+            done, _ = wait(running, return_when = FIRST_COMPLETED)
+            for future in done:
+                stage, key, scratch = running.pop(future)
+                seconds = future.result()
+                sc.recordStep(key, stage.outputs)
+                finished.add(stage.name)
+                print("done: %s (%.0fs)" % (stage.name, seconds))
+            sc.evictScratch(keep = [s for _, _, s in running.values()])
+    return;
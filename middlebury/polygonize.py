@@ -0,0 +1,119 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     polygonize.py
+#  purpose:  Stream block polygons from a label raster into a GeoPackage layer,
+#              strip by strip. Each strip is traced with rasterio, pieces of a
+#              block that runs on into the next strip are held until the block
+#              ends and then dissolved into one feature, and features are
+#              written in batches (one transaction each), so memory stays
+#              bounded by the blocks crossing one strip edge.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import numpy as np
+from rasterio.windows import Window, transform
+
+import scratch_store as ss
+import tiled_clump as tc
+from profiling import traced
+
+# Rows traced per pass and features written per transaction.
+
+strip_rows = 1024
+batch_size = 10000
+
+# Layer schema: block label, most common class code, cells and acres.
+
+schema = {
+    "geometry": "MultiPolygon",
+    "properties": {"block": "int", "class": "int", "cells": "int", "acres": "float"},
+}
+
+# ------------------------------------------------------------------------------
+# STRIPS
+# ------------------------------------------------------------------------------
+
+# A block is a connected object, so the rows it covers are contiguous: once a
+# strip's last row does not hold it, the block is complete.
+
+def _read(src, window):
+    "To read a window with a mask of valid cells."
+    values = src.read(1, window = window)
+    valid = np.ones(values.shape, dtype = bool) if src.nodata is None else values != src.nodata
+    return values, valid
+
+def _strip(src, classes, window, pending):
+    "To trace the blocks of one strip into pending (pieces, cells, class counts) and list those still open."
+    from rasterio.features import shapes
+    from shapely.geometry import shape
+    labels, valid = _read(src, window)
+    inside = valid & (labels != 0)
+    ids, inverse = np.unique(labels[inside], return_inverse = True)
+    # Trace local ids (rasterio cannot trace uint32 labels).
+    local = np.zeros(labels.shape, dtype = np.int32)
+    local[inside] = inverse + 1
+    for geometry, value in shapes(local, mask = inside, connectivity = 8, transform = transform(window, src.profile["transform"])):
+        block = pending.setdefault(int(ids[int(value) - 1]), {"parts": [], "cells": 0, "classes": {}})
+        block["parts"].append(shape(geometry))
+    for label, cells in zip(ids, np.bincount(inverse, minlength = len(ids))):
+        pending[int(label)]["cells"] += int(cells)
+    still_open = set(int(label) for label in np.unique(labels[-1][inside[-1]]))
+    if classes is None:
+        return still_open
+    codes, code_valid = _read(classes, window)
+    keep = code_valid[inside]
+    if keep.any():
+        pairs, counts = np.unique(np.stack([inverse[keep], codes[inside][keep].astype(np.int64)]), axis = 1, return_counts = True)
+        for (i, code), count in zip(pairs.T, counts):
+            tally = pending[int(ids[i])]["classes"]
+            tally[int(code)] = tally.get(int(code), 0) + int(count)
+    return still_open
+
+def _feature(label, block, cell_area, unit):
+    "To dissolve a block's pieces into one feature."
+    from shapely.geometry import MultiPolygon, mapping
+    from shapely.ops import unary_union
+    geometry = unary_union(block["parts"])
+    if geometry.geom_type == "Polygon":
+        geometry = MultiPolygon([geometry])
+    code = max(block["classes"], key = block["classes"].get) if block["classes"] else 0
+    return {
+        "geometry": mapping(geometry),
+        "properties": {"block": label, "class": code, "cells": block["cells"], "acres": block["cells"] * cell_area / unit},
+    }
+
+# ------------------------------------------------------------------------------
+# POLYGONIZE
+# ------------------------------------------------------------------------------
+
+@traced
+def polygonize(blocks, output, layer, classes = None, unit = tc.acre):
+    "To write the blocks of a label raster as polygons to a GeoPackage layer, with their most common class and acres."
+    import fiona
+    cell_area = tc.cellArea(blocks)
+    pending, batch, written = {}, [], 0
+    with ss.open(blocks) as src:
+        crs = src.profile["crs"]
+        crs_wkt = crs.to_wkt() if hasattr(crs, "to_wkt") else crs
+        codes = ss.open(classes) if classes else None
+        try:
+            with fiona.open(output, "w", driver = "GPKG", layer = layer, schema = schema, crs_wkt = crs_wkt) as dst:
+                for row in range(0, src.height, strip_rows):
+                    window = Window(0, row, src.width, min(strip_rows, src.height - row))
+                    still_open = _strip(src, codes, window, pending)
+                    for label in [label for label in pending if label not in still_open]:
+                        batch.append(_feature(label, pending.pop(label), cell_area, unit))
+                    if len(batch) >= batch_size:
+                        dst.writerecords(batch)
+                        written += len(batch)
+                        batch = []
+                for label in list(pending):
+                    batch.append(_feature(label, pending.pop(label), cell_area, unit))
+                if batch:
+                    dst.writerecords(batch)
+                    written += len(batch)
+        finally:
+            if codes is not None:
+                codes.close()
+    return written
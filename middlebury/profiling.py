@@ -0,0 +1,249 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     profiling.py
+#  purpose:  Record wall time, CPU time, peak memory, storage bytes read and
+#              written and the size of the files named, for every
+#              WhiteboxTools call (and the in-memory engines), tagged with the
+#              calling function and step, as a JSON-lines trace.
+#              Summarize a run as a table and as folded stacks for a flame
+#              graph:
+#
+#              python profiling.py _trace.jsonl [run_id]
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import contextlib
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+from settings import setting
+
+# Trace file (one JSON object per call); empty to turn tracing off.
+
+trace_file = setting("trace", "_trace.jsonl")
+
+# One ID per run, shared with worker processes through the environment.
+
+os.environ.setdefault("VTLC_RUN_ID", time.strftime("%Y%m%d-%H%M%S") + "-" + str(os.getpid()))
+
+# Argument names that hold input and output files.
+
+input_args = ("i", "input", "input1", "input2", "inputs", "dem", "features", "base", "mama")
+output_args = ("output",)
+
+# Step names of the with-blocks each thread is inside.
+
+_local = threading.local()
+
+def _steps():
+    "To give this thread's stack of step names."
+    if not hasattr(_local, "steps"):
+        _local.steps = []
+    return _local.steps
+
+# ------------------------------------------------------------------------------
+# STEPS
+# ------------------------------------------------------------------------------
+
+@contextlib.contextmanager
+def step(name):
+    "To tag the calls made inside a with-block as one step."
+    _steps().append(name)
+    try:
+        yield
+    finally:
+        _steps().pop()
+
+def _caller():
+    "To find the first caller outside this module, as (file, function, line)."
+    frame = sys._getframe(2)
+    while frame and frame.f_code.co_filename == __file__:
+        frame = frame.f_back
+    if frame is None:
+        return "?", "?", 0
+    return os.path.basename(frame.f_code.co_filename), frame.f_code.co_name, frame.f_lineno
+
+def _files(value):
+    "To list the file names in an argument: a path, a list of paths or a raster expression."
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, (list, tuple)):
+        return [f for v in value for f in _files(v)]
+    if hasattr(value, "op") and hasattr(value, "args"):
+        import raster_algebra as ra
+        return ra.sources(value)
+    return []
+
+def _size(value, work_dir):
+    "To give the size of the files in an argument, looking in the working directory for bare names."
+    total = 0
+    for path in _files(value):
+        for p in (path, os.path.join(work_dir or "", path)):
+            if os.path.isfile(p):
+                total += os.path.getsize(p)
+                break
+    return total
+
+# ------------------------------------------------------------------------------
+# USAGE
+# ------------------------------------------------------------------------------
+
+# Each record holds what changed during the call, not lifetime totals:
+#   cpu_s          CPU of the calling thread (RUSAGE_THREAD where there is
+#                  one) plus children reaped during the call (WBT processes,
+#                  tile pools);
+#   bytes_*        storage I/O of this process (/proc/self/io, or block counts
+#                  where there is no /proc) plus children reaped during the
+#                  call; with threads, other threads' I/O is included;
+#   peak_rss       high-water RSS of this process during the call (the mark
+#                  is reset at the start on Linux; None elsewhere);
+#   child_peak_rss the children's high-water RSS if a child reaped during the
+#                  call set a new one (the kernel keeps one mark for all
+#                  children), else None;
+#   input_bytes,   sizes of the files named in the arguments.
+#   output_bytes
+
+rss_unit = 1 if sys.platform == "darwin" else 1024
+
+def _proc(name):
+    "To read the lines of a /proc/self file (none where there is no /proc)."
+    try:
+        with open("/proc/self/" + name) as f:
+            return f.read().splitlines()
+    except OSError:
+        return []
+
+def _resetPeak():
+    "To reset this process's high-water RSS (Linux), telling whether it could."
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def _peak():
+    "To read this process's high-water RSS in bytes (Linux), or None."
+    for line in _proc("status"):
+        if line.startswith("VmHWM:"):
+            return int(line.split()[1]) * 1024
+    return None
+
+def _usage():
+    "To snapshot CPU seconds, storage bytes read and written, and the children's high-water RSS."
+    me = resource.getrusage(getattr(resource, "RUSAGE_THREAD", resource.RUSAGE_SELF))
+    kids = resource.getrusage(resource.RUSAGE_CHILDREN)
+    io = dict(line.split(": ") for line in _proc("io") if ": " in line)
+    if "read_bytes" in io:
+        read, written = int(io["read_bytes"]), int(io["write_bytes"])
+    else:
+        read, written = me.ru_inblock * 512, me.ru_oublock * 512
+    return {
+        "cpu": me.ru_utime + me.ru_stime + kids.ru_utime + kids.ru_stime,
+        "read": read + kids.ru_inblock * 512,
+        "written": written + kids.ru_oublock * 512,
+        "child_rss": kids.ru_maxrss * rss_unit,
+    }
+
+# ------------------------------------------------------------------------------
+# RECORD
+# ------------------------------------------------------------------------------
+
+def record(tool, kwargs, func, work_dir = None):
+    "To run func and append one trace record for it."
+    script, caller, line = _caller()
+    reset = _resetPeak()
+    before = _usage()
+    wall0 = time.perf_counter()
+    result = func()
+    wall = time.perf_counter() - wall0
+    after = _usage()
+    entry = {
+        "run": os.environ["VTLC_RUN_ID"],
+        "pid": os.getpid(),
+        "script": script,
+        "function": caller,
+        "line": line,
+        "step": "/".join(_steps()) or script + ":" + str(line),
+        "tool": tool,
+        "wall_s": round(wall, 4),
+        "cpu_s": round(after["cpu"] - before["cpu"], 4),
+        "peak_rss": _peak() if reset else None,
+        "child_peak_rss": after["child_rss"] if after["child_rss"] > before["child_rss"] else None,
+        "bytes_read": after["read"] - before["read"],
+        "bytes_written": after["written"] - before["written"],
+        "input_bytes": sum(_size(kwargs.get(k), work_dir) for k in input_args),
+        "output_bytes": sum(_size(kwargs.get(k), work_dir) for k in output_args),
+    }
+    if trace_file:
+        with open(trace_file, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    return result
+
+# ------------------------------------------------------------------------------
+# INSTRUMENTED TOOLS
+# ------------------------------------------------------------------------------
+
+class InstrumentedTools:
+    "A WhiteboxTools object whose tool calls are traced."
+
+    def __init__(self, tools):
+        object.__setattr__(self, "_tools", tools)
+
+    def __getattr__(self, name):
+        attr = getattr(self._tools, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            return record(name, kwargs, lambda: attr(*args, **kwargs), self._tools.work_dir)
+        return call
+
+    def __setattr__(self, name, value):
+        setattr(self._tools, name, value)
+
+def traced(func):
+    "To trace calls of an engine function whose first two arguments are its input and output."
+    @functools.wraps(func)
+    def call(*args, **kwargs):
+        files = dict(zip(("input", "output"), args[:2]))
+        return record(func.__module__ + "." + func.__name__, files, lambda: func(*args, **kwargs))
+    return call
+
+# ------------------------------------------------------------------------------
+# SUMMARY
+# ------------------------------------------------------------------------------
+
+def summarize(trace, run = None, folded = None):
+    "To print time per function and tool for a run and write folded stacks for a flame graph."
+    with open(trace) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    run = run or (entries[-1]["run"] if entries else None)
+    entries = [e for e in entries if e["run"] == run]
+    stacks = {}
+    for e in entries:
+        key = ";".join([e["script"], e["function"], e["step"], e["tool"]])
+        total = stacks.setdefault(key, {"wall_s": 0.0, "cpu_s": 0.0, "calls": 0, "bytes": 0})
+        total["wall_s"] += e["wall_s"]
+        total["cpu_s"] += e["cpu_s"]
+        total["calls"] += 1
+        total["bytes"] += e["bytes_read"] + e["bytes_written"]
+    wall = sum(t["wall_s"] for t in stacks.values()) or 1.0
+    print("run %s: %d calls, %.0fs" % (run, len(entries), wall))
+    for key, t in sorted(stacks.items(), key = lambda kv: -kv[1]["wall_s"]):
+        print("%8.1fs %5.1f%% %8.1f cpu %4d calls %10.1f MB  %s" % (
+            t["wall_s"], 100 * t["wall_s"] / wall, t["cpu_s"], t["calls"], t["bytes"] / 1e6, key))
+    folded = folded or trace + "." + str(run) + ".folded"
+    with open(folded, "w") as f:
+        for key, t in stacks.items():
+            f.write("%s %d\n" % (key, round(t["wall_s"] * 1000)))
+    return stacks
+
+if __name__ == "__main__":
+    summarize(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,260 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     raster_algebra.py
+#  purpose:  Lazy raster algebra. Element-wise steps (equal_to, Or, multiply...)
+#              build an expression graph that is only evaluated, strip by
+#              strip, when it is written to a raster.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import numpy as np
+from rasterio.windows import Window
+
+import array_tools as at
+import scratch_store as ss
+from profiling import traced
+
+# Rows read from each input per pass.
+
+strip_rows = 512
+
+# ------------------------------------------------------------------------------
+# EXPRESSION GRAPH
+# ------------------------------------------------------------------------------
+
+class Expression:
+    "A node in a raster-algebra graph: an operation and its input nodes."
+
+    def __init__(self, op, args = (), **params):
+        self.op = op
+        self.args = tuple(args)
+        self.params = params
+
+def read(path):
+    "To refer to a raster file in an expression."
+    return Expression("read", path = path)
+
+def _node(x):
+    "To wrap file names and numbers as expression nodes."
+    if isinstance(x, Expression):
+        return x
+    if isinstance(x, str):
+        return read(x)
+    return Expression("const", value = float(x))
+
+# The names and arguments below follow the WBT tools they replace.
+
+def equal_to(input1, input2):
+    return Expression("equal_to", (_node(input1), _node(input2)))
+
+def not_equal_to(input1, input2):
+    return Expression("not_equal_to", (_node(input1), _node(input2)))
+
+def greater_than(input1, input2, incl_equals = False):
+    return Expression("greater_than", (_node(input1), _node(input2)), incl_equals = incl_equals)
+
+def less_than(input1, input2, incl_equals = False):
+    return Expression("less_than", (_node(input1), _node(input2)), incl_equals = incl_equals)
+
+def And(input1, input2):
+    return Expression("And", (_node(input1), _node(input2)))
+
+def Or(input1, input2):
+    return Expression("Or", (_node(input1), _node(input2)))
+
+def Not(input1, input2):
+    return Expression("Not", (_node(input1), _node(input2)))
+
+def add(input1, input2):
+    return Expression("add", (_node(input1), _node(input2)))
+
+def multiply(input1, input2):
+    return Expression("multiply", (_node(input1), _node(input2)))
+
+def lookup(labels, table):
+    "To map each label to table[label] (for example a per-label class from zonal results), and labels past the table to 0."
+    return Expression("lookup", (_node(labels),), table = np.asarray(table))
+
+def convert_nodata_to_zero(i):
+    return Expression("convert_nodata_to_zero", (_node(i),))
+
+def reclass(i, reclass_vals, assign_mode = False):
+    "To reclass like wbt.reclass, with the string compiled once into a lookup table."
+    return Expression("reclass", (_node(i),), table = at.compileReclass(reclass_vals, assign_mode))
+
+# ------------------------------------------------------------------------------
+# OPERATIONS
+# ------------------------------------------------------------------------------
+
+_ops = {
+    "equal_to": lambda a, b, p: a == b,
+    "not_equal_to": lambda a, b, p: a != b,
+    "greater_than": lambda a, b, p: a >= b if p["incl_equals"] else a > b,
+    "less_than": lambda a, b, p: a <= b if p["incl_equals"] else a < b,
+    "And": lambda a, b, p: (a != 0) & (b != 0),
+    "Or": lambda a, b, p: (a != 0) | (b != 0),
+    "Not": lambda a, b, p: (a != 0) & (b == 0),
+    "add": lambda a, b, p: a + b,
+    "multiply": lambda a, b, p: a * b,
+    "reclass": lambda a, p: at.applyReclass(np.asarray(a), p["table"]),
+    "convert_nodata_to_zero": lambda a, p: a,
+    "lookup": lambda a, p: _lookup(a, p["table"]),
+}
+
+def _lookup(labels, table):
+    "To map labels through a table, with 0 for labels outside it (so no label borrows a real class)."
+    labels = np.asarray(labels).astype(np.int64)
+    inside = (labels >= 0) & (labels < len(table))
+    return np.where(inside, table[np.where(inside, labels, 0)], 0)
+
+def sources(expr, found = None):
+    "To list the raster files an expression reads."
+    found = [] if found is None else found
+    if expr.op == "read" and expr.params["path"] not in found:
+        found.append(expr.params["path"])
+    for arg in expr.args:
+        sources(arg, found)
+    return found
+
+# ------------------------------------------------------------------------------
+# VALUE RANGES AND TYPES
+# ------------------------------------------------------------------------------
+
+# Each node gets a value range (lo, hi, integral) from its inputs, so results
+# are computed and written in the narrowest type that holds them: masks as
+# uint8, class codes as uint8/uint16, and floats only where inputs are floats.
+
+def _range(expr, files, ranges):
+    "To bound the values of an expression as (lo, hi, integral)."
+    key = id(expr)
+    if key in ranges:
+        return ranges[key]
+    if expr.op == "read":
+        src = files[expr.params["path"]]
+        lo, hi = at.readRange(src)
+        result = (lo, hi, np.dtype(src.dtypes[0]).kind in "ui")
+    elif expr.op == "const":
+        value = expr.params["value"]
+        result = (value, value, float(value).is_integer())
+    elif expr.op in ("add", "multiply"):
+        a_lo, a_hi, a_int = _range(expr.args[0], files, ranges)
+        b_lo, b_hi, b_int = _range(expr.args[1], files, ranges)
+        if expr.op == "add":
+            bounds = [a_lo + b_lo, a_hi + b_hi]
+        else:
+            with np.errstate(invalid = "ignore"):
+                bounds = [x * y for x in (a_lo, a_hi) for y in (b_lo, b_hi)]
+            bounds = [0.0 if np.isnan(x) else x for x in bounds]
+        result = (min(bounds), max(bounds), a_int and b_int)
+    elif expr.op == "lookup":
+        table = expr.params["table"]
+        result = (min(float(table.min()), 0.0), max(float(table.max()), 0.0), bool(np.all(table == np.floor(table))))
+    elif expr.op == "convert_nodata_to_zero":
+        lo, hi, integral = _range(expr.args[0], files, ranges)
+        result = (min(lo, 0), max(hi, 0), integral)
+    elif expr.op == "reclass":
+        # Unmatched cells keep their value, so the input range still applies.
+        lo, hi, integral = _range(expr.args[0], files, ranges)
+        new = at.reclassValues(expr.params["table"])
+        if len(new):
+            lo, hi = min(lo, new.min()), max(hi, new.max())
+            integral = integral and bool(np.all(new == np.floor(new)))
+        result = (lo, hi, integral)
+    else:
+        result = (0, 1, True)
+    ranges[key] = result
+    return result
+
+def _computeType(expr, ranges):
+    "To give the numpy type an arithmetic node is computed in."
+    lo, hi, integral = ranges[id(expr)]
+    dtype, _ = at.narrowType(lo, hi, integral)
+    return np.float64 if dtype == "float32" else np.dtype(dtype)
+
+# ------------------------------------------------------------------------------
+# EVALUATION
+# ------------------------------------------------------------------------------
+
+def _evaluate(expr, window, files, memo, ranges):
+    "To evaluate an expression over a window as (values, valid) arrays."
+    key = expr.params["path"] if expr.op == "read" else id(expr)
+    if key in memo:
+        return memo[key]
+    if expr.op == "read":
+        # Inputs keep their stored type (uint8 masks are not widened to float).
+        src = files[expr.params["path"]]
+        values = src.read(1, window = window)
+        nodata = src.nodata
+        valid = np.ones(values.shape, dtype = bool) if nodata is None else values != nodata
+    elif expr.op == "const":
+        values = expr.params["value"]
+        valid = np.True_
+    elif len(expr.args) == 1:
+        a, valid = _evaluate(expr.args[0], window, files, memo, ranges)
+        values = _ops[expr.op](a, expr.params)
+        if expr.op == "convert_nodata_to_zero":
+            values, valid = np.where(valid, values, 0), np.ones(np.shape(values), dtype = bool)
+    else:
+        a, a_valid = _evaluate(expr.args[0], window, files, memo, ranges)
+        b, b_valid = _evaluate(expr.args[1], window, files, memo, ranges)
+        if expr.op in ("add", "multiply"):
+            dtype = _computeType(expr, ranges)
+            a, b = np.asarray(a).astype(dtype), np.asarray(b).astype(dtype)
+        values = _ops[expr.op](a, b, expr.params)
+        # As in WBT, noData in either input gives noData.
+        valid = a_valid & b_valid
+    memo[key] = (values, valid)
+    return memo[key]
+
+@traced
+def write(expr, output, nodata = None, dtype = None):
+    "To evaluate an expression in one strip-wise pass and write it in the narrowest type that holds it."
+    return _writeAll([(output, _node(expr), dtype, nodata)])[0]
+
+@traced
+def writeAll(outputs, dtypes = None):
+    "To write several expressions ({output: expression}) in one pass, computing shared inputs and steps once."
+    dtypes = dtypes or {}
+    return _writeAll([(output, _node(expr), dtypes.get(output), None) for output, expr in outputs.items()])
+
+def _writeAll(outputs):
+    "To evaluate (output, expression, dtype, nodata) tuples strip by strip and write them."
+    paths = []
+    for _, expr, _, _ in outputs:
+        sources(expr, paths)
+    if not paths:
+        raise ValueError("expressions read no raster, so there is no grid to write them on")
+    files = {path: ss.open(path) for path in paths}
+    dsts = []
+    try:
+        ranges = {}
+        first = files[paths[0]]
+        for output, expr, dtype, nodata in outputs:
+            lo, hi, integral = _range(expr, files, ranges)
+            if dtype is None:
+                dtype, auto_nodata = at.narrowType(lo, hi, integral)
+                nodata = auto_nodata if nodata is None else nodata
+            elif nodata is None:
+                nodata = at.noDataFor(dtype)
+            profile = first.profile.copy()
+            profile.update(count = 1, dtype = dtype, nodata = nodata)
+            dst = ss.open(output, "w", **profile)
+            dsts.append((dst, expr, dtype, nodata))
+            if np.isfinite(lo) and np.isfinite(hi):
+                dst.update_tags(**{at.range_tag: "%r %r" % (float(lo), float(hi))})
+        for row in range(0, first.height, strip_rows):
+            window = Window(0, row, first.width, min(strip_rows, first.height - row))
+            shape = (window.height, window.width)
+            # One memo per strip, shared by every output.
+            memo = {}
+            for dst, expr, dtype, nodata in dsts:
+                values, valid = _evaluate(expr, window, files, memo, ranges)
+                out = np.where(np.broadcast_to(valid, shape), np.broadcast_to(values, shape), nodata)
+                dst.write(out.astype(dtype), 1, window = window)
+    finally:
+        for dst, _, _, _ in dsts:
+            dst.close()
+        for src in files.values():
+            src.close()
+    return [output for output, _, _, _ in outputs]
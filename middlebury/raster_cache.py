@@ -0,0 +1,149 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     raster_cache.py
+#  purpose:  Keep rasterized vectors (and their buffers) between calls and
+#              runs. Each raster is keyed on the vector file's content, the
+#              target grid, the burn field and any buffer size, so a vector
+#              is only rasterized again when one of those changes.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+import rasterio
+
+import step_cache as sc
+import tiled_distance as td
+from context import Context
+from settings import setting
+
+# Folder for cached rasters (shared by runs; default beside the data repo).
+
+cache_repo = setting("raster_cache", "/Volumes/limuw/conservation/outputs/_rasterized")
+
+# Calls from several threads and processes (pipeline stages, batch towns)
+# take turns with the index: a thread lock within a process and an flock on
+# a lock file between processes.
+
+_lock = threading.Lock()
+
+# ------------------------------------------------------------------------------
+# INDEX
+# ------------------------------------------------------------------------------
+
+def _indexFile():
+    "To give the path of the cache index."
+    return os.path.join(cache_repo, "_index.json")
+
+@contextlib.contextmanager
+def _locked():
+    "To hold the index lock against other threads and processes."
+    with _lock, open(os.path.join(cache_repo, "_index.lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _loadIndex():
+    "To read the cache index, or start an empty one."
+    if os.path.exists(_indexFile()):
+        with open(_indexFile()) as f:
+            return json.load(f)
+    return {"files": {}, "entries": {}}
+
+def _saveIndex(index):
+    "To write the cache index (via a temporary file so it is never half written)."
+    tmp = _indexFile() + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent = 1, sort_keys = True)
+    os.replace(tmp, _indexFile())
+    return;
+
+# ------------------------------------------------------------------------------
+# KEYS
+# ------------------------------------------------------------------------------
+
+def gridKey(base):
+    "To describe the grid of a base raster: CRS, transform and size."
+    with rasterio.open(base) as src:
+        return [str(src.crs), list(src.transform)[:6], src.width, src.height]
+
+def rasterKey(kind, vector, field, base, index, **params):
+    "To hash a rasterization from the vector content, grid, field and parameters."
+    h = hashlib.sha256()
+    h.update(json.dumps([kind, field, gridKey(base), sorted(params.items())]).encode())
+    for f in sc._filesOf(vector):
+        h.update(sc.fileHash(f, index).encode())
+    return h.hexdigest()[:32]
+
+# ------------------------------------------------------------------------------
+# CACHED RASTERS
+# ------------------------------------------------------------------------------
+
+# Rasters are made outside the lock, under a name unique to the call, and
+# moved into place; two processes that miss the same key both make it and
+# the last move wins, with the same content.
+
+def _cached(kind, vector, field, base, make, **params):
+    "To return the cached raster for a key, making it with make(wbt, output) on a miss."
+    os.makedirs(cache_repo, exist_ok = True)
+    with _locked():
+        index = _loadIndex()
+        key = rasterKey(kind, vector, field, base, index, **params)
+        _saveIndex(index)
+    path = os.path.join(cache_repo, key + ".tif")
+    if not os.path.exists(path):
+        # Write under a temporary name so a crash never leaves a partial raster.
+        tmp = os.path.join(cache_repo, "%s.%d.%s.tmp.tif" % (key, os.getpid(), uuid.uuid4().hex[:8]))
+        with Context(cache_repo, kind) as ctx:
+            make(ctx.wbt, tmp)
+        os.replace(tmp, path)
+    with _locked():
+        index = _loadIndex()
+        index["entries"][key] = {"kind": kind, "vector": vector, "field": field, "base": base, "params": params}
+        _saveIndex(index)
+    return path
+
+def rasterize(kind, vector, field, base):
+    "To rasterize polygons or lines (kind) on the grid of base, like wbt.vector_*_to_raster."
+    tool = {"polygons": "vector_polygons_to_raster", "lines": "vector_lines_to_raster"}[kind]
+    def make(wbt, output):
+        getattr(wbt, tool)(i=vector, output=output, field=field, nodata=False, cell_size=None, base=base)
+    return _cached(kind, vector, field, base, make)
+
+def buffered(kind, vector, field, base, size):
+    "To rasterize a vector and buffer it by size map units, like wbt.buffer_raster (see tiled_distance.py)."
+    source = rasterize(kind, vector, field, base)
+    def make(wbt, output):
+        td.buffer(source, output, size)
+    return _cached(kind + "_buffer", vector, field, base, make, size = size, engine = "edt")
+
+# ------------------------------------------------------------------------------
+# INVALIDATE
+# ------------------------------------------------------------------------------
+
+def invalidate(vector = None):
+    "To delete cached rasters made from a vector (or all of them)."
+    if not os.path.isdir(cache_repo):
+        return;
+    with _locked():
+        index = _loadIndex()
+        for key, entry in list(index["entries"].items()):
+            if vector is None or os.path.abspath(entry["vector"]) == os.path.abspath(vector):
+                path = os.path.join(cache_repo, key + ".tif")
+                if os.path.exists(path):
+                    os.remove(path)
+                del index["entries"][key]
+        for f in list(index["files"]):
+            if vector is None or f in sc._filesOf(vector):
+                del index["files"][f]
+        _saveIndex(index)
+    return;
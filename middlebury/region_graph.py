@@ -0,0 +1,198 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     region_graph.py
+#  purpose:  Region adjacency graph of figure and ground objects, built in one
+#              strip-wise scan of the two label rasters. Figure objects are
+#              nodes with edges to the ground objects they touch (weighted by
+#              shared boundary) and their boundary with background, so the
+#              topology classes are graph queries. The graph is kept beside the
+#              topology raster for the block and connector steps to query.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import os
+
+import numpy as np
+from rasterio.windows import Window
+
+import raster_algebra as ra
+import scratch_store as ss
+from profiling import traced
+
+# Rows read from each raster per pass.
+
+strip_rows = 1024
+
+# Topology codes, as written by classTopology.
+
+island = 1
+spit = 2
+hole = 3
+tombolo = 4
+
+# Each cell is paired with itself and its four neighbours after it in scan
+# order (right, and the three below); the other four neighbours pair with it
+# from their side. Shared boundary is counted in such 8-connected cell pairs.
+
+offsets = ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1))
+
+# ------------------------------------------------------------------------------
+# GRAPH
+# ------------------------------------------------------------------------------
+
+# Classes from the graph: no ground neighbour is an island, two or more is a
+# tombolo, and one is a hole unless the object also touches background (a
+# spit). The pixel engines agree except for objects one or two cells thick
+# whose every cell touches the same ground object, which they call islands.
+
+class RegionGraph:
+    "Figure objects with edges to the ground objects and background they touch."
+
+    def __init__(self, figure, ground, ids, cells, edges, lengths, background):
+        self.figure = figure
+        self.ground = ground
+        self.ids = ids
+        self.cells = cells
+        self.edges = edges
+        self.lengths = lengths
+        self.background = background
+
+    def degree(self):
+        "To count the ground objects each figure object touches."
+        return np.bincount(np.searchsorted(self.ids, self.edges[0]), minlength = len(self.ids))
+
+    def neighbours(self, label):
+        "To list the ground objects a figure object touches, with the shared boundary of each."
+        edge = self.edges[0] == label
+        return self.edges[1][edge], self.lengths[edge]
+
+    def classes(self):
+        "To class each figure object as an island, spit, hole or tombolo."
+        degree = self.degree()
+        codes = np.where(self.background > 0, spit, hole)
+        codes[degree == 0] = island
+        codes[degree > 1] = tombolo
+        return codes.astype(np.uint8)
+
+    def classTable(self):
+        "To give a lookup table from figure label to topology code (0 for other labels)."
+        table = np.zeros(int(self.ids.max()) + 1 if len(self.ids) else 1, dtype = np.uint8)
+        table[self.ids] = self.classes()
+        return table
+
+    def table(self, codes):
+        "To give a lookup table from figure label to 1 where the object's class is one of codes."
+        table = np.isin(self.classTable(), codes).astype(np.uint8)
+        table[0] = 0
+        return table
+
+    def save(self, path):
+        "To keep the graph as a .npz file."
+        np.savez(path, figure = self.figure, ground = self.ground, ids = self.ids, cells = self.cells,
+                 edges = self.edges, lengths = self.lengths, background = self.background)
+        return;
+
+    @classmethod
+    def load(cls, path):
+        "To read a graph kept by save."
+        with np.load(path) as f:
+            return cls(str(f["figure"]), str(f["ground"]), f["ids"], f["cells"], f["edges"], f["lengths"], f["background"])
+
+# ------------------------------------------------------------------------------
+# BUILD
+# ------------------------------------------------------------------------------
+
+def _labels(src, window):
+    "To read a window of labels with noData as 0, and its valid mask."
+    values = src.read(1, window = window).astype(np.int64)
+    valid = np.ones(values.shape, dtype = bool) if src.nodata is None else values != src.nodata
+    return np.where(valid, values, 0), valid
+
+def _cells(array, dy, dx, n):
+    "To pair the cells of the first n rows with their neighbours at (dy, dx), as two views."
+    rows = min(n, array.shape[0] - dy)
+    p, q = array[0:rows], array[dy:dy + rows]
+    if dx > 0:
+        p, q = p[:, :-dx], q[:, dx:]
+    elif dx < 0:
+        p, q = p[:, -dx:], q[:, :dx]
+    return p, q
+
+def _total(keys, counts, axis = None):
+    "To add up counts of repeated keys."
+    if not keys:
+        shape = (0, 2) if axis == 0 else (0,)
+        return np.zeros(shape, dtype = np.int64), np.zeros(0, dtype = np.int64)
+    keys = np.concatenate(keys)
+    unique, inverse = np.unique(keys, axis = axis, return_inverse = True)
+    return unique, np.bincount(inverse.ravel(), weights = np.concatenate(counts), minlength = len(unique)).astype(np.int64)
+
+@traced
+def build(figure, ground):
+    "To build the region adjacency graph of figure and ground label rasters (0 as background) in one scan."
+    nodes, node_cells, pairs, pair_counts, touching, touch_counts = [], [], [], [], [], []
+    with ss.open(figure) as fsrc, ss.open(ground) as gsrc:
+        height, width = fsrc.height, fsrc.width
+        for row in range(0, height, strip_rows):
+            n = min(strip_rows, height - row)
+            # One extra row so pairs across the strip edge are seen.
+            window = Window(0, row, width, min(n + 1, height - row))
+            f, f_valid = _labels(fsrc, window)
+            g, g_valid = _labels(gsrc, window)
+            back = f_valid & g_valid & (f == 0) & (g == 0)
+            ids, cells = np.unique(f[:n][f[:n] > 0], return_counts = True)
+            nodes.append(ids)
+            node_cells.append(cells)
+            strip_pairs, strip_touching = [], []
+            for dy, dx in offsets:
+                fp, fq = _cells(f, dy, dx, n)
+                gp, gq = _cells(g, dy, dx, n)
+                hit = (fp > 0) & (gq > 0)
+                strip_pairs.append(np.stack([fp[hit], gq[hit]], axis = 1))
+                if (dy, dx) == (0, 0):
+                    continue
+                hit = (fq > 0) & (gp > 0)
+                strip_pairs.append(np.stack([fq[hit], gp[hit]], axis = 1))
+                bp, bq = _cells(back, dy, dx, n)
+                strip_touching += [fp[(fp > 0) & bq], fq[(fq > 0) & bp]]
+            strip_pairs = np.concatenate(strip_pairs)
+            if len(strip_pairs):
+                unique, counts = np.unique(strip_pairs, axis = 0, return_counts = True)
+                pairs.append(unique)
+                pair_counts.append(counts)
+            unique, counts = np.unique(np.concatenate(strip_touching), return_counts = True)
+            touching.append(unique)
+            touch_counts.append(counts)
+    ids, cells = _total(nodes, node_cells)
+    edges, lengths = _total(pairs, pair_counts, axis = 0)
+    touched, touch_lengths = _total(touching, touch_counts)
+    background = np.zeros(len(ids), dtype = np.int64)
+    background[np.searchsorted(ids, touched)] = touch_lengths
+    return RegionGraph(figure, ground, ids, cells, edges.T.copy(), lengths, background)
+
+# ------------------------------------------------------------------------------
+# KEPT GRAPHS
+# ------------------------------------------------------------------------------
+
+def graphFile(topology):
+    "To name the graph file kept beside a topology raster."
+    return os.path.splitext(topology)[0] + ".graph.npz"
+
+def load(topology):
+    "To read the graph kept with a topology raster, or None if there is none or the raster is newer."
+    path = graphFile(topology)
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(topology):
+        return None
+    return RegionGraph.load(path)
+
+def select(topology, codes):
+    "To select the figure objects of some topology classes (0/1), from the kept graph when there is one."
+    graph = load(topology)
+    if graph is None:
+        expr = ra.equal_to(topology, codes[0])
+        for code in codes[1:]:
+            expr = ra.Or(expr, ra.equal_to(topology, code))
+        return expr
+    # Like the topology raster, cells outside figure objects (noData too) are 0.
+    return ra.convert_nodata_to_zero(ra.lookup(graph.figure, graph.table(codes)))
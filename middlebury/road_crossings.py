@@ -0,0 +1,150 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     road_crossings.py
+#  purpose:  Join blocks that fragmenting roads separate without re-clumping
+#              the whole raster. Only strips with road cells are scanned: road
+#              cells within the crossing distance of a block are linked to the
+#              blocks and road cells they touch, the links are merged with
+#              union-find over the existing block labels, and the blocks are
+#              relabelled through a lookup table.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import numpy as np
+from rasterio.windows import Window
+
+import array_tools as at
+import scratch_store as ss
+from profiling import traced
+
+# Rows scanned per pass.
+
+strip_rows = 512
+
+# Neighbours after a cell in scan order (the rest pair with it from their side).
+
+forward = ((0, 1), (1, -1), (1, 0), (1, 1))
+
+# ------------------------------------------------------------------------------
+# CROSSINGS
+# ------------------------------------------------------------------------------
+
+# A road cell crosses when a block cell lies in the filterx by filtery window
+# around it, as in the dilate-and-intersect steps of withRoadXing. Crossing
+# cells join the blocks and other crossing cells they touch (8-connected), so
+# the result matches clumping blocks plus crossing cells with diag=True when
+# the blocks are themselves 8-connected objects (as clump(diag=True) makes).
+
+def _read(src, window):
+    "To read a window with a mask of valid cells."
+    values = src.read(1, window = window)
+    valid = np.ones(values.shape, dtype = bool) if src.nodata is None else values != src.nodata
+    return values, valid
+
+def _pairs(p, q, dy, dx, rows):
+    "To give the cells of the first rows and their neighbours at (dy, dx), as two views."
+    p, q = p[0:rows], q[dy:dy + rows]
+    if dx > 0:
+        p, q = p[:, :-dx], q[:, dx:]
+    elif dx < 0:
+        p, q = p[:, -dx:], q[:, :dx]
+    return p, q
+
+def crossings(blocks, starter, code = 99, filterx = 5, filtery = 5):
+    "To find crossing road cells (as global cell indices) and their links to blocks and to each other."
+    dy = filtery // 2
+    cells, cell_links, block_links = [], [], []
+    with ss.open(blocks) as bsrc, ss.open(starter) as ssrc:
+        width, height = bsrc.width, bsrc.height
+        for row in range(0, height, strip_rows):
+            n = min(strip_rows, height - row)
+            # Skip strips (and their extra row) without road cells.
+            road, road_valid = _read(ssrc, Window(0, row, width, min(n + 1, height - row)))
+            if not ((road == code) & road_valid).any():
+                continue
+            # Read the window context above and below, and one extra row for links.
+            top, bottom = max(0, row - dy), min(height, row + n + 1 + dy)
+            window = Window(0, top, width, bottom - top)
+            labels, valid = _read(bsrc, window)
+            road, road_valid = _read(ssrc, window)
+            block = valid & (labels != 0)
+            near = at._windowSum(block, filterx, filtery) > 0
+            cross = (road == code) & road_valid & valid & near & ~block
+            # Keep the strip's rows and the extra row.
+            s = row - top
+            rows = min(n, height - row - 1)
+            labels, cross = labels[s:s + n + 1].astype(np.int64), cross[s:s + n + 1]
+            block = block[s:s + n + 1]
+            index = (row + np.arange(cross.shape[0], dtype = np.int64))[:, None] * width + np.arange(width, dtype = np.int64)
+            cells.append(index[:n][cross[:n]])
+            for oy, ox in forward:
+                if oy and not rows:
+                    continue
+                m = n if oy == 0 else rows
+                cp, cq = _pairs(cross, cross, oy, ox, m)
+                ip, iq = _pairs(index, index, oy, ox, m)
+                bp, bq = _pairs(block, block, oy, ox, m)
+                lp, lq = _pairs(labels, labels, oy, ox, m)
+                hit = cp & cq
+                cell_links.append(np.stack([ip[hit], iq[hit]]))
+                hit = cp & bq
+                block_links.append(np.stack([ip[hit], lq[hit]]))
+                hit = cq & bp
+                block_links.append(np.stack([iq[hit], lp[hit]]))
+    empty = np.zeros((2, 0), dtype = np.int64)
+    return (np.concatenate(cells) if cells else np.zeros(0, dtype = np.int64),
+            np.concatenate(cell_links, axis = 1) if cell_links else empty,
+            np.concatenate(block_links, axis = 1) if block_links else empty)
+
+def _maxLabel(src):
+    "To give the largest label of an open label raster, from its range tag or by reading it."
+    if at.range_tag in src.tags():
+        return int(at.readRange(src)[1])
+    top = 0
+    for row in range(0, src.height, strip_rows):
+        labels, valid = _read(src, Window(0, row, src.width, min(strip_rows, src.height - row)))
+        if valid.any():
+            top = max(top, int(labels[valid].max()))
+    return top
+
+# ------------------------------------------------------------------------------
+# JOIN
+# ------------------------------------------------------------------------------
+
+# Joined blocks take the rank of their smallest block label, and road cells
+# that join no block are numbered after all blocks, so labels are 1.. without
+# gaps but follow block order rather than the first cell of each group.
+
+@traced
+def joinAcross(blocks, starter, output, code = 99, filterx = 5, filtery = 5):
+    "To join blocks across road cells of code within the filter window, like dilating, intersecting and re-clumping."
+    cells, cell_links, block_links = crossings(blocks, starter, code, filterx, filtery)
+    with ss.open(blocks) as src:
+        top = _maxLabel(src)
+        profile = src.profile.copy()
+        width, height = src.width, src.height
+    # Nodes 0..top are block labels, then one node per crossing cell.
+    node = lambda index: top + 1 + np.searchsorted(cells, index)
+    a = np.concatenate([node(cell_links[0]), node(block_links[0])])
+    b = np.concatenate([node(cell_links[1]), block_links[1]])
+    component = at.mergeLabels(top + 1 + len(cells), (a, b))
+    first = np.concatenate([np.arange(top + 1, dtype = np.float64), top + 1 + cells.astype(np.float64)])
+    lut = at.rankByFirst(component, first).astype(np.uint32)
+    table, cell_labels = lut[:top + 1], lut[top + 1:]
+
+    # Relabel the blocks, paint the crossing cells, with noData where either input has it.
+    nodata = at.noDataFor("uint32")
+    profile.update(count = 1, dtype = "uint32", nodata = nodata)
+    with ss.open(blocks) as bsrc, ss.open(starter) as ssrc, ss.open(output, "w", **profile) as dst:
+        dst.update_tags(**{at.range_tag: "0.0 %r" % float(lut.max())})
+        for row in range(0, height, strip_rows):
+            n = min(strip_rows, height - row)
+            window = Window(0, row, width, n)
+            labels, valid = _read(bsrc, window)
+            _, road_valid = _read(ssrc, window)
+            out = table[np.clip(labels.astype(np.int64), 0, top)]
+            lo, hi = np.searchsorted(cells, [row * width, (row + n) * width])
+            out.reshape(-1)[cells[lo:hi] - row * width] = cell_labels[lo:hi]
+            dst.write(np.where(valid & road_valid, out, nodata).astype(np.uint32), 1, window = window)
+    return output
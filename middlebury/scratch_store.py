@@ -0,0 +1,147 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     scratch_store.py
+#  purpose:  Keep intermediate rasters on local disk as raw memory-mapped
+#              arrays with a JSON sidecar for georeferencing, instead of
+#              GeoTIFFs on the network volume. open() reads and writes these
+#              like rasterio datasets and hands any other path to rasterio,
+#              so the in-memory engines take either.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import builtins
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import rasterio
+
+from settings import setting
+
+# Local folder for mapped rasters (not the network scratch repo).
+
+local_repo = setting("local_scratch", os.path.join(tempfile.gettempdir(), "vtlc_scratch"))
+
+# Mapped rasters end with this suffix; their sidecars add ".json".
+
+suffix = ".raw"
+
+# ------------------------------------------------------------------------------
+# PATHS
+# ------------------------------------------------------------------------------
+
+def folder(scratch_repo):
+    "To give the local folder that mirrors a scratch repo."
+    return os.path.join(local_repo, os.path.abspath(scratch_repo).strip(os.sep).replace(os.sep, "_"))
+
+def path(name, scratch_repo):
+    "To give the mapped-raster path for a scratch file name such as '_01.tif'."
+    return os.path.join(folder(scratch_repo), os.path.splitext(name)[0] + suffix)
+
+def isMapped(path):
+    "To tell whether a path is a mapped raster."
+    return isinstance(path, str) and path.endswith(suffix)
+
+def remove(path):
+    "To delete a mapped raster and its sidecar."
+    for f in (path, path + ".json"):
+        if os.path.exists(f):
+            os.remove(f)
+    return;
+
+def clear(scratch_repo):
+    "To delete the mapped rasters made for a scratch repo."
+    shutil.rmtree(folder(scratch_repo), ignore_errors = True)
+    return;
+
+# ------------------------------------------------------------------------------
+# MAPPED RASTERS
+# ------------------------------------------------------------------------------
+
+class MappedRaster:
+    "A single-band raster kept as a raw array on disk, read and written like a rasterio dataset."
+
+    def __init__(self, path, mode = "r", **profile):
+        self.path = path
+        self.mode = mode
+        if mode == "w":
+            crs = profile.get("crs")
+            self.meta = {
+                "width": profile["width"],
+                "height": profile["height"],
+                "dtype": np.dtype(profile.get("dtype", "float32")).name,
+                "nodata": profile.get("nodata"),
+                "crs": crs.to_wkt() if hasattr(crs, "to_wkt") else crs,
+                "transform": list(profile["transform"])[:6],
+                "tags": {},
+            }
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+        else:
+            with builtins.open(path + ".json") as f:
+                self.meta = json.load(f)
+        shape = (self.meta["height"], self.meta["width"])
+        self.array = np.memmap(path, dtype = self.meta["dtype"], mode = "w+" if mode == "w" else "r", shape = shape)
+
+    width = property(lambda self: self.meta["width"])
+    height = property(lambda self: self.meta["height"])
+    nodata = property(lambda self: self.meta["nodata"])
+    dtypes = property(lambda self: (self.meta["dtype"],))
+
+    @property
+    def profile(self):
+        return {
+            "driver": "GTiff", "count": 1, "width": self.width, "height": self.height,
+            "dtype": self.meta["dtype"], "nodata": self.nodata, "crs": self.meta["crs"],
+            "transform": rasterio.Affine(*self.meta["transform"]),
+        }
+
+    def _slices(self, window):
+        if window is None:
+            return slice(None), slice(None)
+        row, col = int(window.row_off), int(window.col_off)
+        return slice(row, row + int(window.height)), slice(col, col + int(window.width))
+
+    def read(self, band = 1, window = None):
+        "To read band 1 (or a window of it) without copying."
+        return self.array[self._slices(window)]
+
+    def write(self, array, band = 1, window = None):
+        "To write band 1 (or a window of it)."
+        self.array[self._slices(window)] = array
+        return;
+
+    def tags(self):
+        return dict(self.meta["tags"])
+
+    def update_tags(self, **tags):
+        self.meta["tags"].update({k: str(v) for k, v in tags.items()})
+        return;
+
+    def close(self):
+        "To flush a written raster and its sidecar."
+        if self.mode == "w":
+            self.array.flush()
+            with builtins.open(self.path + ".json", "w") as f:
+                json.dump(self.meta, f)
+            self.mode = "r"
+        self.array = None
+        return;
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ------------------------------------------------------------------------------
+# OPEN
+# ------------------------------------------------------------------------------
+
+def open(path, mode = "r", **profile):
+    "To open a mapped raster, or any other raster with rasterio."
+    if isMapped(path):
+        return MappedRaster(path, mode, **profile)
+    return rasterio.open(path, mode, **profile)
@@ -0,0 +1,42 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     settings.py
+#  purpose:  Look up dataset paths and working directories, so the scripts
+#              can be pointed at another town with VTLC_* environment
+#              variables (for example VTLC_LC or VTLC_DATA_REPO).
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import contextlib
+import os
+
+def setting(name, default):
+    "To read a setting from the VTLC_<NAME> environment variable, or use the default."
+    return os.environ.get("VTLC_" + name.upper(), default)
+
+# ------------------------------------------------------------------------------
+# WORKERS
+# ------------------------------------------------------------------------------
+
+# VTLC_WORKERS is the number of processes a run may use in all. A pool that
+# starts n tasks at once (pipeline stages, batch towns, sweep scenarios)
+# passes each task a share of it, so the tiled engines started inside a
+# pooled task do not start a pool of every CPU each.
+
+def workers():
+    "To give the worker processes a call may use: the VTLC_WORKERS budget, or every CPU."
+    return max(1, int(setting("workers", os.cpu_count() or 1)))
+
+@contextlib.contextmanager
+def shareWorkers(n):
+    "To give tasks started inside (and their processes) an equal share of the worker budget among n."
+    saved = os.environ.get("VTLC_WORKERS")
+    os.environ["VTLC_WORKERS"] = str(max(1, workers() // max(1, n or os.cpu_count() or 1)))
+    try:
+        yield
+    finally:
+        if saved is None:
+            del os.environ["VTLC_WORKERS"]
+        else:
+            os.environ["VTLC_WORKERS"] = saved
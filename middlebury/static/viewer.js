@@ -0,0 +1,110 @@
+// A small XYZ tile viewer for tile_server.py: drag to pan, wheel or +/- to
+// zoom, and a list to switch layers. It has no dependencies, so the page
+// needs nothing beyond the server (no CDN, works on an isolated network).
+// Configured by the page through viewer({map, layers, center, zoom, maxZoom}).
+
+function viewer(config) {
+  var size = 256;
+  var map = document.getElementById(config.map || "map");
+  var pane = document.createElement("div");
+  pane.className = "tiles";
+  map.appendChild(pane);
+
+  // The view is the map centre in world pixels at the current zoom.
+  var zoom = config.zoom, maxZoom = config.maxZoom || 20;
+  var layer = config.layers[0];
+  var centre = project(config.center[0], config.center[1], zoom);
+  var shown = {};
+
+  function project(lat, lon, z) {
+    var scale = size * Math.pow(2, z), s = Math.sin(lat * Math.PI / 180);
+    return [(lon + 180) / 360 * scale, (0.5 - Math.log((1 + s) / (1 - s)) / (4 * Math.PI)) * scale];
+  }
+
+  function draw() {
+    var width = map.clientWidth, height = map.clientHeight, count = Math.pow(2, zoom);
+    var left = centre[0] - width / 2, top = centre[1] - height / 2;
+    var wanted = {};
+    for (var y = Math.max(0, Math.floor(top / size)); y <= Math.min(count - 1, Math.floor((top + height) / size)); y++) {
+      for (var x = Math.floor(left / size); x <= Math.floor((left + width) / size); x++) {
+        var wrapped = ((x % count) + count) % count;
+        var key = layer + "/" + zoom + "/" + x + "/" + y;
+        var img = shown[key];
+        if (!img) {
+          img = document.createElement("img");
+          img.src = "/" + layer + "/" + zoom + "/" + wrapped + "/" + y + ".png";
+          img.alt = "";
+          pane.appendChild(img);
+        }
+        img.style.left = Math.round(x * size - left) + "px";
+        img.style.top = Math.round(y * size - top) + "px";
+        wanted[key] = img;
+      }
+    }
+    for (var old in shown) {
+      if (!wanted[old]) pane.removeChild(shown[old]);
+    }
+    shown = wanted;
+  }
+
+  function zoomTo(z, px, py) {
+    // Keep the world point under (px, py) in place.
+    z = Math.max(0, Math.min(maxZoom, z));
+    if (z === zoom) return;
+    var f = Math.pow(2, z - zoom);
+    var dx = px - map.clientWidth / 2, dy = py - map.clientHeight / 2;
+    centre = [(centre[0] + dx) * f - dx, (centre[1] + dy) * f - dy];
+    zoom = z;
+    draw();
+  }
+
+  var drag = null;
+  map.addEventListener("pointerdown", function (e) {
+    if (e.target.closest("#controls")) return;
+    drag = [e.clientX, e.clientY];
+    map.classList.add("dragging");
+    map.setPointerCapture(e.pointerId);
+  });
+  map.addEventListener("pointermove", function (e) {
+    if (!drag) return;
+    centre = [centre[0] - (e.clientX - drag[0]), centre[1] - (e.clientY - drag[1])];
+    drag = [e.clientX, e.clientY];
+    draw();
+  });
+  map.addEventListener("pointerup", function () {
+    drag = null;
+    map.classList.remove("dragging");
+  });
+  map.addEventListener("wheel", function (e) {
+    e.preventDefault();
+    var box = map.getBoundingClientRect();
+    zoomTo(zoom + (e.deltaY < 0 ? 1 : -1), e.clientX - box.left, e.clientY - box.top);
+  }, {passive: false});
+  map.addEventListener("dblclick", function (e) {
+    var box = map.getBoundingClientRect();
+    zoomTo(zoom + 1, e.clientX - box.left, e.clientY - box.top);
+  });
+
+  var controls = document.createElement("div");
+  controls.id = "controls";
+  var zoomIn = document.createElement("button"), zoomOut = document.createElement("button");
+  zoomIn.textContent = "+";
+  zoomOut.textContent = "−";
+  zoomIn.onclick = function () { zoomTo(zoom + 1, map.clientWidth / 2, map.clientHeight / 2); };
+  zoomOut.onclick = function () { zoomTo(zoom - 1, map.clientWidth / 2, map.clientHeight / 2); };
+  var select = document.createElement("select");
+  config.layers.forEach(function (name) {
+    var option = document.createElement("option");
+    option.value = option.textContent = name;
+    select.appendChild(option);
+  });
+  select.onchange = function () { layer = select.value; draw(); };
+  controls.appendChild(zoomIn);
+  controls.appendChild(zoomOut);
+  controls.appendChild(document.createTextNode(" "));
+  controls.appendChild(select);
+  map.appendChild(controls);
+
+  window.addEventListener("resize", draw);
+  draw();
+}
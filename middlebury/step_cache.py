@@ -0,0 +1,182 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     step_cache.py
+#  purpose:  Skip pipeline steps whose inputs, parameters and code have not
+#              changed since their outputs were made, and keep the scratch
+#              repo under a size limit.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import hashlib
+import inspect
+import json
+import os
+import sys
+
+import conservation_tools as ct
+
+# Files that travel with a shapefile and change its content.
+
+shape_sidecars = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+
+# Largest size of the scratch repo in bytes (None for no limit).
+
+scratch_limit = 200 * 1024**3
+
+# Project modules live here; a step's version covers the ones it uses.
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# ------------------------------------------------------------------------------
+# CACHE INDEX
+# ------------------------------------------------------------------------------
+
+def indexFile():
+    "To give the path of the cache index in the data repo."
+    return os.path.join(ct.data_repo, "_step_cache.json")
+
+def loadIndex():
+    "To read the cache index, or start an empty one."
+    if os.path.exists(indexFile()):
+        with open(indexFile()) as f:
+            return json.load(f)
+    return {"steps": {}, "files": {}}
+
+def saveIndex(index):
+    "To write the cache index (via a temporary file so it is never half written)."
+    tmp = indexFile() + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent = 1, sort_keys = True)
+    os.replace(tmp, indexFile())
+    return;
+
+# ------------------------------------------------------------------------------
+# HASHES
+# ------------------------------------------------------------------------------
+
+def _filesOf(path):
+    "To list a file with its sidecars (for shapefiles)."
+    root, ext = os.path.splitext(path)
+    if ext.lower() == ".shp":
+        return [root + e for e in shape_sidecars if os.path.exists(root + e)]
+    return [path]
+
+def fileHash(path, index):
+    "To hash a file's content, reusing the last hash while its size and time are unchanged."
+    stat = os.stat(path)
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    known = index["files"].get(path)
+    if known and known["stamp"] == stamp:
+        return known["sha256"]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(16 * 1024**2), b""):
+            h.update(chunk)
+    index["files"][path] = {"stamp": stamp, "sha256": h.hexdigest()}
+    return h.hexdigest()
+
+def projectModules(module, found = None):
+    "To map the project modules a module uses (itself, its imports and theirs) to their files."
+    found = {} if found is None else found
+    path = getattr(module, "__file__", None)
+    if not path or os.path.dirname(os.path.abspath(path)) != here or module.__name__ in found:
+        return found
+    found[module.__name__] = path
+    for value in list(vars(module).values()):
+        if inspect.ismodule(value):
+            projectModules(value, found)
+        elif inspect.isfunction(value) or inspect.isclass(value):
+            used = sys.modules.get(getattr(value, "__module__", None))
+            if used is not None:
+                projectModules(used, found)
+    return found
+
+def functionVersion(func):
+    "To version a function by its source code and the project modules it uses (or its 'version' attribute)."
+    version = getattr(func, "version", None)
+    if version is not None:
+        return str(version)
+    h = hashlib.sha256(inspect.getsource(func).encode())
+    # Engines the step calls (array_tools, tiled_clump, ...) change its outputs too.
+    module = inspect.getmodule(func)
+    for name, path in sorted(projectModules(module).items()) if module else ():
+        with open(path, "rb") as f:
+            h.update(name.encode())
+            h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()
+
+def stepKey(func, args, inputs, index):
+    "To hash a step from its function version, arguments and input files."
+    h = hashlib.sha256()
+    h.update(func.__name__.encode())
+    h.update(functionVersion(func).encode())
+    h.update(repr(args).encode())
+    for path in inputs:
+        for f in _filesOf(path):
+            h.update(f.encode())
+            h.update(fileHash(f, index).encode())
+    return h.hexdigest()
+
+# ------------------------------------------------------------------------------
+# CACHED STEPS
+# ------------------------------------------------------------------------------
+
+# inputs are all files the step reads (including any the function reads from
+# module globals, such as ct.starter) and outputs are the files it makes.
+
+def isCached(func, args, inputs, outputs):
+    "To test whether a step's outputs were made from its current key, returning (cached, key)."
+    index = loadIndex()
+    key = stepKey(func, args, inputs, index)
+    done = index["steps"].get(key)
+    saveIndex(index)
+    return done == list(outputs) and all(os.path.exists(o) for o in outputs), key
+
+def recordStep(key, outputs):
+    "To record the outputs made for a step key."
+    index = loadIndex()
+    # Refresh hashes of the outputs so downstream keys see new content.
+    for o in outputs:
+        fileHash(o, index)
+    index["steps"][key] = list(outputs)
+    saveIndex(index)
+    return;
+
+def cachedStep(func, args, inputs, outputs):
+    "To run a step unless its outputs were already made from the same key."
+    cached, key = isCached(func, args, inputs, outputs)
+    if cached:
+        print("cached: " + func.__name__ + str(args))
+        return False
+    print("running: " + func.__name__ + str(args))
+    func(*args)
+    recordStep(key, outputs)
+    evictScratch()
+    return True
+
+# ------------------------------------------------------------------------------
+# SCRATCH EVICTION
+# ------------------------------------------------------------------------------
+
+def evictScratch(limit = None, keep = ()):
+    "To delete least recently used scratch files (outside the keep folders) until the scratch repo fits the limit."
+    limit = scratch_limit if limit is None else limit
+    if limit is None or not os.path.isdir(ct.scratch_repo):
+        return;
+    keep = [os.path.abspath(k) for k in keep]
+    files = []
+    for root, _, names in os.walk(ct.scratch_repo):
+        if any(os.path.abspath(root).startswith(k) for k in keep):
+            continue
+        for name in names:
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            files.append((max(stat.st_atime, stat.st_mtime), stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= limit:
+            break
+        os.remove(path)
+        total -= size
+    return;
@@ -0,0 +1,260 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     sweep.py
+#  purpose:  Run "what if" scenarios over a grid of parameter values, making
+#              each product once for every distinct set of parameters it
+#              depends on, and write a table comparing block counts and plan
+#              acres across scenarios:
+#
+#              python sweep.py outputs/sweep --xing-window 5 7 9 \
+#                  --stream-buffer 15 30 --lowland-window 11 15
+#
+#            Landforms are classified once and lowlands made once per
+#            majority window; _01 runs once per patch-acre threshold; the
+#            _03 stages that no swept parameter reaches run once per starter
+#            and are linked into each scenario, and only the stages
+#            downstream of a swept parameter run per scenario, in parallel.
+#            Datasets come from the usual VTLC_* settings.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import argparse
+import csv
+import itertools
+import os
+import runpy
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from rasterio.windows import Window
+
+from settings import shareWorkers
+
+here = os.path.dirname(os.path.abspath(__file__))
+prep_script = os.path.join(here, "patches", "_01_prep_lc_starter.py")
+blocks_script = os.path.join(here, "patches", "_03_classify_habitat_blocks.py")
+
+# Swept settings and their defaults (as the scripts read them).
+
+defaults = {"patch_acres": "0.25,10", "lowland_window": "11", "xing_window": "5", "stream_buffer": "15"}
+
+# The _03 stages where a parameter enters; lowland_window enters through the
+# lowlands file and patch_acres through the starter.
+
+entries = {"xing_window": ("forest_road_xing", "field_road_xing"), "stream_buffer": ("river_corridors",)}
+
+# Plan classes reported in the comparison table.
+
+plan_classes = {1: "old_field", 2: "working_field", 3: "scenic_field", 4: "connector", 5: "forest"}
+
+# ------------------------------------------------------------------------------
+# SCENARIOS
+# ------------------------------------------------------------------------------
+
+def checkPatchAcres(value):
+    "To reject patch thresholds _01 cannot use: it needs two increasing values, e.g. 0.25,10."
+    try:
+        breaks = [float(x) for x in str(value).split(",")]
+    except ValueError:
+        breaks = []
+    if len(breaks) != 2 or not 0 < breaks[0] < breaks[1]:
+        raise ValueError("patch acres need two increasing thresholds, e.g. 0.25,10 (got %s)" % value)
+    return value
+
+def scenarios(grid):
+    "To list every combination of swept values as a dict of settings."
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+def tag(params):
+    "To name a folder for some parameter values."
+    return "_".join("%s-%s" % (k, str(v).replace(",", "-")) for k, v in sorted(params.items())) or "base"
+
+def _env(**settings):
+    "To make the environment for a script run with some VTLC_* settings."
+    env = dict(os.environ)
+    env.update({"VTLC_" + k.upper(): str(v) for k, v in settings.items()})
+    env["PYTHONPATH"] = os.pathsep.join([here, env.get("PYTHONPATH", "")])
+    return env
+
+def _script(script, folder, **settings):
+    "To run a patch script, logging to the folder's run.log."
+    with open(os.path.join(folder, "run.log"), "a") as log:
+        subprocess.run([sys.executable, script], env = _env(**settings), stdout = log, stderr = subprocess.STDOUT, check = True)
+    return;
+
+def _link(source, target):
+    "To link a shared product into a scenario folder."
+    if os.path.lexists(target):
+        os.remove(target)
+    os.symlink(os.path.abspath(source), target)
+    return;
+
+def _folders(root):
+    "To make the data, scratch and work folders of a run."
+    paths = {"data_repo": os.path.join(root, "_goods") + os.sep,
+             "scratch_repo": os.path.join(root, "_scratch"),
+             "work_dir": os.path.join(root, "_01")}
+    for path in paths.values():
+        os.makedirs(path, exist_ok = True)
+    return paths
+
+# ------------------------------------------------------------------------------
+# SHARED PRODUCTS
+# ------------------------------------------------------------------------------
+
+def makeLowlands(out, windows):
+    "To classify landforms once and make lowlands once per majority window."
+    import conservation_tools as ct
+    import step_cache as sc
+    paths = _folders(os.path.join(out, "_landforms"))
+    ct.data_repo, ct.scratch_repo = paths["data_repo"], paths["scratch_repo"]
+    landforms = paths["data_repo"] + "_landforms.tif"
+    sc.cachedStep(ct.classifyLandforms, (), [ct.dem, ct.lc], [landforms])
+    lowlands = {}
+    for window in windows:
+        paths = _folders(os.path.join(out, "_lowlands", tag({"lowland_window": window})))
+        ct.data_repo, ct.scratch_repo = paths["data_repo"], paths["scratch_repo"]
+        lowlands[window] = paths["data_repo"] + "_lowlands.tif"
+        sc.cachedStep(ct.makeLowlands, (landforms, int(window)), [landforms], [lowlands[window]])
+    return lowlands
+
+def makeStarter(out, patch_acres):
+    "To run _01 for one patch-acre threshold, returning the starter."
+    root = os.path.join(out, tag({"patch_acres": patch_acres}))
+    paths = _folders(root)
+    _script(prep_script, root, patch_acres = patch_acres, **paths)
+    return os.path.join(paths["work_dir"], "154_lc_update.tif")
+
+def dependent(stages, swept):
+    "To name the _03 stages downstream of a swept parameter."
+    import pipeline
+    needs = pipeline.upstream(stages)
+    dirty = set()
+    for stage in pipeline.order(stages):
+        enters = any(stage.name in entries.get(p, ()) for p in swept)
+        lowland = "lowland_window" in swept and any(os.path.basename(i) == "_lowlands.tif" for i in stage.inputs)
+        if enters or lowland or any(p in dirty for p in needs[stage.name]):
+            dirty.add(stage.name)
+    return dirty
+
+def _stages(paths, starter):
+    "To declare the _03 stages for a run's folders (without running them)."
+    saved = dict(os.environ)
+    try:
+        os.environ.update(_env(starter = starter, **paths))
+        return runpy.run_path(blocks_script)["stages"]
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+
+# ------------------------------------------------------------------------------
+# SCENARIO RUNS
+# ------------------------------------------------------------------------------
+
+def runScenario(root, starter, lowlands, shared, only, params):
+    "To run the stages of one scenario, with shared products linked in."
+    paths = _folders(root)
+    _link(lowlands, paths["data_repo"] + "_lowlands.tif")
+    for path in shared:
+        _link(path, paths["data_repo"] + os.path.basename(path))
+    start = time.time()
+    if only:
+        _script(blocks_script, root, starter = starter, stages = ",".join(sorted(only)), **dict(params, **paths))
+    return time.time() - start
+
+def _countLabels(path):
+    "To count the distinct nonzero labels of a label raster."
+    import scratch_store as ss
+    seen = set()
+    with ss.open(path) as src:
+        for row in range(0, src.height, 1024):
+            values = src.read(1, window = Window(0, row, src.width, min(1024, src.height - row)))
+            valid = values != src.nodata if src.nodata is not None else np.ones(values.shape, dtype = bool)
+            seen.update(np.unique(values[valid & (values != 0)]).tolist())
+    return len(seen)
+
+def summarize(folder):
+    "To count blocks and add up plan acres for one scenario's data repo."
+    import scratch_store as ss
+    import tiled_clump as tc
+    row = {
+        "forest_blocks": _countLabels(folder + "_forest_habitat_blocks_withRoadXing.tif"),
+        "field_blocks": _countLabels(folder + "_field_habitat_blocks_withRoadXing.tif"),
+    }
+    plan = folder + "_conservation_plan.tif"
+    counts = np.zeros(max(plan_classes) + 1, dtype = np.int64)
+    with ss.open(plan) as src:
+        for r in range(0, src.height, 1024):
+            values = src.read(1, window = Window(0, r, src.width, min(1024, src.height - r)))
+            valid = values != src.nodata if src.nodata is not None else np.ones(values.shape, dtype = bool)
+            values = values[valid & (values >= 0) & (values < len(counts))].astype(np.int64)
+            counts += np.bincount(values, minlength = len(counts))
+    area = tc.cellArea(plan) / tc.acre
+    for code, name in plan_classes.items():
+        row[name + "_acres"] = counts[code] * area
+    return row
+
+# ------------------------------------------------------------------------------
+# SWEEP
+# ------------------------------------------------------------------------------
+
+def sweep(grid, out, workers = 2):
+    "To run every scenario of a parameter grid, sharing what does not change, and write sweep.csv."
+    grid = {k: list(grid.get(k) or [defaults[k]]) for k in defaults}
+    # Check every value before any run starts.
+    for value in grid["patch_acres"]:
+        checkPatchAcres(value)
+    swept = {k for k, values in grid.items() if len(values) > 1}
+    os.makedirs(out, exist_ok = True)
+    lowlands = makeLowlands(out, grid["lowland_window"])
+    rows = []
+    for patch_acres in grid["patch_acres"]:
+        starter = makeStarter(out, patch_acres)
+        group = os.path.join(out, tag({"patch_acres": patch_acres}))
+        # Stages no swept parameter reaches run once for this starter.
+        shared_paths = _folders(os.path.join(group, "_shared"))
+        stages = _stages(shared_paths, starter)
+        dirty = dependent(stages, swept)
+        shared = [s for s in stages if s.name not in dirty]
+        first = {k: v[0] for k, v in grid.items() if k != "patch_acres"}
+        if shared:
+            _link(lowlands[first["lowland_window"]], shared_paths["data_repo"] + "_lowlands.tif")
+            _script(blocks_script, os.path.join(group, "_shared"), starter = starter,
+                    stages = ",".join(s.name for s in shared), **dict(first, **shared_paths))
+        shared_files = [o for s in shared for o in s.outputs]
+        # The rest run per scenario, scenarios in parallel.
+        cases = scenarios({k: v for k, v in grid.items() if k != "patch_acres"})
+        jobs = {}
+        with shareWorkers(workers), ProcessPoolExecutor(workers) as pool:
+            for params in cases:
+                root = os.path.join(group, tag({k: v for k, v in params.items() if k in swept}))
+                jobs[pool.submit(runScenario, root, starter, lowlands[params["lowland_window"]], shared_files, dirty, params)] = (params, root)
+            for future, (params, root) in jobs.items():
+                seconds = future.result()
+                row = dict(params, patch_acres = patch_acres, seconds = round(seconds, 1))
+                row.update(summarize(os.path.join(root, "_goods") + os.sep))
+                rows.append(row)
+                print("%-60s %8.0fs" % (tag(params), seconds))
+    output = os.path.join(out, "sweep.csv")
+    with open(output, "w", newline = "") as f:
+        writer = csv.DictWriter(f, fieldnames = list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return output
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Run a grid of plan scenarios, sharing unchanged products.")
+    parser.add_argument("out")
+    parser.add_argument("--patch-acres", nargs = "+", help = "two patch thresholds in acres per scenario, e.g. 0.25,10 0.5,20")
+    parser.add_argument("--lowland-window", nargs = "+", help = "majority window for lowlands (cells)")
+    parser.add_argument("--xing-window", nargs = "+", help = "road-crossing window (cells)")
+    parser.add_argument("--stream-buffer", nargs = "+", help = "small-stream buffer (map units)")
+    parser.add_argument("--workers", type = int, default = 2)
+    args = parser.parse_args()
+    grid = {k: getattr(args, k) for k in defaults}
+    print(sweep(grid, args.out, args.workers))
@@ -0,0 +1,265 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     tile_server.py
+#  purpose:  Serve products as XYZ map tiles (web mercator PNGs) coloured with
+#              the palette of _01_prep_lc_starter.py, for browsing the plan
+#              in a web map or QGIS without copying the rasters:
+#
+#              python tile_server.py plan=outputs/_goods/_conservation_plan_clipByTown.tif \
+#                  starter=outputs/landscapePatches/_01/154_lc_update.tif --port 8000
+#
+#            Tiles are read from the overview level nearest their zoom (see
+#            cog.py), so a zoomed-out tile reads a few blocks rather than
+#            the full raster, and rendered tiles are kept in an LRU cache
+#            shared by every request. A product written again gets new
+#            tiles (the cache key holds its modification time).
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import argparse
+import json
+import math
+import os
+import re
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.errors import WindowError
+from rasterio.transform import from_bounds
+from rasterio.warp import reproject, transform_bounds
+from rasterio.windows import Window, from_bounds as window_from_bounds
+
+from settings import setting
+
+# Tile size in pixels and the number of rendered tiles kept in memory.
+
+tile_size = 256
+cache_tiles = int(setting("tile_cache", "4096"))
+
+# ------------------------------------------------------------------------------
+# PALETTES
+# ------------------------------------------------------------------------------
+
+# Colours from the VISUALIZATION notes of _01_prep_lc_starter.py, as RGB hex.
+# The starter takes them by land cover; plan classes take the colour of the
+# cover they stand for (old fields are recovering grass, working fields are
+# clearings, connectors are paths). Scenic fields have no colour in _01 and
+# take a light orange. Codes not listed are transparent.
+
+grass, trees, water, ag, developed = "#FAF87D", "#C6E37D", "#94DAE3", "#C67DE3", "#c8c8c8"
+background, paths, fragmenting = "#191919", "#E371AD", "#ffffff"
+
+palettes = {
+    "starter": {0: grass, 1: trees, 2: water, 3: ag, 4: developed, 99: fragmenting},
+    "plan": {0: background, 1: grass, 2: ag, 3: "#F5C26B", 4: paths, 5: trees},
+}
+
+def lookup(palette):
+    "To make an RGBA lookup table (one row per code up to 255) from a palette."
+    lut = np.zeros((256, 4), dtype = np.uint8)
+    for code, colour in palette.items():
+        lut[code] = [int(colour[i:i + 2], 16) for i in (1, 3, 5)] + [255]
+    return lut
+
+# ------------------------------------------------------------------------------
+# TILES
+# ------------------------------------------------------------------------------
+
+# Web mercator extent of tile (z, x, y) in metres.
+
+half = math.pi * 6378137.0
+
+def tileBounds(z, x, y):
+    "To give the web mercator bounds (left, bottom, right, top) of an XYZ tile."
+    size = 2 * half / 2 ** z
+    left, top = -half + x * size, half - y * size
+    return left, top - size, left + size, top
+
+def _level(src, bounds):
+    "To pick the coarsest overview level still as fine as the tile (-1 for full resolution)."
+    left, bottom, right, top = transform_bounds("EPSG:3857", src.crs, *bounds)
+    needed = max((right - left) / tile_size, (top - bottom) / tile_size) / abs(src.transform.a)
+    level = -1
+    for i, factor in enumerate(src.overviews(1)):
+        if factor <= needed:
+            level = i
+    return level
+
+def render(path, palette, z, x, y):
+    "To render one tile of a raster as RGBA, or None where the tile misses the raster."
+    bounds = tileBounds(z, x, y)
+    with rasterio.open(path) as src:
+        level = _level(src, bounds)
+        crs, nodata = src.crs, src.nodata
+    opts = {} if level < 0 else {"overview_level": level}
+    with rasterio.open(path, **opts) as src:
+        window = window_from_bounds(*transform_bounds("EPSG:3857", crs, *bounds), transform = src.transform)
+        window = window.round_offsets().round_lengths()
+        try:
+            window = window.intersection(Window(0, 0, src.width, src.height))
+        except WindowError:
+            return None
+        if window.width < 1 or window.height < 1:
+            return None
+        values = src.read(1, window = window)
+        transform = src.window_transform(window)
+    # Codes go through the warp as float64 (GDAL has no int64 before 3.5).
+    fill = -1.0 if nodata is None else float(nodata)
+    out = np.full((tile_size, tile_size), fill, dtype = np.float64)
+    reproject(values.astype(np.float64), out, src_transform = transform, src_crs = crs, src_nodata = nodata,
+              dst_transform = from_bounds(*bounds, tile_size, tile_size), dst_crs = "EPSG:3857",
+              dst_nodata = fill, resampling = Resampling.nearest)
+    rgba = np.zeros((tile_size, tile_size, 4), dtype = np.uint8)
+    inside = (out != fill) & (out >= 0) & (out < 256)
+    rgba[inside] = palette[out[inside].astype(np.int64)]
+    return rgba
+
+def png(rgba):
+    "To encode an RGBA array as PNG bytes."
+    height, width = rgba.shape[:2]
+    raw = b"".join(b"\x00" + rgba[row].tobytes() for row in range(height))
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b"")
+
+empty = png(np.zeros((tile_size, tile_size, 4), dtype = np.uint8))
+
+# ------------------------------------------------------------------------------
+# CACHE
+# ------------------------------------------------------------------------------
+
+class TileCache:
+    "Rendered tiles by key, dropping the least recently used past a number of tiles."
+
+    def __init__(self, size = None):
+        self.size = size or cache_tiles
+        self.tiles = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key, make):
+        "To return the tile for a key, making it with make() on a miss."
+        with self.lock:
+            if key in self.tiles:
+                self.tiles.move_to_end(key)
+                self.hits += 1
+                return self.tiles[key]
+            self.misses += 1
+        # Render outside the lock so requests for other tiles go on.
+        tile = make()
+        with self.lock:
+            self.tiles[key] = tile
+            self.tiles.move_to_end(key)
+            while len(self.tiles) > self.size:
+                self.tiles.popitem(last = False)
+        return tile
+
+# ------------------------------------------------------------------------------
+# SERVER
+# ------------------------------------------------------------------------------
+
+route = re.compile(r"^/(\w+)/(\d+)/(\d+)/(\d+)\.png$")
+
+# The viewer's script and style ship in static/ beside this file and are
+# served from here, so the page loads nothing from outside the server.
+
+static = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+static_types = {".js": "application/javascript", ".css": "text/css"}
+
+page = """<!DOCTYPE html><html><head><meta charset="utf-8"><title>Conservation plan</title>
+<link rel="stylesheet" href="/static/viewer.css"/>
+<script src="/static/viewer.js"></script>
+</head><body><div id="map"></div><script>
+viewer({map: "map", layers: %s, center: [44.0, -72.7], zoom: 9, maxZoom: 20});
+</script></body></html>"""
+
+def staticFile(path):
+    "To give the content type and bytes of a file in static/, or None if there is none."
+    name = path[len("/static/"):]
+    kind = static_types.get(os.path.splitext(name)[1])
+    full = os.path.join(static, name)
+    if kind is None or os.path.dirname(name) or not os.path.isfile(full):
+        return None
+    with open(full, "rb") as f:
+        return kind, f.read()
+
+class Layers:
+    "Products served by name, each with its palette."
+
+    def __init__(self, layers, cache = None):
+        self.layers = {name: (path, lookup(palettes[palette])) for name, (path, palette) in layers.items()}
+        self.cache = cache or TileCache()
+
+    def tile(self, name, z, x, y):
+        "To give the PNG bytes of a tile of a layer."
+        path, palette = self.layers[name]
+        key = (name, os.path.getmtime(path), z, x, y)
+        def make():
+            rgba = render(path, palette, z, x, y)
+            return empty if rgba is None or not rgba[..., 3].any() else png(rgba)
+        return self.cache.get(key, make)
+
+    def index(self):
+        "To give a web map page with every layer."
+        return (page % json.dumps(list(self.layers))).encode()
+
+def handler(layers):
+    "To make a request handler class serving some layers."
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path in ("/", "/index.html"):
+                return self._send(200, "text/html", layers.index())
+            if self.path.startswith("/static/"):
+                found = staticFile(self.path)
+                return self._send(200, *found) if found else self._send(404, "text/plain", b"not found")
+            match = route.match(self.path)
+            if not match or match.group(1) not in layers.layers:
+                return self._send(404, "text/plain", b"not found")
+            z, x, y = (int(v) for v in match.groups()[1:])
+            self._send(200, "image/png", layers.tile(match.group(1), z, x, y))
+
+        def _send(self, status, kind, body):
+            self.send_response(status)
+            self.send_header("Content-Type", kind)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "max-age=300")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            return;
+    return Handler
+
+def serve(layers, host = "0.0.0.0", port = 8000):
+    "To serve layers ({name: (path, palette)}) until interrupted."
+    server = ThreadingHTTPServer((host, port), handler(Layers(layers)))
+    print("serving %s on http://%s:%d/" % (", ".join(layers), host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    return;
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Serve products as XYZ tiles with the _01 palette.")
+    parser.add_argument("layers", nargs = "+", help = "name=path; the palette is the name if one is defined, else plan")
+    parser.add_argument("--host", default = "0.0.0.0")
+    parser.add_argument("--port", type = int, default = 8000)
+    parser.add_argument("--cache", type = int, help = "rendered tiles kept in memory")
+    args = parser.parse_args()
+    if args.cache:
+        cache_tiles = args.cache
+    layers = {}
+    for item in args.layers:
+        name, path = item.split("=", 1)
+        layers[name] = (path, name if name in palettes else "plan")
+    serve(layers, args.host, args.port)
@@ -0,0 +1,176 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     tiled_clump.py
+#  purpose:  Label contiguous cells of equal value (like wbt.clump) tile by
+#              tile on a process pool, merge labels that meet across tile
+#              seams, and renumber them in scan order so IDs are global.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import os
+
+import numpy as np
+from scipy import ndimage
+
+import array_tools as at
+import scratch_store as ss
+import tiled_filters as tf
+from profiling import traced
+
+# Tile size in cells and number of worker processes (None for the VTLC_WORKERS
+# budget; see settings.workers).
+
+tile_rows = 2048
+tile_cols = 2048
+workers = None
+
+# ------------------------------------------------------------------------------
+# LABEL TILES
+# ------------------------------------------------------------------------------
+
+def _readValid(src, window):
+    "To read a window (in its stored type) with a mask of valid cells."
+    values = src.read(1, window = window)
+    nodata = src.nodata
+    valid = np.ones(values.shape, dtype = bool) if nodata is None else values != nodata
+    return values, valid
+
+def _labelTile(input, window, diag, zero_back):
+    "To label one tile, returning labels 1..n, each label's first cell as a global index, its cell count and the tile's edge lines."
+    with ss.open(input) as src:
+        values, valid = _readValid(src, window)
+        width = src.width
+    structure = np.ones((3, 3)) if diag else None
+    labels = np.zeros(values.shape, dtype = np.uint32)
+    clumpable = valid & (values != 0) if zero_back else valid
+    n = 0
+    for value in np.unique(values[clumpable]):
+        lab, count = ndimage.label(clumpable & (values == value), structure = structure)
+        labels[lab > 0] = lab[lab > 0] + n
+        n += count
+    # First cell of each label in tile scan order is also its first in raster scan order.
+    ids, index = np.unique(labels.ravel(), return_index = True)
+    rows, cols = np.divmod(index, window.width)
+    first = np.zeros(n + 1, dtype = np.int64)
+    first[ids] = (rows + window.row_off) * width + cols + window.col_off
+    # Edge rows and columns (values, labels) for the seams, so they are not read again.
+    edges = {"top": (values[0], labels[0]), "bottom": (values[-1], labels[-1]),
+             "left": (values[:, 0], labels[:, 0]), "right": (values[:, -1], labels[:, -1])}
+    return window, labels, first, np.bincount(labels.ravel(), minlength = n + 1), edges
+
+# ------------------------------------------------------------------------------
+# SEAMS
+# ------------------------------------------------------------------------------
+
+def _seamPairs(a_values, a_labels, b_values, b_labels, diag):
+    "To pair labels of equal-valued neighbours across a seam between two lines of cells."
+    shifts = [(slice(None), slice(None))]
+    if diag:
+        shifts += [(slice(None, -1), slice(1, None)), (slice(1, None), slice(None, -1))]
+    pairs = []
+    for sa, sb in shifts:
+        al, bl = a_labels[sa], b_labels[sb]
+        match = (al > 0) & (bl > 0) & (a_values[sa] == b_values[sb])
+        pairs.append(np.stack([al[match], bl[match]]))
+    return np.concatenate(pairs, axis = 1)
+
+# Seam lines are put together from the edge lines of the tiles on either side
+# (kept while labelling), so diagonal links across tile corners are found as
+# on full rows and columns.
+
+def _line(edges, side, keys):
+    "To join the edge lines of some tiles into one line of (values, labels)."
+    values = np.concatenate([edges[k][side][0] for k in keys])
+    labels = np.concatenate([edges[k][side][1] for k in keys])
+    return values, labels
+
+def _seams(edges, diag):
+    "To collect label pairs along every horizontal and vertical tile seam."
+    pairs = [np.zeros((2, 0), dtype = np.int64)]
+    rows = sorted({r for r, _ in edges})
+    cols = sorted({c for _, c in edges})
+    for above, below in zip(rows, rows[1:]):
+        a_values, a_labels = _line(edges, "bottom", [(above, c) for c in cols])
+        b_values, b_labels = _line(edges, "top", [(below, c) for c in cols])
+        pairs.append(_seamPairs(a_values, a_labels, b_values, b_labels, diag))
+    for left, right in zip(cols, cols[1:]):
+        a_values, a_labels = _line(edges, "right", [(r, left) for r in rows])
+        b_values, b_labels = _line(edges, "left", [(r, right) for r in rows])
+        pairs.append(_seamPairs(a_values, a_labels, b_values, b_labels, diag))
+    return np.concatenate(pairs, axis = 1)
+
+# ------------------------------------------------------------------------------
+# CLUMP
+# ------------------------------------------------------------------------------
+
+@traced
+def clump(input, output, diag = True, zero_back = False, n_workers = None, return_counts = False):
+    "To clump a raster in parallel tiles with the same labels as wbt.clump (and, if asked, cells per label)."
+    n_workers = n_workers or workers
+    with ss.open(input) as src:
+        profile = src.profile.copy()
+        width, height = src.width, src.height
+    # Provisional labels only live for this call, so they go in the local store.
+    provisional = ss.path(os.path.basename(output) + ".provisional", os.path.dirname(os.path.abspath(output)))
+    windows = [w for w, _ in tf.tiles(width, height, 0, 0, tile_rows, tile_cols)]
+
+    # 1. Label tiles independently; offset their labels to make them unique.
+    lab_profile = profile.copy()
+    lab_profile.update(count = 1, dtype = "uint32", nodata = None, tiled = True, blockxsize = 256, blockysize = 256)
+    firsts = [np.zeros(1, dtype = np.int64)]
+    counts = [np.zeros(1, dtype = np.int64)]
+    offset = 0
+    edges = {}
+    with ss.open(provisional, "w", **lab_profile) as dst:
+        def save(window, labels, first, count, tile_edges):
+            nonlocal offset
+            dst.write(np.where(labels > 0, labels + np.uint32(offset), 0).astype("uint32"), 1, window = window)
+            edges[(window.row_off, window.col_off)] = {side: (np.array(values), np.where(lab > 0, lab.astype(np.int64) + offset, 0))
+                                                       for side, (values, lab) in tile_edges.items()}
+            firsts.append(first[1:])
+            counts.append(count[1:])
+            offset += len(first) - 1
+        tf.runTiles(_labelTile, [(input, w, diag, zero_back) for w in windows], save, n_workers)
+
+    # 2. Merge labels that meet across seams and number them in scan order.
+    component = at.mergeLabels(offset + 1, _seams(edges, diag))
+    lut = at.rankByFirst(component, np.concatenate(firsts))
+
+    # 3. Relabel through the lookup table, with noData where the input has it.
+    # Labels are written as uint32 (not float64) with the largest value as noData.
+    lut = lut.astype(np.uint32)
+    nodata = at.noDataFor("uint32")
+    profile.update(count = 1, dtype = "uint32", nodata = nodata)
+    with ss.open(input) as src, ss.open(provisional) as lab, ss.open(output, "w", **profile) as dst:
+        dst.update_tags(**{at.range_tag: "0.0 %r" % float(lut.max())})
+        for window in windows:
+            _, valid = _readValid(src, window)
+            labels = lut[lab.read(1, window = window)]
+            dst.write(np.where(valid, labels, nodata).astype(np.uint32), 1, window = window)
+    ss.remove(provisional)
+    if return_counts:
+        # Cells per final label, summed over the tile labels merged into it.
+        return output, np.bincount(lut[1:], weights = np.concatenate(counts)[1:], minlength = int(lut.max()) + 1).astype(np.int64)
+    return output
+
+# ------------------------------------------------------------------------------
+# PATCH AREA CLASSES
+# ------------------------------------------------------------------------------
+
+# In place of raster_area, divide and reclass over full rasters: the counts
+# from clump are turned into acres and binned once per label, and the table
+# is applied to the label raster with ra.lookup.
+
+acre = 4046.86
+
+def cellArea(path):
+    "To give the area of one cell in map units."
+    with ss.open(path) as src:
+        transform = src.profile["transform"]
+    return abs(transform.a * transform.e)
+
+def areaClasses(counts, cell_area, breaks = (0.25, 10), codes = (0, 100, 1000), unit = acre):
+    "To class each label by area (acres by default): codes[i] where breaks[i-1] <= area < breaks[i]."
+    area = counts * cell_area / unit
+    return np.asarray(codes)[np.digitize(area, breaks)]
@@ -0,0 +1,114 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     tiled_distance.py
+#  purpose:  Exact Euclidean distance to source cells, bounded to a radius:
+#              buffers (like wbt.buffer_raster) and capped distance layers
+#              (distance to roads, to developed land). Each tile is read with
+#              a halo of the radius; tiles with no source cell in reach are
+#              written without any work, and elsewhere the distance transform
+#              only runs over the sources' extent grown by the radius.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import math
+
+import numpy as np
+from scipy import ndimage
+
+import array_tools as at
+import scratch_store as ss
+import tiled_filters as tf
+from profiling import traced
+
+# Tile size in cells (before the halo) and number of worker processes (None
+# for the VTLC_WORKERS budget; see settings.workers).
+
+tile_rows = 2048
+tile_cols = 2048
+workers = None
+
+# ------------------------------------------------------------------------------
+# TILES
+# ------------------------------------------------------------------------------
+
+# Distances run between cell centres, in map units (or cells with
+# gridcells=True). Every source within the radius of a tile cell lies in the
+# tile's halo, so each tile is exact on its own.
+
+def _sources(values, valid, sources):
+    "To mark source cells: valid and nonzero, or one of the given values."
+    if sources is None:
+        return valid & (values != 0)
+    return valid & np.isin(values, sources)
+
+def _distanceTile(input, window, halo, radius, sampling, sources):
+    "To measure distances up to the radius in one tile, or None where no source is in reach."
+    with ss.open(input) as src:
+        values = src.read(1, window = halo)
+        nodata = src.nodata
+    valid = np.ones(values.shape, dtype = bool) if nodata is None else values != nodata
+    r0, c0 = window.row_off - halo.row_off, window.col_off - halo.col_off
+    crop_valid = at.packMask(valid[r0:r0 + window.height, c0:c0 + window.width])
+    source = _sources(values, valid, sources)
+    if not source.any():
+        return window, None, crop_valid
+    # Limit the transform to the sources' extent grown by the radius, within the tile.
+    reach_y, reach_x = (int(math.ceil(radius / s)) for s in sampling)
+    rows, cols = np.nonzero(source.any(axis = 1))[0], np.nonzero(source.any(axis = 0))[0]
+    b0, b1 = max(r0, rows[0] - reach_y), min(r0 + window.height, rows[-1] + reach_y + 1)
+    a0, a1 = max(c0, cols[0] - reach_x), min(c0 + window.width, cols[-1] + reach_x + 1)
+    if b0 >= b1 or a0 >= a1:
+        return window, None, crop_valid
+    s0, s1 = max(0, rows[0] - reach_y), min(source.shape[0], rows[-1] + reach_y + 1)
+    t0, t1 = max(0, cols[0] - reach_x), min(source.shape[1], cols[-1] + reach_x + 1)
+    distance = ndimage.distance_transform_edt(~source[s0:s1, t0:t1], sampling = sampling)
+    out = np.full((window.height, window.width), np.inf, dtype = np.float32)
+    out[b0 - r0:b1 - r0, a0 - c0:a1 - c0] = distance[b0 - s0:b1 - s0, a0 - t0:a1 - t0]
+    return window, out, crop_valid
+
+def _run(input, radius, gridcells, sources, n_workers, write):
+    "To run distance tiles over a raster, passing each to write(window, distance or None, valid)."
+    with ss.open(input) as src:
+        width, height = src.width, src.height
+        transform = src.profile["transform"]
+    sampling = (1.0, 1.0) if gridcells else (abs(transform.e), abs(transform.a))
+    halo_y, halo_x = (int(math.ceil(radius / s)) for s in sampling)
+    jobs = [(input, window, halo, radius, sampling, sources)
+            for window, halo in tf.tiles(width, height, halo_x, halo_y, tile_rows, tile_cols)]
+    tf.runTiles(_distanceTile, jobs, write, n_workers or workers)
+    return;
+
+# ------------------------------------------------------------------------------
+# BUFFER AND DISTANCE
+# ------------------------------------------------------------------------------
+
+@traced
+def buffer(input, output, size, gridcells = False, sources = None, n_workers = None):
+    "To mark cells within size of a source cell as 1 (others 0), like wbt.buffer_raster."
+    with ss.open(input) as src:
+        profile = src.profile.copy()
+    nodata = at.noDataFor("uint8")
+    profile.update(count = 1, dtype = "uint8", nodata = nodata)
+    with ss.open(output, "w", **profile) as dst:
+        dst.update_tags(**{at.range_tag: "0.0 1.0"})
+        def write(window, distance, valid):
+            out = np.zeros((window.height, window.width), dtype = np.uint8) if distance is None else (distance <= size).astype(np.uint8)
+            dst.write(np.where(at.unpackMask(valid), out, nodata).astype(np.uint8), 1, window = window)
+        _run(input, size, gridcells, sources, n_workers, write)
+    return output
+
+@traced
+def distance(input, output, max_distance, gridcells = False, sources = None, n_workers = None):
+    "To give each cell its distance to the nearest source cell, with max_distance for cells farther away."
+    with ss.open(input) as src:
+        profile = src.profile.copy()
+    nodata = at.noDataFor("float32")
+    profile.update(count = 1, dtype = "float32", nodata = nodata)
+    with ss.open(output, "w", **profile) as dst:
+        dst.update_tags(**{at.range_tag: "0.0 %r" % float(max_distance)})
+        def write(window, distance, valid):
+            out = np.full((window.height, window.width), max_distance, dtype = np.float32) if distance is None else np.minimum(distance, max_distance)
+            dst.write(np.where(at.unpackMask(valid), out, nodata).astype(np.float32), 1, window = window)
+        _run(input, max_distance, gridcells, sources, n_workers, write)
+    return output
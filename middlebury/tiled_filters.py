@@ -0,0 +1,113 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     tiled_filters.py
+#  purpose:  Run focal filters (maximum, minimum, majority) tile by tile, each
+#              tile read with a halo of half the filter size, so memory stays
+#              bounded whatever the raster size. Tiles can run on a pool.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from rasterio.windows import Window
+
+import array_tools as at
+import scratch_store as ss
+import settings
+from profiling import traced
+
+# Tile size in cells (tile_cols = None for full-width row strips) and number
+# of worker processes (1 to filter in this process, None for the VTLC_WORKERS
+# budget; see settings.workers).
+
+tile_rows = 1024
+tile_cols = None
+workers = None
+
+filters = {
+    "max": at.maximumFilter,
+    "min": at.minimumFilter,
+    "majority": at.majorityFilter,
+}
+
+# ------------------------------------------------------------------------------
+# TILES
+# ------------------------------------------------------------------------------
+
+def tiles(width, height, halo_x, halo_y, rows = None, cols = None):
+    "To list (window, halo window) pairs covering a raster, halos clipped to its edges."
+    rows = rows or tile_rows
+    cols = cols or tile_cols or width
+    for row in range(0, height, rows):
+        for col in range(0, width, cols):
+            window = Window(col, row, min(cols, width - col), min(rows, height - row))
+            r0, c0 = max(0, row - halo_y), max(0, col - halo_x)
+            r1 = min(height, row + window.height + halo_y)
+            c1 = min(width, col + window.width + halo_x)
+            yield window, Window(c0, r0, c1 - c0, r1 - r0)
+
+def _filterTile(input, stat, filterx, filtery, window, halo):
+    "To filter one tile and crop its halo."
+    with ss.open(input) as src:
+        array = src.read(1, window = halo)
+        nodata = src.nodata
+    valid = np.ones(array.shape, dtype = bool) if nodata is None else array != nodata
+    out, out_valid = filters[stat](array.astype(np.float64), valid, filterx, filtery)
+    r0, c0 = window.row_off - halo.row_off, window.col_off - halo.col_off
+    crop = (slice(r0, r0 + window.height), slice(c0, c0 + window.width))
+    # Filters only pick values already in the window, so the tile goes back in
+    # the input's type, with its valid mask packed into bits.
+    out = np.where(out_valid[crop], out[crop], 0).astype(array.dtype)
+    return window, out, at.packMask(out_valid[crop])
+
+# ------------------------------------------------------------------------------
+# FOCAL FILTER
+# ------------------------------------------------------------------------------
+
+# Cells beyond the raster edge are ignored, as they are in WBT, so clipping the
+# halo at the edge gives the same result as filtering the whole raster. The
+# output keeps the input's type and value range (a uint8 mask stays uint8).
+
+@traced
+def focalFilter(input, output, stat, filterx = 3, filtery = 3, n_workers = None):
+    "To filter a raster tile by tile with a halo of half the filter size."
+    with ss.open(input) as src:
+        profile = src.profile.copy()
+        width, height = src.width, src.height
+        tags = src.tags()
+    dtype = profile["dtype"]
+    nodata = profile.get("nodata")
+    nodata = at.noDataFor(dtype) if nodata is None else nodata
+    profile.update(count = 1, nodata = nodata)
+    jobs = [(input, stat, filterx, filtery, window, halo) for window, halo in tiles(width, height, filterx // 2, filtery // 2)]
+    with ss.open(output, "w", **profile) as dst:
+        if at.range_tag in tags:
+            dst.update_tags(**{at.range_tag: tags[at.range_tag]})
+        def save(window, out, valid):
+            dst.write(np.where(at.unpackMask(valid), out, nodata).astype(dtype), 1, window = window)
+        runTiles(_filterTile, jobs, save, n_workers)
+    return output
+
+# ------------------------------------------------------------------------------
+# RUN TILES
+# ------------------------------------------------------------------------------
+
+def runTiles(func, jobs, save, n_workers = None):
+    "To run func over a list of argument tuples, passing each result to save in order."
+    n_workers = n_workers or workers or settings.workers()
+    if n_workers == 1:
+        for args in jobs:
+            save(*func(*args))
+        return;
+    # Keep at most two tiles per worker in flight to bound memory.
+    with ProcessPoolExecutor(n_workers) as pool:
+        pending = []
+        for args in jobs:
+            pending.append(pool.submit(func, *args))
+            if len(pending) >= 2 * n_workers:
+                save(*pending.pop(0).result())
+        for future in pending:
+            save(*future.result())
+    return;
@@ -0,0 +1,159 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     tiled_geomorphons.py
+#  purpose:  Run wbt.geomorphons tile by tile on a process pool. Each tile is
+#              cut from the DEM with a halo as wide as the search distance, so
+#              every cell sees the same neighbourhood as in a single pass and
+#              the mosaic matches the single-pass result. Tiles are sized
+#              from the search distance so the halo stays a small part of
+#              each cut, and workers are capped by the memory a cut needs.
+#              Finished tiles are kept as checkpoints, so a crashed run picks
+#              up where it stopped.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import hashlib
+import json
+import os
+import shutil
+
+import rasterio
+from rasterio.windows import Window
+
+import settings
+import tiled_filters as tf
+from context import Context
+from profiling import traced
+
+# Smallest tile size in cells (before the halo); tiles are at least
+# tile_factor times the search distance, so a cut of tile and halo is at most
+# (1 + 2 / tile_factor)^2 times the tile (1.56 for 8). A search distance
+# larger than the raster gives one tile, the single pass.
+
+tile_rows = 4096
+tile_cols = 4096
+tile_factor = 8
+
+# Worker processes (None for the VTLC_WORKERS budget; see settings.workers),
+# capped so the cuts in flight fit in mem_fraction of the available memory at
+# bytes_per_cell (WBT holds the DEM and its output as float64, plus the cut).
+
+workers = None
+bytes_per_cell = 24
+mem_fraction = 0.75
+
+# ------------------------------------------------------------------------------
+# CHECKPOINTS
+# ------------------------------------------------------------------------------
+
+# Checkpoints are keyed on the files the DEM was made from (the DEM itself by
+# default), so a DEM rebuilt from the same sources after a crash reuses them.
+
+def checkpointFolder(sources, output, params, rows, cols):
+    "To name the checkpoint folder for the DEM's source files, tile size and geomorphon parameters."
+    stats = [(os.path.abspath(f), os.stat(f).st_size, os.stat(f).st_mtime) for f in sources]
+    key = json.dumps([stats, rows, cols, sorted(params.items())])
+    return output + ".tiles_" + hashlib.sha256(key.encode()).hexdigest()[:16]
+
+def _checkpoint(folder, window):
+    "To give the checkpoint file of a tile."
+    return os.path.join(folder, "tile_%d_%d.tif" % (window.row_off, window.col_off))
+
+# ------------------------------------------------------------------------------
+# TILES
+# ------------------------------------------------------------------------------
+
+def _geomorphonTile(dem, window, halo, folder, params, threads):
+    "To classify one tile with its halo and keep the cropped result as a checkpoint."
+    done = _checkpoint(folder, window)
+    if os.path.exists(done):
+        return window, done
+    with Context(folder, "tile", threads = threads) as ctx:
+        # Cut the tile and its halo from the DEM.
+        with rasterio.open(dem) as src:
+            profile = src.profile.copy()
+            profile.update(width = halo.width, height = halo.height, transform = src.window_transform(halo))
+            cut = src.read(1, window = halo)
+        with rasterio.open(ctx.scratch("dem.tif"), "w", **profile) as dst:
+            dst.write(cut, 1)
+        ctx.wbt.geomorphons(dem = "dem.tif", output = "forms.tif", **params)
+        # Crop the halo and write the checkpoint under a temporary name.
+        crop = Window(window.col_off - halo.col_off, window.row_off - halo.row_off, window.width, window.height)
+        with rasterio.open(ctx.scratch("forms.tif")) as src:
+            profile = src.profile.copy()
+            profile.update(width = window.width, height = window.height, transform = src.window_transform(crop))
+            forms = src.read(1, window = crop)
+        with rasterio.open(ctx.scratch("crop.tif"), "w", **profile) as dst:
+            dst.write(forms, 1)
+        os.replace(ctx.scratch("crop.tif"), done)
+    return window, done
+
+# ------------------------------------------------------------------------------
+# SIZES
+# ------------------------------------------------------------------------------
+
+def availableMemory():
+    "To give the memory available for new work in bytes (MemAvailable on Linux, free pages elsewhere)."
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+def tileSize(search):
+    "To give the tile size (rows, cols) for a search distance, so the halo is a small part of each cut."
+    side = tile_factor * search
+    return max(tile_rows, side), max(tile_cols, side)
+
+def workerCount(cut_cells, n_workers = None):
+    "To cap the worker budget by how many cuts of some cells fit in memory."
+    budget = n_workers or workers or settings.workers()
+    fit = int(mem_fraction * availableMemory() // max(1, cut_cells * bytes_per_cell))
+    return max(1, min(budget, fit))
+
+# ------------------------------------------------------------------------------
+# GEOMORPHONS
+# ------------------------------------------------------------------------------
+
+# WBT's search distance is in cells, so a halo of that many cells gives each
+# tile cell the same view as the whole raster; halos are clipped at the
+# raster edge, where WBT stops looking anyway.
+
+@traced
+def geomorphons(dem, output, search = 50, threshold = 0.0, tdist = 0, forms = True, n_workers = None, sources = None, keep_tiles = False):
+    "To classify landforms like wbt.geomorphons, in tiles with a halo of the search distance."
+    params = dict(search = search, threshold = threshold, tdist = tdist, forms = forms)
+    rows, cols = tileSize(search)
+    folder = checkpointFolder(sources or [dem], output, params, rows, cols)
+    os.makedirs(folder, exist_ok = True)
+    with rasterio.open(dem) as src:
+        width, height, transform = src.width, src.height, src.transform
+    tiles = list(tf.tiles(width, height, search, search, rows, cols))
+    # Workers fit the largest cut in memory; each runs WBT on its share of the budget.
+    budget = n_workers or workers or settings.workers()
+    cut = max(halo.width * halo.height for _, halo in tiles)
+    n_workers = min(workerCount(cut, budget), len(tiles))
+    threads = max(1, budget // n_workers)
+    jobs = [(dem, window, halo, folder, params, threads) for window, halo in tiles]
+    # The mosaic takes its type and noData from the first tile.
+    mosaic = None
+    def save(window, path):
+        nonlocal mosaic
+        with rasterio.open(path) as src:
+            if mosaic is None:
+                profile = src.profile.copy()
+                profile.update(width = width, height = height, transform = transform)
+                mosaic = rasterio.open(output, "w", **profile)
+            mosaic.write(src.read(1), 1, window = window)
+    try:
+        tf.runTiles(_geomorphonTile, jobs, save, n_workers)
+    finally:
+        if mosaic is not None:
+            mosaic.close()
+    if not keep_tiles:
+        shutil.rmtree(folder, ignore_errors = True)
+    return output
@@ -0,0 +1,121 @@
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#  name:     zonal_stats.py
+#  purpose:  Compute several zonal statistics (min, max, count, sum,
+#              histogram) of several value rasters in one pass over a feature
+#              raster. Results are kept in arrays indexed by feature ID and
+#              only broadcast back to a raster when asked.
+#
+#  update:   10/18/2026
+#  license:  Attribution-ShareAlike 4.0 International (CC BY-SA 4.0)
+#  ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import numpy as np
+
+import scratch_store as ss
+import tiled_filters as tf
+from profiling import traced
+
+# Rows read per pass.
+
+strip_rows = 1024
+
+# Starting value of each statistic.
+
+_fill = {"min": np.inf, "max": -np.inf, "count": 0, "sum": 0.0}
+
+# ------------------------------------------------------------------------------
+# READ STRIPS
+# ------------------------------------------------------------------------------
+
+def _read(src, window):
+    "To read a window with a mask of valid cells."
+    values = src.read(1, window = window).astype(np.float64)
+    valid = np.ones(values.shape, dtype = bool) if src.nodata is None else values != src.nodata
+    return values, valid
+
+def _grow(array, n, stat):
+    "To extend a label-indexed array (1D, or 2D for histograms) to n labels."
+    if len(array) >= n:
+        return array
+    fill = 0 if stat == "histogram" else _fill[stat]
+    extra = np.full((n - len(array),) + array.shape[1:], fill, dtype = array.dtype)
+    return np.concatenate([array, extra])
+
+# ------------------------------------------------------------------------------
+# ZONAL STATISTICS
+# ------------------------------------------------------------------------------
+
+# Feature IDs are rounded to integers. As in wbt.zonal_statistics, every ID
+# that is not noData is a zone, including 0.
+
+@traced
+def zonalStatistics(features, values, stats = ("max",), classes = None):
+    "To compute stats of each value raster per feature ID, keyed (name, stat), plus ('features', 'count')."
+    table = {("features", "count"): np.zeros(0, dtype = np.int64)}
+    n = 0
+    files = {name: ss.open(path) for name, path in values.items()}
+    try:
+        with ss.open(features) as fsrc:
+            for window, _ in tf.tiles(fsrc.width, fsrc.height, 0, 0, strip_rows, None):
+                f, f_valid = _read(fsrc, window)
+                ids = np.rint(f[f_valid]).astype(np.int64)
+                if ids.size == 0:
+                    continue
+                if ids.max() + 1 > n:
+                    n = ids.max() + 1
+                    for key in table:
+                        table[key] = _grow(table[key], n, key[1])
+                for name, src in files.items():
+                    v, v_valid = _read(src, window)
+                    use = v_valid[f_valid]
+                    i, x = ids[use], v[f_valid][use]
+                    _accumulate(table, name, i, x, n, stats, classes)
+                table[("features", "count")] += np.bincount(ids, minlength = n)
+    finally:
+        for src in files.values():
+            src.close()
+    return table
+
+def _accumulate(table, name, i, x, n, stats, classes):
+    "To add one strip of (label, value) pairs to the statistics of a value raster."
+    for stat in ("count",) + tuple(s for s in stats if s != "count"):
+        key = (name, stat)
+        if key not in table:
+            if stat == "histogram":
+                table[key] = np.zeros((n, len(classes)), dtype = np.int64)
+            else:
+                table[key] = np.full(n, _fill[stat], dtype = np.int64 if stat == "count" else np.float64)
+        if stat == "count":
+            table[key] += np.bincount(i, minlength = n)
+        elif stat == "sum":
+            table[key] += np.bincount(i, weights = x, minlength = n)
+        elif stat == "max":
+            np.maximum.at(table[key], i, x)
+        elif stat == "min":
+            np.minimum.at(table[key], i, x)
+        elif stat == "histogram":
+            for k, c in enumerate(classes):
+                table[key][:, k] += np.bincount(i[x == c], minlength = n)
+    return;
+
+# ------------------------------------------------------------------------------
+# BROADCAST TO PIXELS
+# ------------------------------------------------------------------------------
+
+@traced
+def broadcast(table, name, stat, features, output, nodata = -32768.0):
+    "To write a zonal statistic back to the cells of each feature, like wbt.zonal_statistics."
+    stat_values = table[(name, stat)]
+    present = table[(name, "count")] > 0
+    if len(stat_values) == 0:
+        stat_values, present = np.zeros(1), np.zeros(1, dtype = bool)
+    with ss.open(features) as fsrc:
+        profile = fsrc.profile.copy()
+        profile.update(count = 1, dtype = "float32", nodata = nodata)
+        with ss.open(output, "w", **profile) as dst:
+            for window, _ in tf.tiles(fsrc.width, fsrc.height, 0, 0, strip_rows, None):
+                f, f_valid = _read(fsrc, window)
+                ids = np.where(f_valid, np.rint(f), 0).astype(np.int64)
+                valid = f_valid & present[ids]
+                dst.write(np.where(valid, stat_values[ids], nodata).astype("float32"), 1, window = window)
+    return output